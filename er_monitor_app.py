@@ -1,105 +1,75 @@
+"""Streamlit entry point: `streamlit run er_monitor_app.py`.
+
+Page layout only; rules, vitals I/O, telemetry and the LLM client live in
+the importable `patient_monitor` package.
+"""
 import os
 import time
-import json
 import uuid
-import base64
-import io
-from typing import Optional, Dict, Any
-from pathlib import Path
-from typing import Any, Dict, List
+from typing import Any, Dict, Optional
 
 import pandas as pd
 import streamlit as st
-import requests
-import streamlit.components.v1 as components
-
-# ============================================================================
-# SPLUNK AI OBSERVABILITY (HEC) - OPTIONAL / FAIL-OPEN
-# ============================================================================
-SPLUNK_HEC_URL = os.getenv("SPLUNK_HEC_URL", "").strip()
-SPLUNK_HEC_TOKEN = os.getenv("SPLUNK_HEC_TOKEN", "").strip()
-SPLUNK_INDEX = os.getenv("SPLUNK_INDEX", "").strip()
-SPLUNK_SOURCETYPE = os.getenv("SPLUNK_SOURCETYPE", "ai-patient-monitor").strip()
-SPLUNK_MGMT_URL = os.getenv("SPLUNK_MGMT_URL", "").strip()
-SPLUNK_USERNAME = os.getenv("SPLUNK_USERNAME", "").strip()
-SPLUNK_PASSWORD = os.getenv("SPLUNK_PASSWORD", "").strip()
-
-
-# --- Splunk Management API (8089) credentials for in-app run summary ---
-
-# TLS verify for localhost demo (set PM_SPLUNK_VERIFY_TLS=1 to verify)
-PM_SPLUNK_VERIFY_TLS = os.getenv("PM_SPLUNK_VERIFY_TLS", "0").strip() in ("1","true","TRUE","yes","YES")
-
-
-
-def splunk_log(event: Dict[str, Any]):
-    """Send a structured event to Splunk HEC. Fails open (never breaks the demo).
-
-    Adds correlation ids (pm_session_id, pm_run_id) and optionally archives events locally as JSONL.
-    """
-    if not (SPLUNK_HEC_URL and SPLUNK_HEC_TOKEN):
-        return
 
-    # Enrich for correlation / investigation
-    try:
-        event = dict(event or {})
-        event.setdefault("app", "ai_patient_monitor")
-        event.setdefault("pm_session_id", st.session_state.get("pm_session_id"))
-        event.setdefault("pm_run_id", st.session_state.get("pm_run_id"))
-    except Exception:
-        # If anything weird happens, don't break the demo
-        return
-
-    # Optional cost estimate (demo-friendly). Override with env var COST_PER_TOKEN.
-    try:
-        cost_per_token = float(os.getenv("COST_PER_TOKEN", "0.0000005"))
-        tokens = event.get("tokens_total")
-        if tokens is not None:
-            tokens_f = float(tokens)
-            event["estimated_cost_usd"] = round(tokens_f * cost_per_token, 6)
-    except Exception:
-        pass
-
-    payload = {
-        "time": time.time(),
-        "host": os.getenv("COMPUTERNAME") or os.getenv("HOSTNAME") or "unknown-host",
-        "source": "streamlit",
-        "sourcetype": SPLUNK_SOURCETYPE,
-        "event": event,
-    }
-    if SPLUNK_INDEX:
-        payload["index"] = SPLUNK_INDEX
-
-    # Local JSONL archive (optional)
-    try:
-        log_path = os.getenv("PM_EVENT_LOG", "logs/events.jsonl").strip()
-        if log_path:
-            os.makedirs(os.path.dirname(log_path) or ".", exist_ok=True)
-            with open(log_path, "a", encoding="utf-8") as f:
-                f.write(json.dumps(payload) + "\n")
-    except Exception:
-        pass
-
-    # TLS verification toggle (default: off for local demo)
-    verify_tls = os.getenv("PM_SPLUNK_VERIFY_TLS", "0").strip() in ("1", "true", "TRUE", "yes", "YES")
+from patient_monitor.ecg import read_ecg_features, read_ecg_strip, with_ecg_features
+from patient_monitor.event_index import get_event_index
+from patient_monitor.fallback import PM_LLM_SLO_S, fallback_action_plan, hedge_action_plan
+from patient_monitor.ingest import PM_LIVE_POLL_S, get_feed
+from patient_monitor.metrics import METRICS, ensure_metrics_server
+from patient_monitor.plan_cache import clinical_signature, find_similar_plan, signature_from_json
+from patient_monitor.profiling import PM_PROFILE_RERUNS, finish_profile_capture, start_profile_capture
+from patient_monitor.rollups import ROLLUP_VITALS, get_rollup, update_rollups
+from patient_monitor.rules import (
+    classify_rows,
+    data_ts,
+    detect_conditions,
+    estimate_ai_confidence,
+    make_json_safe,
+)
+from patient_monitor.scheduler import submit_llm_actions
+from patient_monitor.session_store import get_session_store
+from patient_monitor.splunk_search import SPLUNK_MGMT_URL, SPLUNK_PASSWORD, SPLUNK_USERNAME
+from patient_monitor.telemetry import (
+    begin_render_profile,
+    bind_correlation,
+    finish_render_profile,
+    span,
+    splunk_log,
+)
+from patient_monitor.ui import (
+    alarm_start,
+    alarm_stop,
+    alarm_stop_all,
+    flashing_red_banner,
+    inject_ward_background,
+    play_3_beeps,
+    render_alarm_channel,
+    render_data_quality_report,
+    render_ecg_panel,
+    render_profile_panel,
+    render_raw_data_view,
+    render_replay_view,
+    render_token_viz,
+    status_chip,
+)
+from patient_monitor.visuals import get_cached_condition_image
+from patient_monitor.vitals_io import VITALS_SCHEMA, read_vitals_csv
 
-    try:
-        requests.post(
-            SPLUNK_HEC_URL,
-            headers={"Authorization": f"Splunk {SPLUNK_HEC_TOKEN}"},
-            data=json.dumps(payload),
-            timeout=2,
-            verify=verify_tls,
-        )
-    except Exception:
-        pass
+PM_ADMIN_MODE = os.getenv("PM_ADMIN_MODE", "0").strip() in ("1", "true", "TRUE", "yes", "YES")
+PM_LIVE_CHART_ROWS = int(os.getenv("PM_LIVE_CHART_ROWS", "60"))
+# Long trend horizons (hours) served from the per-patient rollups
+TREND_HORIZONS_H = (6, 24, 72)
+# Archived events joined into the replay view
+REPLAY_EVENT_TYPES = ("clinical_alert", "alert_acknowledged", "ai_inference", "action_plan_served")
 
-# === PIL for local visuals ===
-try:
-    from PIL import Image, ImageDraw, ImageFont
-    PIL_OK = True
-except ImportError:
-    PIL_OK = False
+# ============================================================================
+# PAGE CONFIGURATION
+# ============================================================================
+st.set_page_config(
+    page_title="AI Based Patient Monitor", 
+    layout="wide",
+    page_icon="🩺"
+)
 
 # ============================================================================
 # SESSION STATE INITIALIZATION
@@ -113,543 +83,133 @@ def init_session_state():
         "sample_file": None,
         "auto_ai": True,
         "ai_cache": {},
-        "last_llm_ok": None
+        "pending_llm": {},
+        "last_llm_ok": None,
+        "profile_reruns_left": PM_PROFILE_RERUNS,
+        "last_profile_capture": None,
+        "live_mode": False,
+        "live_view": None,
+        "live_subscription": None,
+        "last_alerted_view": None,
+        "replay_mode": False,
     }
     for key, value in defaults.items():
         if key not in st.session_state:
             st.session_state[key] = value
 
-init_session_state()
 
-# ============================================================================
-# AUDIO ALERT SYSTEM
-# ============================================================================
-def play_3_beeps():
-    """Plays 3 short beeps using Web Audio API with improved browser compatibility"""
-    token = str(uuid.uuid4())
-    components.html(
-        f"""
-        <div id="beep-container-{token}" style="display:none;"></div>
-        <script>
-        (function() {{
-          try {{
-            // Create or resume audio context
-            const AudioContext = window.AudioContext || window.webkitAudioContext;
-            if (!AudioContext) {{
-              console.error('Web Audio API not supported');
-              return;
-            }}
-            
-            const ctx = new AudioContext();
-            
-            // Resume audio context if suspended (browser autoplay policy)
-            if (ctx.state === 'suspended') {{
-              ctx.resume().then(() => {{
-                playBeeps();
-              }});
-            }} else {{
-              playBeeps();
-            }}
-            
-            function playBeeps() {{
-              function beep(startDelayMs, durationMs, freq) {{
-                try {{
-                  const osc = ctx.createOscillator();
-                  const gain = ctx.createGain();
-                  
-                  osc.type = "sine";
-                  osc.frequency.value = freq;
-                  
-                  // Louder volume for better audibility
-                  gain.gain.setValueAtTime(0.001, ctx.currentTime);
-                  gain.gain.exponentialRampToValueAtTime(0.5, ctx.currentTime + 0.01);
-                  
-                  osc.connect(gain);
-                  gain.connect(ctx.destination);
-                  
-                  const startTime = ctx.currentTime + (startDelayMs / 1000);
-                  const stopTime = startTime + (durationMs / 1000);
-                  
-                  osc.start(startTime);
-                  gain.gain.exponentialRampToValueAtTime(0.001, stopTime);
-                  osc.stop(stopTime);
-                }} catch (e) {{
-                  console.error('Error playing beep:', e);
-                }}
-              }}
-              
-              // 3 beeps: 200ms each, 200ms gaps (more distinct)
-              beep(0,   200, 880);   // First beep
-              beep(400, 200, 880);   // Second beep
-              beep(800, 200, 880);   // Third beep
-              
-              console.log('Alarm beeps triggered');
-            }}
-          }} catch (error) {{
-            console.error('Audio initialization error:', error);
-          }}
-        }})();
-        </script>
-        """,
-        height=0,
-    )
+def persist_state(key: str, value: Any, patient: str = ""):
+    """Write-through of crash-safe state (batched; reads stay in st.session_state).
 
-# ============================================================================
-# PAGE CONFIGURATION
-# ============================================================================
-st.set_page_config(
-    page_title="AI Based Patient Monitor", 
-    layout="wide",
-    page_icon="🩺"
-)
+    Only the tab that owns the session writes, so two tabs on one URL cannot overwrite each other.
+    """
+    if state_store.owns_session(st.session_state.pm_session_id, st.session_state.pm_tab_id):
+        state_store.put(st.session_state.pm_session_id, patient, key, value)
 
 
-# ============================================================================
-# RUN / SESSION IDS (for observability correlation)
-# ============================================================================
-import uuid
-if "pm_session_id" not in st.session_state:
-    st.session_state.pm_session_id = str(uuid.uuid4())
-if "pm_run_id" not in st.session_state:
-    st.session_state.pm_run_id = str(uuid.uuid4())
+def persist_patient_state(key: str, value: Any):
+    persist_state(key, value, patient_id)
 
 
-# ============================================================================
-# VISUAL STYLING
-# ============================================================================
-def inject_ward_background():
-    """Inject custom CSS for ward-themed background"""
-    bg_path = Path("assets/ward_bg.jpg")
-    
-    # Check if background image exists
-    if bg_path.exists():
-        bg_base64 = base64.b64encode(bg_path.read_bytes()).decode()
-        bg_style = f'background-image: url("data:image/jpeg;base64,{bg_base64}");'
-    else:
-        # Fallback to solid color
-        bg_style = 'background-color: #0e1117;'
-    
-    st.markdown(
-        f"""
-        <style>
-        /* Dark base theme */
-        html, body, [data-testid="stAppViewContainer"] {{
-            background-color: #0e1117 !important;
-        }}
-
-        /* Background layer */
-        body::before {{
-            content: "";
-            position: fixed;
-            inset: 0;
-            {bg_style}
-            background-size: cover;
-            background-position: center;
-            opacity: 0.14;
-            z-index: -1;
-        }}
-
-        /* Main content container */
-        .block-container {{
-            background: rgba(14, 17, 23, 0.78);
-            border-radius: 14px;
-            padding: 1.2rem;
-        }}
-
-        /* Sidebar styling */
-        section[data-testid="stSidebar"] {{
-            background: rgba(14, 17, 23, 0.90);
-        }}
-
-        /* Cards and metrics */
-        div[data-testid="stMetric"],
-        div[data-testid="stExpander"],
-        div[data-testid="stAlert"] {{
-            background: rgba(22, 27, 34, 0.85);
-            border-radius: 10px;
-            padding: 10px;
-        }}
-        
-        /* Emergency banner animation */
-        @keyframes blinker {{ 50% {{ opacity: 0; }} }}
-        .alarm {{
-            color: white;
-            background: #d32f2f;
-            padding: 14px 16px;
-            border-radius: 12px;
-            font-weight: 800;
-            font-size: 20px;
-            animation: blinker 1s linear infinite;
-            text-align: center;
-            box-shadow: 0 10px 25px rgba(211,47,47,0.35);
-        }}
-        </style>
-        """,
-        unsafe_allow_html=True,
-    )
+def restore_patient_state():
+    """Load the loaded patient's persisted state into the session once per patient switch"""
+    if st.session_state.get("state_patient_id") == patient_id:
+        return
+    st.session_state.state_patient_id = patient_id
+    sid = st.session_state.pm_session_id
+    st.session_state.alert_ack = state_store.get(sid, patient_id, "alert_ack", False)
+    st.session_state.alarm_last_beep_ts = state_store.get(sid, patient_id, "alarm_last_beep_ts", 0.0)
+    for key, result in state_store.items(sid, patient_id, "ai_cache:").items():
+        st.session_state.ai_cache.setdefault(key, dict(result, signature=signature_from_json(result.get("signature"))))
 
-inject_ward_background()
 
-# ============================================================================
-# UI COMPONENTS
-# ============================================================================
-def flashing_red_banner(text: str):
-    """Display flashing red emergency banner"""
-    st.markdown(f"<div class='alarm'>🚨 {text} 🚨</div>", unsafe_allow_html=True)
-
-def status_chip(label: str, level: str):
-    """Display status chip with color coding"""
-    colors = {
-        "NORMAL": "#2e7d32",
-        "WARNING": "#ef6c00",
-        "EMERGENCY": "#c62828"
-    }
-    html = (
-        f"<div style='display:inline-block;padding:6px 10px;border-radius:999px;"
-        f"background:{colors.get(level, '#455a64')};color:white;font-weight:700;'>"
-        f"{label}: {level}</div>"
-    )
-    st.markdown(html, unsafe_allow_html=True)
+def live_subscription(path: Optional[str]):
+    """Change Event of the followed file for this tab (None stops following).
 
-# ============================================================================
-# DATA ANALYSIS FUNCTIONS
-# ============================================================================
-def detect_conditions(df: pd.DataFrame) -> Dict[str, Any]:
-    """
-    Analyze patient vitals and detect abnormal conditions
-    Returns diagnosis summary with severity level
+    The session holds the only strong reference to the Event; the feed drops it
+    once the session is gone.
     """
-    latest = df.iloc[-1].to_dict()
-    
-    hr = latest.get("heart_rate_bpm", 0)
-    temp = latest.get("temperature_c", 0)
-    sbp = latest.get("bp_systolic_mmHg", 0)
-    dbp = latest.get("bp_diastolic_mmHg", 0)
-    spo2 = latest.get("spo2_percent", 100)
-    ecg = latest.get("ECG", "")
-    
-    # Calculate Mean Arterial Pressure
-    map_val = round(dbp + (sbp - dbp) / 3, 1) if sbp and dbp else None
-    
-    flags = []
-    level = "NORMAL"
-    diagnosis = "Normal vitals"
-    
-    # === EMERGENCY CONDITIONS ===
-    # Severe hypoxemia
-    if spo2 < 88:
-        flags.append(f"CRITICAL: Severe hypoxemia (SpO₂ {spo2}%)")
-        level = "EMERGENCY"
-        diagnosis = "Respiratory failure"
-    
-    # Hypotension
-    if sbp < 90 or (map_val and map_val < 65):
-        flags.append(f"CRITICAL: Hypotension (SBP {sbp}, MAP {map_val})")
-        if level != "EMERGENCY":
-            level = "EMERGENCY"
-        diagnosis = "Hemodynamic instability"
-    
-    # Suspected V-tach
-    if hr >= 160 or "V-tach" in str(ecg):
-        flags.append(f"CRITICAL: Suspected V-tach (HR {hr}, ECG {ecg})")
-        level = "EMERGENCY"
-        diagnosis = "Cardiac arrhythmia"
-    
-    # === SEPSIS DETECTION (multi-factor) ===
-    sepsis_score = 0
-    if temp >= 38.0 or temp <= 36.0:
-        sepsis_score += 1
-        flags.append(f"Fever/hypothermia (Temp {temp}°C)")
-    if hr > 100:
-        sepsis_score += 1
-        flags.append(f"Tachycardia (HR {hr})")
-    if sbp < 100:
-        sepsis_score += 1
-        flags.append(f"Low BP (SBP {sbp})")
-    if spo2 < 94:
-        sepsis_score += 1
-        flags.append(f"Hypoxemia (SpO₂ {spo2}%)")
-    
-    if sepsis_score >= 3:
-        level = "EMERGENCY"
-        diagnosis = "Suspected sepsis"
-        flags.append("⚠️ SEPSIS-LIKE PATTERN DETECTED")
-    
-    # === WARNING CONDITIONS ===
-    if level != "EMERGENCY":
-        if spo2 < 92:
-            flags.append(f"Mild hypoxemia (SpO₂ {spo2}%)")
-            level = "WARNING"
-            diagnosis = "Respiratory concern"
-        
-        if hr > 120 or hr < 50:
-            flags.append(f"Abnormal HR ({hr} bpm)")
-            level = "WARNING"
-            diagnosis = "Cardiac monitoring needed"
-        
-        if temp >= 37.8:
-            flags.append(f"Elevated temperature ({temp}°C)")
-            if level != "WARNING":
-                level = "WARNING"
-    
-    return {
-        "level": level,
-        "diagnosis": diagnosis,
-        "flags": flags,
-        "latest": latest,
-        "map": map_val
-    }
-
-def make_json_safe(obj: Any) -> Any:
-    """Convert objects to JSON-safe format"""
-    if isinstance(obj, dict):
-        return {k: make_json_safe(v) for k, v in obj.items()}
-    elif isinstance(obj, list):
-        return [make_json_safe(v) for v in obj]
-    elif pd.isna(obj):
+    current = st.session_state.live_subscription
+    if current is not None and current["path"] != path:
+        get_feed(current["path"]).unsubscribe(current["key"])
+        current = st.session_state.live_subscription = None
+    if path is None:
         return None
-    elif isinstance(obj, (pd.Timestamp, pd.Timedelta)):
-        return str(obj)
-    else:
-        return obj
+    if current is None:
+        key = str(uuid.uuid4())
+        current = st.session_state.live_subscription = {
+            "path": path, "key": key, "event": get_feed(path).subscribe(key)}
+    return current["event"]
+
+
+def openai_api_key() -> str:
+    """API key from the environment, falling back to Streamlit secrets"""
+    key = os.getenv("OPENAI_API_KEY", "")
+    if key:
+        return key
+    try:
+        return st.secrets.get("OPENAI_API_KEY", "")
+    except Exception:
+        # No secrets.toml at all
+        return ""
+
+
+ensure_metrics_server()
+begin_render_profile()
+init_session_state()
 
 # ============================================================================
-# AI/LLM INTEGRATION
+# RUN / SESSION IDS (for observability correlation)
 # ============================================================================
-def estimate_ai_confidence(summary: Dict, llm_ok: Optional[bool] = None) -> str:
-    """Estimate AI confidence based on severity and LLM status"""
-    level = summary.get("level", "NORMAL")
-    flags = summary.get("flags") or []
-    
-    if level == "EMERGENCY":
-        base = "High"
-    elif level == "WARNING":
-        base = "Medium"
-    else:
-        base = "Medium" if flags else "Low"
-    
-    # Downgrade if LLM failed
-    if llm_ok is False:
-        if base == "High":
-            return "Medium"
-        if base == "Medium":
-            return "Low"
-    
-    return base
+# The session id rides in the URL, so a reload (or a restarted server) finds the
+# persisted state of this session again: run id, loaded sample, and per patient
+# the alert acknowledgement, alarm timing and AI plans (patient_monitor.session_store).
+# Every tab opened on that URL is the same session; the newest tab owns it and
+# older ones stop writing (pm_tab_id is per tab and never persisted).
+state_store = get_session_store()
+if "pm_session_id" not in st.session_state:
+    st.session_state.pm_session_id = st.query_params.get("pm_session") or str(uuid.uuid4())
+    st.query_params["pm_session"] = st.session_state.pm_session_id
+    if st.session_state.sample_file is None:
+        st.session_state.sample_file = state_store.get(st.session_state.pm_session_id, "", "sample_file")
+if "pm_tab_id" not in st.session_state:
+    st.session_state.pm_tab_id = str(uuid.uuid4())
+    state_store.claim_tab(st.session_state.pm_session_id, st.session_state.pm_tab_id)
+if "pm_run_id" not in st.session_state:
+    st.session_state.pm_run_id = (state_store.get(st.session_state.pm_session_id, "", "pm_run_id")
+                                  or str(uuid.uuid4()))
+    persist_state("pm_run_id", st.session_state.pm_run_id)
 
-def render_token_viz(usage: Optional[Dict]):
-    """Display token usage visualization"""
-    if not usage:
-        st.info("Token usage not available for this response.")
-        return
-    
-    prompt = usage.get("prompt_tokens", 0)
-    completion = usage.get("completion_tokens", 0)
-    total = usage.get("total_tokens", 0)
-    
-    col1, col2, col3 = st.columns(3)
-    col1.metric("Input Tokens", f"{prompt:,}")
-    col2.metric("Output Tokens", f"{completion:,}")
-    col3.metric("Total Tokens", f"{total:,}")
-    
-    # Visual bar
-    if total > 0:
-        prompt_pct = (prompt / total) * 100
-        completion_pct = (completion / total) * 100
-        
-        st.markdown(
-            f"""
-            <div style="display:flex;width:100%;height:30px;border-radius:8px;overflow:hidden;">
-                <div style="width:{prompt_pct}%;background:#1976d2;display:flex;align-items:center;justify-content:center;color:white;font-size:12px;">
-                    Input
-                </div>
-                <div style="width:{completion_pct}%;background:#388e3c;display:flex;align-items:center;justify-content:center;color:white;font-size:12px;">
-                    Output
-                </div>
-            </div>
-            """,
-            unsafe_allow_html=True
-        )
 
-def call_llm_actions(summary: Dict, df_tail: pd.DataFrame, source_name: Optional[str] = None) -> Dict:
-    """
-    Call LLM to generate nurse action suggestions based on patient data
+def bind_session_correlation():
+    """Bind this session's ids on the current thread.
+
+    Fragment reruns (live ticks, the acknowledge button) run on a fresh
+    ScriptRunner thread that does not inherit the rerun's context, so every
+    fragment calls this first.
     """
-    # Get API credentials from environment or Streamlit secrets
-    api_key = os.getenv("OPENAI_API_KEY") or st.secrets.get("OPENAI_API_KEY", "")
-    
-    if not api_key:
-        splunk_log({"event_type":"ai_inference","app":"ai_patient_monitor","scenario": source_name or "unknown","alert_level": summary.get("level","UNKNOWN"),"diagnosis": summary.get("diagnosis",""),"model": os.getenv("OPENAI_MODEL","gpt-4o-mini"),"success": False,"error":"No API key configured"})
-        return {
-            "ok": False,
-            "error": "⚠️ No API key configured. Set OPENAI_API_KEY environment variable or add to Streamlit secrets.",
-            "latency_s": 0,
-            "usage": None,
-            "text": None
-        }
-    
-    base_url = os.getenv("OPENAI_BASE_URL", "https://api.openai.com/v1")
-    model = os.getenv("OPENAI_MODEL", "gpt-4o-mini")
-    
-    # Prepare data for LLM
-    vitals_table = df_tail[["timestamp", "heart_rate_bpm", "temperature_c", 
-                             "bp_systolic_mmHg", "bp_diastolic_mmHg", 
-                             "spo2_percent", "ECG"]].to_csv(index=False)
-    
-    system = """You are an ICU clinical decision support AI. Based on patient vitals, suggest immediate nursing actions following standard ICU protocols.
+    bind_correlation(pm_session_id=st.session_state.pm_session_id, pm_run_id=st.session_state.pm_run_id)
 
-Format your response as:
-1. **Immediate Actions**: What to do RIGHT NOW
-2. **Monitoring**: What to watch closely
-3. **Documentation**: What to record
-4. **Escalation**: When to call MD/Rapid Response
 
-Be specific, practical, and protocol-driven."""
+bind_session_correlation()
 
-    user_content = {
-        "task": "Analyze ICU vitals and suggest nurse actions",
-        "patient_summary": make_json_safe(summary),
-        "recent_vitals_csv": vitals_table
-    }
-    
-    payload = {
-        "model": model,
-        "messages": [
-            {"role": "system", "content": system},
-            {"role": "user", "content": json.dumps(user_content, indent=2)}
-        ],
-        "temperature": 0.2
-    }
-    
-    headers = {
-        "Authorization": f"Bearer {api_key}",
-        "Content-Type": "application/json"
-    }
-    
-    url = base_url.rstrip("/") + "/chat/completions"
-
-    # --- Splunk AI observability context ---
-    _scenario = source_name or (summary.get("latest", {}).get("patient_id") if isinstance(summary.get("latest", {}), dict) else None) or "unknown"
-    _alert_level = summary.get("level", "UNKNOWN")
-    _diagnosis = summary.get("diagnosis", "")
-    _prompt_chars = len(system) + len(json.dumps(user_content))
-
-    def _log_ai_event(ok: bool, latency_s: float, usage: Optional[Dict], status_code: Optional[int] = None, error: Optional[str] = None):
-        splunk_log({
-            "event_type": "ai_inference",
-            "app": "ai_patient_monitor",
-            "scenario": _scenario,
-            "alert_level": _alert_level,
-            "diagnosis": _diagnosis,
-            "model": model,
-            "latency_ms": int(latency_s * 1000),
-            "status_code": status_code,
-            "prompt_chars": _prompt_chars,
-            "tokens_in": (usage or {}).get("prompt_tokens"),
-            "tokens_out": (usage or {}).get("completion_tokens"),
-            "tokens_total": (usage or {}).get("total_tokens"),
-            "success": bool(ok),
-            "error": error,
-        })
-    
-    try:
-        t0 = time.perf_counter()
-        resp = requests.post(url, headers=headers, json=payload, timeout=60)
-        latency = time.perf_counter() - t0
-        
-        if resp.status_code != 200:
-            error_msg = resp.text[:300]
-            _log_ai_event(False, latency, None, status_code=resp.status_code, error=f"LLM API error {resp.status_code}: {error_msg}")
-            return {
-                "ok": False,
-                "error": f"LLM API error {resp.status_code}: {error_msg}",
-                "latency_s": round(latency, 3),
-                "usage": None,
-                "text": None
-            }
-        
-        data = resp.json()
-        text_out = data["choices"][0]["message"]["content"]
-        usage = data.get("usage")
-        
-        _log_ai_event(True, latency, usage, status_code=resp.status_code, error=None)
-        return {
-            "ok": True,
-            "error": None,
-            "latency_s": round(latency, 3),
-            "usage": usage,
-            "text": text_out
-        }
-    
-    except requests.exceptions.Timeout:
-        _log_ai_event(False, 60.0, None, status_code=None, error="Request timed out after 60 seconds")
-        return {
-            "ok": False,
-            "error": "Request timed out after 60 seconds",
-            "latency_s": 60.0,
-            "usage": None,
-            "text": None
-        }
-    except Exception as e:
-        _log_ai_event(False, 0.0, None, status_code=None, error=f"Error calling LLM: {str(e)}")
-        return {
-            "ok": False,
-            "error": f"Error calling LLM: {str(e)}",
-            "latency_s": 0,
-            "usage": None,
-            "text": None
-        }
+start_profile_capture(st.session_state)
+inject_ward_background()
 
-# ============================================================================
-# CONDITION VISUALIZATION
-# ============================================================================
-def get_cached_condition_image(patient_id: str, level: str) -> Optional[bytes]:
-    """Generate or retrieve cached condition illustration"""
-    if not PIL_OK:
-        return None
-    
-    try:
-        # Create simple visual indicator
-        width, height = 520, 200
-        
-        if level == "EMERGENCY":
-            color = (211, 47, 47)
-            text = "⚠️ EMERGENCY"
-        elif level == "WARNING":
-            color = (239, 108, 0)
-            text = "⚠️ WARNING"
-        else:
-            color = (46, 125, 50)
-            text = "✓ NORMAL"
-        
-        img = Image.new('RGB', (width, height), (30, 30, 40))
-        draw = ImageDraw.Draw(img)
-        
-        # Draw border
-        draw.rectangle([10, 10, width-10, height-10], outline=color, width=5)
-        
-        # Add text
-        try:
-            font = ImageFont.truetype("/usr/share/fonts/truetype/dejavu/DejaVuSans-Bold.ttf", 36)
-        except:
-            font = ImageFont.load_default()
-        
-        # Center text
-        bbox = draw.textbbox((0, 0), text, font=font)
-        text_width = bbox[2] - bbox[0]
-        text_height = bbox[3] - bbox[1]
-        position = ((width - text_width) // 2, (height - text_height) // 2)
-        
-        draw.text(position, text, fill=color, font=font)
-        
-        # Convert to bytes
-        buf = io.BytesIO()
-        img.save(buf, format='PNG')
-        return buf.getvalue()
-    
-    except Exception as e:
-        st.warning(f"Could not generate condition image: {e}")
-        return None
+if not state_store.owns_session(st.session_state.pm_session_id, st.session_state.pm_tab_id):
+    st.warning("🗂️ This monitoring session was opened in another tab. Acknowledgements and AI plans "
+               "from this tab are no longer saved.")
+    take_over, split_off = st.columns(2)
+    if take_over.button("Continue in this tab", use_container_width=True):
+        state_store.claim_tab(st.session_state.pm_session_id, st.session_state.pm_tab_id)
+        st.rerun()
+    if split_off.button("Start a separate session here", use_container_width=True):
+        st.session_state.pm_session_id = str(uuid.uuid4())
+        st.query_params["pm_session"] = st.session_state.pm_session_id
+        state_store.claim_tab(st.session_state.pm_session_id, st.session_state.pm_tab_id)
+        persist_state("pm_run_id", st.session_state.pm_run_id)
+        persist_state("sample_file", st.session_state.sample_file)
+        st.rerun()
 
 # ============================================================================
 # MAIN APPLICATION
@@ -671,18 +231,21 @@ with st.sidebar:
         if st.button("Patient 1", use_container_width=True):
             st.session_state.sample_file = "patient1_sepsis.csv"
             st.session_state.ai_cache = {}
+            persist_state("sample_file", "patient1_sepsis.csv")
             play_3_beeps()
     
     with col2:
         if st.button("Patient 2", use_container_width=True):
             st.session_state.sample_file = "patient2_vtach.csv"
             st.session_state.ai_cache = {}
+            persist_state("sample_file", "patient2_vtach.csv")
             play_3_beeps()
     
     with col3:
         if st.button("Patient 3", use_container_width=True):
             st.session_state.sample_file = "patient3_respfailure.csv"
             st.session_state.ai_cache = {}
+            persist_state("sample_file", "patient3_respfailure.csv")
             play_3_beeps()
     
     st.markdown("---")
@@ -692,97 +255,153 @@ with st.sidebar:
         key="auto_ai"
     )
     
+    st.checkbox(
+        "📡 Live refresh (follow sample file as it grows)",
+        key="live_mode",
+        disabled=uploaded is not None,
+        help="Updates vitals, alert banner and chart tails when new rows are appended to the file. "
+             "Uploaded files are static and cannot be followed.",
+    )
+    
+    st.checkbox(
+        "⏪ Replay mode (scrub through this patient's history)",
+        key="replay_mode",
+        help="Shows the alert state, vitals and archived events (logs/events.jsonl) as of any minute.",
+    )
+    
     st.markdown("---")
     if st.button("🔄 Reset Monitor / Clear Data", use_container_width=True):
+        finish_profile_capture(st.session_state)
         _sid = st.session_state.get("pm_session_id")
         for k in list(st.session_state.keys()):
             del st.session_state[k]
         # preserve session id, start a new run
         st.session_state.pm_session_id = _sid or str(uuid.uuid4())
         st.session_state.pm_run_id = str(uuid.uuid4())
+        state_store.clear_session(st.session_state.pm_session_id)
+        state_store.put(st.session_state.pm_session_id, "", "pm_run_id", st.session_state.pm_run_id)
         st.rerun()
 
+    if PM_ADMIN_MODE:
+        with st.expander("🛠️ Admin: Profiling"):
+            n_reruns = st.number_input("Reruns to capture", min_value=1, max_value=20, value=1)
+            if st.button("Capture cProfile + tracemalloc", use_container_width=True):
+                st.session_state.profile_reruns_left = int(n_reruns)
+                st.rerun()
+            if st.session_state.get("profile_reruns_left"):
+                st.caption(f"Capturing — {st.session_state.profile_reruns_left} rerun(s) left")
+            last_capture = st.session_state.get("last_profile_capture")
+            if last_capture:
+                st.caption(f"Last capture: {last_capture['wall_ms']} ms · peak {last_capture['traced_peak_kb']} KiB")
+                st.code(last_capture["pstats_path"] or "(write failed)", language=None)
+
 # ============================================================================
 # LOAD DATA
 # ============================================================================
 df = None
 source_name = None
+rollup_source = None  # names the recording in the rollup registry (two uploads may share a file name)
+data_report = None
+live_feed = None
+live_event = None
 
 if uploaded is not None:
     try:
-        df = pd.read_csv(uploaded)
+        df, data_report = read_vitals_csv(uploaded)
         source_name = uploaded.name
+        rollup_source = f"{uploaded.name}#{uploaded.file_id}"
     except Exception as e:
         st.error(f"Error reading uploaded file: {e}")
         st.stop()
 
 elif st.session_state.get("sample_file") is not None:
     sample_path = st.session_state.sample_file
-    if os.path.exists(sample_path):
-        df = pd.read_csv(sample_path)
-        source_name = sample_path
+    if os.path.exists(sample_path) and st.session_state.live_mode:
+        live_feed = get_feed(sample_path)
+        live_event = live_subscription(sample_path)
+        # Clear before the snapshot so rows appended after it re-arm the event
+        live_event.clear()
+        df, live_version = live_feed.snapshot()
+        data_report = live_feed.report
+        source_name = rollup_source = sample_path
+    elif os.path.exists(sample_path):
+        df, data_report = read_vitals_csv(sample_path)
+        source_name = rollup_source = sample_path
     else:
         st.error(f"Sample file not found: {sample_path}")
         st.info("💡 Make sure patient CSV files are in the same directory as app.py")
         st.stop()
 
-if df is None:
+if live_feed is None:
+    live_subscription(None)
+
+if data_report is None:
     st.info("👈 Select a patient (1/2/3) or upload a CSV to begin monitoring.")
     st.stop()
 
 # ============================================================================
 # VALIDATE DATA
 # ============================================================================
-required_cols = [
-    "patient_id", "timestamp", "ECG", "heart_rate_bpm",
-    "temperature_c", "bp_systolic_mmHg", "bp_diastolic_mmHg", "spo2_percent"
-]
+required_cols = list(VITALS_SCHEMA)
 
-missing = [c for c in required_cols if c not in df.columns]
+missing = data_report["missing_columns"]
 if missing:
     st.error(f"❌ CSV is missing required columns: {', '.join(missing)}")
     st.info("Required columns: " + ", ".join(required_cols))
     st.stop()
 
-# Convert timestamp
-try:
-    df["timestamp"] = pd.to_datetime(df["timestamp"])
-except Exception as e:
-    st.warning(f"Could not parse timestamps: {e}")
+render_data_quality_report(data_report)
+
+if df.empty:
+    st.error("❌ No valid rows left after validation. See the Data Quality report above.")
+    st.stop()
+
+# Live feeds already fold appended rows in on ingest; for a file at rest this is a no-op after the first run
+update_rollups(df, rollup_source)
 
 # ============================================================================
 # ANALYZE PATIENT DATA
 # ============================================================================
+# A fresh ECG waveform channel (see patient_monitor.ecg) adds its rhythm / HR / RRV to the latest row
+patient_id = str(df["patient_id"].iloc[-1])
+restore_patient_state()
+ecg_features = read_ecg_features(patient_id)
+df = with_ecg_features(df, ecg_features)
 summary = detect_conditions(df)
 
 # ============================================================================
 # DISPLAY HEADER METRICS
 # ============================================================================
-c1, c2, c3, c4, c5 = st.columns([2, 3, 2, 2, 2])
+with span("render_header"):
+    c1, c2, c3, c4, c5 = st.columns([2, 3, 2, 2, 2])
 
-with c1:
-    status_chip("Alert Level", summary["level"])
+    with c1:
+        status_chip("Alert Level", summary["level"])
 
-with c2:
-    st.metric("Diagnosis", summary["diagnosis"])
+    with c2:
+        st.metric("Diagnosis", summary["diagnosis"])
 
-with c3:
-    map_val = summary["map"]
-    st.metric("MAP (mmHg)", f"{map_val}" if map_val else "N/A")
+    with c3:
+        map_val = summary["map"]
+        st.metric("MAP (mmHg)", f"{map_val}" if map_val else "N/A")
 
-with c4:
-    last_time = df["timestamp"].iloc[-1]
-    st.metric("Last Updated", str(last_time))
+    with c4:
+        last_time = df["timestamp"].iloc[-1]
+        st.metric("Last Updated", str(last_time))
 
-with c5:
-    conf = estimate_ai_confidence(summary, llm_ok=st.session_state.get("last_llm_ok"))
-    st.metric("AI Confidence", conf)
+    with c5:
+        conf = estimate_ai_confidence(summary, llm_ok=st.session_state.get("last_llm_ok"))
+        st.metric("AI Confidence", conf)
 
 # ============================================================================
 # CONDITION VISUALIZATION
 # ============================================================================
 if summary.get('level') in ['WARNING', 'EMERGENCY']:
-    img_bytes = get_cached_condition_image(source_name, summary['level'])
+    try:
+        img_bytes = get_cached_condition_image(source_name, summary['level'])
+    except Exception as e:
+        st.warning(f"Could not generate condition image: {e}")
+        img_bytes = None
     
     if img_bytes:
         st.markdown("### 📊 Condition Visual Indicator")
@@ -802,44 +421,189 @@ if summary.get('level') in ['WARNING', 'EMERGENCY']:
                     st.write(f"• {flag}")
 
 # ============================================================================
-# EMERGENCY ALERT BANNER
+# LIVE PANELS (alert banner, latest vitals, chart tails)
 # ============================================================================
-# Reset acknowledgement when leaving emergency state
-if summary["level"] != "EMERGENCY":
-    st.session_state.alert_ack = False
-
-if summary["level"] == "EMERGENCY" and not st.session_state.alert_ack:
-    # Sound alarm with cooldown
-    now = time.time()
-    if now - st.session_state.alarm_last_beep_ts > 0.8:
-        play_3_beeps()
-        st.session_state.alarm_last_beep_ts = now
-    
-    splunk_log({"event_type":"clinical_alert","app":"ai_patient_monitor","scenario": source_name or "unknown","alert_level":"EMERGENCY","diagnosis": summary.get("diagnosis",""),"flags": summary.get("flags", [])})
-    flashing_red_banner("EMERGENCY DETECTED — IMMEDIATE ACTION REQUIRED")
-    
-    if st.button("✅ Acknowledge Alert", type="primary"):
-        st.session_state.alert_ack = True
-        splunk_log({"event_type":"alert_acknowledged","app":"ai_patient_monitor","scenario": source_name or "unknown","alert_level":"EMERGENCY","diagnosis": summary.get("diagnosis","")})
-        st.success("✓ Alert acknowledged. Continue monitoring per protocol.")
-        st.rerun()
+# In live mode these run inside st.fragment(run_every=PM_LIVE_POLL_S). A tick
+# only checks the ingest layer's change Event; rules are re-evaluated and the
+# chart frames rebuilt only when new samples arrived. The rest of the page is
+# never rebuilt on a timer.
+def build_live_view(view_df, view_summary, version: int, ecg=None) -> Dict[str, Any]:
+    """Precompute everything the live panels draw for one data version"""
+    tail = view_df.tail(PM_LIVE_CHART_ROWS) if live_feed is not None else view_df
+    indexed = tail.set_index("timestamp")
+    return {
+        "path": source_name,
+        "version": version,
+        "rows": len(view_df),
+        "summary": view_summary,
+        "hr_spo2": indexed[["heart_rate_bpm", "spo2_percent"]],
+        "temp_bp": indexed[["temperature_c", "bp_systolic_mmHg", "bp_diastolic_mmHg"]],
+        "ecg": ecg,
+    }
 
-elif summary["level"] == "EMERGENCY" and st.session_state.alert_ack:
-    st.info("✓ Emergency alert acknowledged. Monitor closely and follow protocols.")
 
-# ============================================================================
-# LATEST VITALS
-# ============================================================================
-st.subheader("📊 Latest Vitals (Most Recent Minute)")
+def refresh_live_view() -> Dict[str, Any]:
+    """The current live view, rebuilt when new samples or a new ECG rhythm arrived.
+
+    Both live fragments call this; whichever ticks first rebuilds the shared
+    view. Freshness for the alarm path is decided by render_alert_banner().
+    """
+    view = st.session_state.live_view
+    if live_event is None or view is None or view["path"] != source_name:
+        return view
+    ecg = read_ecg_features(patient_id)
+    rhythm_changed = (ecg or {}).get("rhythm") != (view["ecg"] or {}).get("rhythm")
+    if not live_event.is_set() and not rhythm_changed:
+        if ecg is not None:
+            # Same rhythm: refresh the waveform metrics without re-running the rules
+            view = st.session_state.live_view = dict(view, ecg=ecg)
+        return view
+    live_event.clear()
+    new_df, version = live_feed.snapshot()
+    if version == view["version"] and not rhythm_changed:
+        return view
+    new_df = with_ecg_features(new_df, ecg)
+    new_summary = detect_conditions(new_df)
+    METRICS.alerts_by_level[new_summary["level"]].inc()
+    view = build_live_view(new_df, new_summary, version, ecg)
+    st.session_state.live_view = view
+    return view
+
+
+def render_alert_banner(view: Dict[str, Any]):
+    """Emergency banner + acknowledgement.
+
+    Alarm and clinical_alert fire once per data version / ECG rhythm (and on every
+    full rerun), whichever fragment rebuilt the view.
+    """
+    view_summary = view["summary"]
+    alert_key = (view["path"], view["version"], (view["ecg"] or {}).get("rhythm"))
+    fresh = alert_key != st.session_state.last_alerted_view
+    st.session_state.last_alerted_view = alert_key
+    # Reset acknowledgement when leaving emergency state
+    if view_summary["level"] != "EMERGENCY" and st.session_state.alert_ack:
+        st.session_state.alert_ack = False
+        persist_patient_state("alert_ack", False)
+    # One patient per page: a previously loaded patient's alarm must not keep sounding
+    alarm_stop_all(keep=patient_id)
+    if view_summary["level"] != "EMERGENCY" or st.session_state.alert_ack:
+        alarm_stop(patient_id)
+
+    if view_summary["level"] == "EMERGENCY" and not st.session_state.alert_ack:
+        if fresh:
+            # Sound alarm with cooldown
+            now = time.time()
+            if now - st.session_state.alarm_last_beep_ts > 0.8:
+                alarm_start(patient_id)
+                st.session_state.alarm_last_beep_ts = now
+                persist_patient_state("alarm_last_beep_ts", now)
+
+            splunk_log({"event_type":"clinical_alert","app":"ai_patient_monitor","scenario": source_name or "unknown","alert_level":"EMERGENCY","diagnosis": view_summary.get("diagnosis",""),"flags": view_summary.get("flags", []),"data_ts": data_ts(view_summary)})
+        flashing_red_banner("EMERGENCY DETECTED — IMMEDIATE ACTION REQUIRED")
+
+        if st.button("✅ Acknowledge Alert", type="primary"):
+            st.session_state.alert_ack = True
+            persist_patient_state("alert_ack", True)
+            alarm_stop(patient_id)
+            METRICS.alert_acks.inc()
+            splunk_log({"event_type":"alert_acknowledged","app":"ai_patient_monitor","scenario": source_name or "unknown","alert_level":"EMERGENCY","diagnosis": view_summary.get("diagnosis",""),"data_ts": data_ts(view_summary)})
+            st.success("✓ Alert acknowledged. Continue monitoring per protocol.")
+            st.rerun()
+
+    elif view_summary["level"] == "EMERGENCY" and st.session_state.alert_ack:
+        st.info("✓ Emergency alert acknowledged. Monitor closely and follow protocols.")
+
+
+def render_latest_vitals(view_summary: Dict[str, Any]):
+    st.subheader("📊 Latest Vitals (Most Recent Minute)")
+
+    with span("render_vitals"):
+        latest = view_summary["latest"]
+        m1, m2, m3, m4, m5 = st.columns(5)
+
+        m1.metric("Heart Rate", f"{latest['heart_rate_bpm']} bpm")
+        m2.metric("Temperature", f"{latest['temperature_c']} °C")
+        m3.metric("Blood Pressure", f"{latest['bp_systolic_mmHg']}/{latest['bp_diastolic_mmHg']}")
+        m4.metric("SpO₂", f"{latest['spo2_percent']}%")
+        m5.metric("ECG", latest['ECG'])
+
+
+def render_trend_charts(view: Dict[str, Any]):
+    hr_spo2, temp_bp = view["hr_spo2"], view["temp_bp"]
+    raw_span_s = (hr_spo2.index[-1] - hr_spo2.index[0]).total_seconds() if len(hr_spo2) > 1 else 0.0
+    # Longer horizons read the coarsest rollup resolution that still fills the chart
+    rollup = get_rollup(patient_id, rollup_source, create=False)
+    covered_s = rollup.covered_s() if rollup is not None else 0.0
+    horizons = [h for h in TREND_HORIZONS_H
+                if rollup is not None and h * 3600 > raw_span_s and rollup.beyond(raw_span_s, h * 3600)]
+    horizon = None
+    if horizons:
+        horizon = st.radio(
+            "Trend horizon",
+            [None] + horizons,
+            format_func=lambda h: "Recent" if h is None else f"{h} h",
+            horizontal=True,
+            key="trend_horizon",
+        )
+
+    if horizon is None:
+        st.subheader(f"📈 Trends (Last {max(1, round(raw_span_s / 60))} Minutes)")
+    else:
+        resolution, buckets = rollup.window(horizon * 3600)
+        if resolution is not None and not buckets.empty:
+            means = buckets[[f"{v}_mean" for v in ROLLUP_VITALS]].rename(columns=lambda c: c[:-len("_mean")])
+            hr_spo2 = means[["heart_rate_bpm", "spo2_percent"]]
+            temp_bp = means[["temperature_c", "bp_systolic_mmHg", "bp_diastolic_mmHg"]]
+        st.subheader(f"📈 Trends (Last {horizon} Hours)")
+        st.caption(f"{resolution} means · {len(hr_spo2)} points · {covered_s / 3600:.1f} h of data retained")
+
+    with span("render_charts"):
+        colA, colB = st.columns(2)
+
+        with colA:
+            st.markdown("**Heart Rate & Oxygen**")
+            st.line_chart(hr_spo2)
+
+        with colB:
+            st.markdown("**Temperature & Blood Pressure**")
+            st.line_chart(temp_bp)
+
+
+live_fragment = st.fragment(run_every=PM_LIVE_POLL_S if live_feed is not None else None)
+
+
+@live_fragment
+def live_status_panel():
+    bind_session_correlation()
+    view = refresh_live_view()
+    if live_feed is not None:
+        st.caption(
+            f"📡 Live · {view['rows']} samples · last {view['summary']['latest'].get('timestamp')}"
+            f" · feed v{view['version']}"
+            + (f" · {live_feed.rows_rejected} late row(s) rejected" if live_feed.rows_rejected else "")
+        )
+    render_alert_banner(view)
+    # Same key on every run: the component mounts once and then only receives state updates
+    render_alarm_channel()
+    render_latest_vitals(view["summary"])
+
+
+@live_fragment
+def live_trends_panel():
+    bind_session_correlation()
+    view = refresh_live_view()
+    render_trend_charts(view)
+    if view["ecg"]:
+        st.subheader("🫀 ECG Waveform")
+        with span("render_ecg"):
+            render_ecg_panel(view["ecg"], read_ecg_strip(patient_id))
 
-latest = summary["latest"]
-m1, m2, m3, m4, m5 = st.columns(5)
 
-m1.metric("Heart Rate", f"{latest['heart_rate_bpm']} bpm")
-m2.metric("Temperature", f"{latest['temperature_c']} °C")
-m3.metric("Blood Pressure", f"{latest['bp_systolic_mmHg']}/{latest['bp_diastolic_mmHg']}")
-m4.metric("SpO₂", f"{latest['spo2_percent']}%")
-m5.metric("ECG", latest['ECG'])
+METRICS.alerts_by_level[summary["level"]].inc()
+# A full rerun always counts as fresh data for the alarm path
+st.session_state.last_alerted_view = None
+st.session_state.live_view = build_live_view(df, summary, live_version if live_feed is not None else 0, ecg_features)
+live_status_panel()
 
 # ============================================================================
 # EXPLAINABILITY
@@ -859,30 +623,57 @@ with st.expander("🔍 Why This Alert? (Explainability)"):
     st.write("""
     - Severe hypoxemia: SpO₂ < 88%
     - Hypotension: SBP < 90 or MAP < 65
-    - Suspected V-tach: HR ≥ 160 or V-tach ECG pattern
+    - Suspected V-tach: HR ≥ 160, V-tach ECG label, or wide-complex tachycardia on the ECG waveform
+    - Asystole: no QRS complex on the ECG waveform for 4 s
     - Sepsis pattern: 3+ of (fever/hypothermia, tachycardia, hypotension, hypoxemia)
     """)
 
-# ============================================================================
-# TREND CHARTS
-# ============================================================================
-st.subheader("📈 Trends (Last 60 Minutes)")
-
-colA, colB = st.columns(2)
-
-with colA:
-    st.markdown("**Heart Rate & Oxygen**")
-    st.line_chart(df.set_index("timestamp")[["heart_rate_bpm", "spo2_percent"]])
-
-with colB:
-    st.markdown("**Temperature & Blood Pressure**")
-    st.line_chart(df.set_index("timestamp")[["temperature_c", "bp_systolic_mmHg", "bp_diastolic_mmHg"]])
+live_trends_panel()
 
 # ============================================================================
 # RAW DATA
 # ============================================================================
-with st.expander("📋 Show Raw Data (CSV)"):
-    st.dataframe(df, use_container_width=True)
+def row_alerts_for(view_df):
+    """Per-row rule results, computed once per data version and kept in the session"""
+    key = (source_name, len(view_df), str(view_df["timestamp"].iloc[-1]), view_df.iloc[-1].get("ecg_rhythm"))
+    cached = st.session_state.get("row_alerts")
+    if cached is None or cached[0] != key:
+        cached = (key, classify_rows(view_df))
+        st.session_state.row_alerts = cached
+    return cached[1]
+
+
+with span("render_raw_data"):
+    with st.expander("📋 Show Raw Data (CSV)"):
+        render_raw_data_view(df, row_alerts_for(df), os.path.splitext(os.path.basename(source_name))[0])
+
+# ============================================================================
+# REPLAY / TIME TRAVEL
+# ============================================================================
+if st.session_state.replay_mode:
+    with span("render_replay"):
+        st.subheader("⏪ Replay")
+        event_index = get_event_index()
+        current_run = st.session_state.pm_run_id
+        run_options = [current_run] + [r for r in event_index.run_ids(scenario=source_name) if r != current_run]
+        replay_run = st.selectbox("Run (pm_run_id)", run_options, key="replay_run",
+                                  format_func=lambda r: f"{r} (current)" if r == current_run else r)
+        with st.expander("📚 Run Summary (local event archive)"):
+            run_summary = event_index.run_summary(replay_run)
+            sum_cols = st.columns(5)
+            sum_cols[0].metric("🚨 Emergencies", run_summary["emergency_count"])
+            sum_cols[1].metric("🤖 AI Calls", run_summary["ai_calls"], f"{run_summary['success_rate_pct']}% ok",
+                               delta_color="off")
+            sum_cols[2].metric("⏱️ p95 Latency", f"{run_summary['p95_latency_ms']} ms")
+            sum_cols[3].metric("🔢 Tokens", run_summary["tokens_sum"])
+            sum_cols[4].metric("💲 Est. Cost", f"${run_summary['est_cost_usd']}")
+            st.dataframe(pd.DataFrame(event_index.stats(("event_type", "alert_level"), pm_run_id=replay_run)),
+                         use_container_width=True, hide_index=True)
+        render_replay_view(
+            df, row_alerts_for(df),
+            events_at=lambda at: event_index.query(replay_run, source_name, at, at, REPLAY_EVENT_TYPES),
+            last_event=lambda at, event_type: event_index.last(replay_run, source_name, at, event_type),
+        )
 
 # ============================================================================
 # AGENTIC AI - ACTION SUGGESTIONS
@@ -898,35 +689,88 @@ else:
     # Create cache key
     last_ts = df["timestamp"].iloc[-1]
     cache_key = f"{source_name}|{summary['level']}|{summary['diagnosis']}|{str(last_ts)}"
+    plan_meta = {
+        "signature": clinical_signature(summary, df),
+        "data_ts": pd.Timestamp(last_ts).timestamp(),
+        "source_name": source_name,
+    }
     
     regen = st.button("🔄 Re-generate AI Action Plan")
-    
-    # Generate AI response if needed
+    fallback = fallback_action_plan(summary)
+    
+    # An LLM answer that missed the SLO replaces the checklist once it arrives
+    pending = st.session_state.pending_llm.get(cache_key)
+    if pending is not None and pending.done():
+        del st.session_state.pending_llm[cache_key]
+        if pending.result().get("ok") and not regen:
+            st.session_state.ai_cache[cache_key] = dict(
+                hedge_action_plan(pending, fallback, summary, source_name=source_name), **plan_meta)
+            persist_patient_state(f"ai_cache:{cache_key}", st.session_state.ai_cache[cache_key])
+            st.session_state.last_llm_ok = True
+    
+    # Generate AI response if needed; an unchanged clinical state reuses an earlier plan
+    if cache_key in st.session_state.ai_cache:
+        METRICS.cache_hit.inc()
+    else:
+        similar = None if regen else find_similar_plan(
+            st.session_state.ai_cache, source_name, plan_meta["signature"], plan_meta["data_ts"])
+        if similar is None:
+            METRICS.cache_miss.inc()
+        else:
+            similar_key, similar_result, distance = similar
+            METRICS.cache_similar_hit.inc()
+            age_s = plan_meta["data_ts"] - similar_result["data_ts"]
+            splunk_log({"event_type": "ai_cache_similarity_hit", "app": "ai_patient_monitor",
+                        "scenario": source_name or "unknown", "alert_level": summary["level"],
+                        "diagnosis": summary["diagnosis"], "matched_key": similar_key,
+                        "bin_distance": distance, "plan_age_s": int(age_s)})
+            st.session_state.ai_cache[cache_key] = dict(similar_result, similar_to=similar_key,
+                                                        similarity_distance=distance)
+            persist_patient_state(f"ai_cache:{cache_key}", st.session_state.ai_cache[cache_key])
     if (st.session_state.auto_ai and cache_key not in st.session_state.ai_cache) or regen:
+        preview = st.empty()
+        with preview.container():
+            st.info("⚡ Protocol checklist shown while the AI action plan is generated")
+            st.markdown(fallback["text"])
         with st.spinner("🤖 Calling AI..."):
             df_tail = df.tail(60)
-            result = call_llm_actions(summary, df_tail, source_name=source_name)
-            st.session_state.last_llm_ok = bool(result.get("ok"))
+            future = submit_llm_actions(summary, df_tail, source_name=source_name, api_key=openai_api_key(),
+                                        rollup_source=rollup_source)
+            result = hedge_action_plan(future, fallback, summary, source_name=source_name)
+            st.session_state.last_llm_ok = result.get("served_by") == "llm"
+            if not future.done():
+                st.session_state.pending_llm[cache_key] = future
+        preview.empty()
         
+        result = dict(result, **plan_meta)
         st.session_state.ai_cache[cache_key] = result
+        persist_patient_state(f"ai_cache:{cache_key}", result)
     else:
         result = st.session_state.ai_cache.get(cache_key)
     
     # Display results
     if not result:
         st.warning("⏳ AI action plan not generated yet. Click the button above.")
+        st.markdown("### ⚡ Protocol Checklist (Rule-Based)")
+        st.markdown(fallback["text"])
     else:
         # === AI OBSERVABILITY ===
         st.markdown("### 📊 AI Observability")
         
-        obs_col1, obs_col2 = st.columns(2)
+        obs_col1, obs_col2, obs_col3 = st.columns(3)
         
         with obs_col1:
             latency = result.get("latency_s", 0)
             st.metric("⏱️ Latency", f"{latency}s")
         
         with obs_col2:
-            status = "✅ Success" if result.get("ok") else "❌ Failed"
+            st.metric("⏳ Queue Wait", f"{result.get('queue_wait_s') or 0}s")
+        
+        with obs_col3:
+            if result.get("served_by") == "fallback":
+                status = "⚡ Fallback"
+            else:
+                status = "✅ Success" if result.get("ok") else "❌ Failed"
             st.metric("Status", status)
         
         st.markdown("**Token Usage:**")
@@ -939,30 +783,44 @@ else:
         st.markdown("---")
         
         # === AI-GENERATED ACTIONS ===
-        if not result.get("ok"):
-            st.error(f"❌ {result.get('error')}")
+        llm_error = result.get("error") or result.get("llm_error")
+        if result.get("served_by") == "fallback":
+            if result.get("fallback_reason") == "slo_miss":
+                st.warning(f"⚡ AI response slower than the {PM_LLM_SLO_S:g}s target — showing the rule-based "
+                           "protocol checklist. The AI plan will replace it on a later refresh if it arrives.")
+            else:
+                st.warning(f"⚡ AI unavailable ({llm_error}) — showing the rule-based protocol checklist.")
+        elif not result.get("ok"):
+            st.error(f"❌ {llm_error}")
+        
+        if "API key" in str(llm_error):
+            st.info("""
+            **How to add your API key:**
             
-            if "API key" in str(result.get('error')):
-                st.info("""
-                **How to add your API key:**
-                
-                Option 1: Environment Variable
-                ```bash
-                export OPENAI_API_KEY='your-key-here'
-                streamlit run app.py
-                ```
-                
-                Option 2: Streamlit Secrets
-                Create `.streamlit/secrets.toml`:
-                ```toml
-                OPENAI_API_KEY = "your-key-here"
-                ```
-                """)
-        else:
-            st.markdown("### 💡 Suggested Actions (AI-Generated)")
+            Option 1: Environment Variable
+            ```bash
+            export OPENAI_API_KEY='your-key-here'
+            streamlit run app.py
+            ```
+            
+            Option 2: Streamlit Secrets
+            Create `.streamlit/secrets.toml`:
+            ```toml
+            OPENAI_API_KEY = "your-key-here"
+            ```
+            """)
+        
+        if result.get("ok"):
+            from_llm = result.get("served_by") != "fallback"
+            if from_llm:
+                st.markdown("### 💡 Suggested Actions (AI-Generated)")
+            else:
+                st.markdown("### ⚡ Protocol Checklist (Rule-Based)")
             st.markdown(result.get("text"))
             
             # Download action plan
+            disclaimer = ("This is an AI-generated suggestion." if from_llm
+                          else "This is a rule-based protocol checklist (AI unavailable).")
             action_text = f"""
 AI-BASED PATIENT MONITOR - ACTION PLAN
 Generated: {pd.Timestamp.now()}
@@ -974,7 +832,7 @@ ALERT LEVEL: {summary['level']}
 {result.get('text')}
 
 ---
-This is an AI-generated suggestion. Follow facility protocols and clinical judgment.
+{disclaimer} Follow facility protocols and clinical judgment.
 """
             st.download_button(
                 label="📥 Download Action Plan",
@@ -983,6 +841,16 @@ This is an AI-generated suggestion. Follow facility protocols and clinical judgm
                 mime="text/plain"
             )
 
+# ============================================================================
+# RENDER PROFILE (per-stage timings for this rerun)
+# ============================================================================
+finish_profile_capture(st.session_state, scenario=source_name or "unknown", alert_level=summary.get("level", "UNKNOWN"))
+render_profile_panel(finish_render_profile(
+    scenario=source_name or "unknown",
+    alert_level=summary.get("level", "UNKNOWN"),
+    rows=len(df),
+))
+
 # ============================================================================
 # FOOTER
 # ============================================================================
@@ -993,107 +861,3 @@ st.sidebar.caption(f"Mgmt URL set: {bool(SPLUNK_MGMT_URL)}")
 st.sidebar.caption(f"Mgmt URL set: {bool(os.getenv('SPLUNK_MGMT_URL'))}")
 st.sidebar.caption(f"Username set: {bool(SPLUNK_USERNAME)}")
 st.sidebar.caption(f"Password set: {bool(SPLUNK_PASSWORD)}")
-# ==========================================================
-# Splunk REST Search (Management API 8089) — for in-app summaries
-# ==========================================================
-
-def splunk_rest_enabled() -> bool:
-    return bool(SPLUNK_MGMT_URL and SPLUNK_USERNAME and SPLUNK_PASSWORD)
-
-def run_splunk_search(query: str, earliest: str = "-60m", latest: str = "now", timeout_s: int = 20) -> List[Dict[str, Any]]:
-    """
-    Run a Splunk search via Management API and return results (JSON rows).
-    Note: For localhost demos, PM_SPLUNK_VERIFY_TLS=0 is fine; production should verify TLS.
-    """
-    jobs_url = f"{SPLUNK_MGMT_URL}/services/search/jobs"
-    # Splunk expects 'search' prefixed with 'search ' if using raw SPL
-    data = {
-        "search": f"search {query}",
-        "earliest_time": earliest,
-        "latest_time": latest,
-        "output_mode": "json",
-        "exec_mode": "normal",
-    }
-
-    r = requests.post(jobs_url, data=data, auth=(SPLUNK_USERNAME, SPLUNK_PASSWORD), verify=PM_SPLUNK_VERIFY_TLS, timeout=10)
-    r.raise_for_status()
-
-    try:
-        sid = r.json().get("sid")
-    except Exception:
-        sid = None
-    if not sid:
-        raise RuntimeError("Splunk did not return a search job SID (sid).")
-
-    job_url = f"{SPLUNK_MGMT_URL}/services/search/jobs/{sid}"
-    t0 = time.time()
-    while True:
-        jr = requests.get(job_url, params={"output_mode": "json"}, auth=(SPLUNK_USERNAME, SPLUNK_PASSWORD),
-                          verify=PM_SPLUNK_VERIFY_TLS, timeout=10)
-        jr.raise_for_status()
-        payload = jr.json()
-        entry = (payload.get("entry") or [{}])[0]
-        content = entry.get("content", {})
-        if content.get("isDone") is True or content.get("dispatchState") == "DONE":
-            break
-        if time.time() - t0 > timeout_s:
-            raise TimeoutError("Timed out waiting for Splunk search completion.")
-        time.sleep(0.6)
-
-    results_url = f"{SPLUNK_MGMT_URL}/services/search/jobs/{sid}/results"
-    rr = requests.get(results_url, params={"output_mode": "json", "count": 0}, auth=(SPLUNK_USERNAME, SPLUNK_PASSWORD),
-                      verify=PM_SPLUNK_VERIFY_TLS, timeout=10)
-    rr.raise_for_status()
-    return rr.json().get("results") or []
-
-def get_demo_run_summary(pm_run_id: str) -> Dict[str, Any]:
-    """
-    Summarize this demo run using pm_run_id correlation.
-    Looks back 24h to avoid time-range surprises during demos.
-    """
-    base = f'index={SPLUNK_INDEX} sourcetype="{SPLUNK_SOURCETYPE}" pm_run_id="{pm_run_id}"'
-
-    q_ai = base + ' event_type="ai_inference" ' \
-        '| eval latency_ms=tonumber(latency_ms) ' \
-        '| eval tokens_total=tonumber(tokens_total) ' \
-        '| eval est=tonumber(estimated_cost_usd) ' \
-        '| eval s=case(success="true",1, success=1,1, true(),0) ' \
-        '| stats count as ai_calls sum(s) as successes ' \
-        '       avg(latency_ms) as avg_latency_ms p95(latency_ms) as p95_latency_ms ' \
-        '       sum(tokens_total) as tokens_sum sum(est) as est_cost_usd'
-
-    rows = run_splunk_search(q_ai, earliest="-24h", latest="now")
-    ai = rows[0] if rows else {}
-
-    q_em = base + ' event_type="clinical_alert" alert_level="EMERGENCY" | stats count as emergency_count'
-    rows2 = run_splunk_search(q_em, earliest="-24h", latest="now")
-    em = rows2[0] if rows2 else {}
-
-    def _to_int(v, default=0):
-        try:
-            return int(float(v))
-        except Exception:
-            return default
-
-    def _to_float(v, default=0.0):
-        try:
-            return float(v)
-        except Exception:
-            return default
-
-    ai_calls = _to_int(ai.get("ai_calls"), 0)
-    successes = _to_int(ai.get("successes"), 0)
-    failures = max(ai_calls - successes, 0)
-    success_rate = round((100.0 * successes / ai_calls), 2) if ai_calls else 0.0
-
-    return {
-        "ai_calls": ai_calls,
-        "successes": successes,
-        "failures": failures,
-        "success_rate_pct": success_rate,
-        "avg_latency_ms": _to_int(ai.get("avg_latency_ms"), 0),
-        "p95_latency_ms": _to_int(ai.get("p95_latency_ms"), 0),
-        "tokens_sum": _to_int(ai.get("tokens_sum"), 0),
-        "est_cost_usd": round(_to_float(ai.get("est_cost_usd"), 0.0), 4),
-        "emergency_count": _to_int(em.get("emergency_count"), 0),
-    }
@@ -0,0 +1,80 @@
+"""Core library for the AI-Based Patient Monitor.
+
+Rules, vitals I/O, telemetry and the LLM client live here so they can be
+imported headless (CLI tools, load tests) without Streamlit. Heavy
+dependencies (pandas, requests, PIL) are imported on first use, and the
+names below are resolved lazily so `import patient_monitor` stays cheap.
+`patient_monitor.ui` is the only module that imports streamlit.
+"""
+import importlib
+from typing import Any
+
+_EXPORTS = {
+    # rules
+    "detect_conditions": "rules",
+    "estimate_ai_confidence": "rules",
+    "make_json_safe": "rules",
+    # vitals I/O
+    "VITALS_SCHEMA": "vitals_io",
+    "VITALS_RANGES": "vitals_io",
+    "read_vitals_csv": "vitals_io",
+    # telemetry
+    "splunk_log": "telemetry",
+    "bind_correlation": "telemetry",
+    "span": "telemetry",
+    "timed": "telemetry",
+    "begin_render_profile": "telemetry",
+    "finish_render_profile": "telemetry",
+    # metrics
+    "METRICS": "metrics",
+    "MetricsRegistry": "metrics",
+    "ensure_metrics_server": "metrics",
+    # LLM client
+    "call_llm_actions": "llm",
+    "build_llm_prompt": "llm",
+    # LLM scheduler
+    "InferenceScheduler": "scheduler",
+    "get_scheduler": "scheduler",
+    "submit_llm_actions": "scheduler",
+    # template fallback
+    "fallback_action_plan": "fallback",
+    "hedge_action_plan": "fallback",
+    # AI plan cache
+    "clinical_signature": "plan_cache",
+    "find_similar_plan": "plan_cache",
+    # ECG waveform
+    "get_ecg_channel": "ecg",
+    "read_ecg_features": "ecg",
+    "detect_r_peaks": "ecg",
+    # vitals rollups
+    "get_rollup": "rollups",
+    "update_rollups": "rollups",
+    # persisted session state
+    "get_session_store": "session_store",
+    # local event archive
+    "get_event_index": "event_index",
+    # profiling
+    "start_profile_capture": "profiling",
+    "finish_profile_capture": "profiling",
+    # Splunk REST
+    "run_splunk_search": "splunk_search",
+    "get_demo_run_summary": "splunk_search",
+    "splunk_rest_enabled": "splunk_search",
+    # visuals
+    "get_cached_condition_image": "visuals",
+}
+
+__all__ = sorted(_EXPORTS)
+
+
+def __getattr__(name: str) -> Any:
+    module = _EXPORTS.get(name)
+    if module is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(f".{module}", __name__), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(list(globals()) + __all__)
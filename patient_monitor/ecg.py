@@ -0,0 +1,550 @@
+"""ECG waveform channel: memory-mapped sample store, streaming R-peak detection, rhythm features.
+
+Each patient's raw ECG (millivolts, 250-500 Hz) is appended to a fixed-size
+ring buffer in a memory-mapped file under PM_ECG_DIR. Samples therefore stay
+out of the Python heap, and any process (a bedside bridge running
+`python -m patient_monitor.ecg ingest`, or the app) can read the same
+channel. R-peaks are found with numpy only:
+
+- baseline removal and smoothing with cumsum moving averages;
+- an adaptive amplitude threshold with a fixed floor (PM_ECG_MIN_QRS_MV);
+- local maxima, then a refractory period.
+
+Streaming detection works on chunks with a short overlap. A peak is only
+committed once the look-ahead after it has arrived, so chunk boundaries
+neither split nor duplicate beats. HR and RR-interval variability (SDNN,
+RMSSD) come from the recent beats. A small rule-based classifier maps them,
+together with the R-wave width, to a rhythm label that detect_conditions
+uses next to the charted ECG label:
+
+Sinus / Sinus Tachycardia / Sinus Bradycardia / AFib / V-tach / Asystole / Lead off
+
+The thresholds are heuristics for decision support, not a validated
+arrhythmia detector.
+
+    python -m patient_monitor.ecg simulate --patients 40 --fs 500 --seconds 60
+"""
+import os
+import re
+import sys
+import json
+import time
+import argparse
+import threading
+from typing import TYPE_CHECKING, Any, Dict, Optional, Tuple
+
+if TYPE_CHECKING:
+    import numpy as np
+    import pandas as pd
+
+PM_ECG_DIR = os.getenv("PM_ECG_DIR", "logs/ecg").strip() or "logs/ecg"
+PM_ECG_BUFFER_S = float(os.getenv("PM_ECG_BUFFER_S", "300"))       # ring buffer length per patient
+PM_ECG_WINDOW_S = float(os.getenv("PM_ECG_WINDOW_S", "10"))        # beats used for HR / RRV / rhythm
+PM_ECG_STALE_S = float(os.getenv("PM_ECG_STALE_S", "5"))           # ignore channels not written for this long
+PM_ECG_MIN_QRS_MV = float(os.getenv("PM_ECG_MIN_QRS_MV", "0.15"))  # amplitude floor for an R-peak
+PM_ECG_ASYSTOLE_S = float(os.getenv("PM_ECG_ASYSTOLE_S", "4"))     # no beat for this long = asystole
+
+REFRACTORY_S = 0.2        # fastest rhythm considered: 300 bpm
+MARGIN_S = 0.5            # filter context kept ahead of the scan position
+LOOKAHEAD_S = 0.5         # a peak is committed once this much signal follows it
+BASELINE_S = 0.3          # moving-average window removed as baseline wander
+SMOOTH_S = 0.025          # moving-average window against mains / EMG noise
+WIDE_R_MS = 60            # R-wave width at half amplitude above which a complex is "wide"
+IRREGULAR_RATIO = 0.15    # RMSSD / mean RR above which the rhythm is "irregularly irregular"
+
+_MAGIC = 0x50_4D_45_43_47  # "PMECG"
+_HEADER = 8                # int64 words: magic, version, fs, capacity, total, last_write_ns, reserved x2
+_STORES: Dict[str, "WaveformStore"] = {}
+_CHANNELS: Dict[str, "EcgChannel"] = {}
+_registry_lock = threading.Lock()
+
+
+def channel_path(patient_id: str) -> str:
+    safe = re.sub(r"[^A-Za-z0-9_.-]", "_", str(patient_id)) or "unknown"
+    return os.path.join(PM_ECG_DIR, f"{safe}.ecg")
+
+
+# ============================================================================
+# MEMORY-MAPPED SAMPLE STORE
+# ============================================================================
+class WaveformStore:
+    """Fixed-capacity float32 ring buffer in a memory-mapped file (one writer, any number of readers)"""
+
+    def __init__(self, path: str, fs: Optional[int] = None, capacity_s: float = PM_ECG_BUFFER_S):
+        import numpy as np
+
+        self.path = path
+        if not os.path.exists(path):
+            if fs is None:
+                raise FileNotFoundError(path)
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+            capacity = int(fs * capacity_s)
+            header = np.memmap(path, dtype=np.int64, mode="w+", shape=(_HEADER,))
+            header[:5] = (_MAGIC, 1, int(fs), capacity, 0)
+            header.flush()
+            del header
+        self._header = np.memmap(path, dtype=np.int64, mode="r+", shape=(_HEADER,))
+        if self._header[0] != _MAGIC:
+            raise ValueError(f"{path} is not an ECG waveform store")
+        self.fs = int(self._header[2])
+        self.capacity = int(self._header[3])
+        if fs is not None and int(fs) != self.fs:
+            raise ValueError(f"{path} was created at {self.fs} Hz, not {fs} Hz")
+        self._samples = np.memmap(path, dtype=np.float32, mode="r+", offset=_HEADER * 8, shape=(self.capacity,))
+
+    @property
+    def total(self) -> int:
+        """Samples written since the store was created"""
+        return int(self._header[4])
+
+    @property
+    def last_write(self) -> float:
+        return int(self._header[5]) / 1e9
+
+    def append(self, samples: "np.ndarray") -> int:
+        import numpy as np
+
+        samples = np.asarray(samples, dtype=np.float32)
+        count = len(samples)
+        samples = samples[-self.capacity:]
+        start = (self.total + count - len(samples)) % self.capacity
+        first = min(len(samples), self.capacity - start)
+        self._samples[start:start + first] = samples[:first]
+        self._samples[:len(samples) - first] = samples[first:]
+        # Publish the new total only after the samples are in place
+        self._header[4] = self.total + count
+        self._header[5] = time.time_ns()
+        return self.total
+
+    def latest(self, n: int) -> "np.ndarray":
+        """The last n samples (fewer if not written yet), oldest first"""
+        import numpy as np
+
+        total = self.total
+        n = min(n, total, self.capacity)
+        end = total % self.capacity
+        if n <= end:
+            return np.array(self._samples[end - n:end])
+        return np.concatenate([self._samples[self.capacity - (n - end):], self._samples[:end]])
+
+
+def open_store(patient_id: str) -> Optional[WaveformStore]:
+    """Existing store for a patient, or None when nothing has been ingested"""
+    path = channel_path(patient_id)
+    with _registry_lock:
+        store = _STORES.get(path)
+        if store is None and os.path.exists(path):
+            store = _STORES[path] = WaveformStore(path)
+        return store
+
+
+# ============================================================================
+# R-PEAK DETECTION
+# ============================================================================
+def _moving_average(x: "np.ndarray", n: int) -> "np.ndarray":
+    """Centered moving average with edge padding, O(len(x)) via cumsum"""
+    import numpy as np
+
+    if n <= 1 or len(x) < n:
+        return x
+    c = np.cumsum(np.concatenate(([0.0], x)))
+    ma = (c[n:] - c[:-n]) / n
+    return np.pad(ma, ((n - 1) // 2, n - 1 - (n - 1) // 2), mode="edge")
+
+
+def _filtered(x: "np.ndarray", fs: int) -> "np.ndarray":
+    hp = x - _moving_average(x, int(BASELINE_S * fs))
+    return _moving_average(hp, int(SMOOTH_S * fs))
+
+
+def _r_widths(bp: "np.ndarray", peaks: "np.ndarray", fs: int) -> "np.ndarray":
+    """R-wave width at half amplitude (seconds) for each peak, vectorized over peaks"""
+    import numpy as np
+    from numpy.lib.stride_tricks import sliding_window_view
+
+    w = int(0.15 * fs)
+    windows = sliding_window_view(np.pad(bp, w, mode="edge"), 2 * w + 1)[peaks]
+    above = windows > 0.5 * windows[:, w:w + 1]
+    # Contiguous run around the peak: first sample below half amplitude on each side
+    left = np.where(above[:, w::-1].all(axis=1), w + 1, np.argmin(above[:, w::-1], axis=1))
+    right = np.where(above[:, w:].all(axis=1), w + 1, np.argmin(above[:, w:], axis=1))
+    return (left + right - 1) / fs
+
+
+class StreamingRPeakDetector:
+    """R-peak detector fed with consecutive chunks; peak indices are absolute sample numbers"""
+
+    def __init__(self, fs: int):
+        import numpy as np
+
+        self.fs = int(fs)
+        self._margin = int(MARGIN_S * fs)
+        self._lookahead = int(LOOKAHEAD_S * fs)
+        self._refractory = int(REFRACTORY_S * fs)
+        self._buf = np.empty(0, dtype=np.float64)
+        self._buf_start = 0
+        self._scan_from = 0
+        self._last_peak = -self._refractory - 1
+        self.polarity = 1.0
+        self.signal_level: Optional[float] = None
+
+    def push(self, samples: "np.ndarray", final: bool = False) -> Tuple["np.ndarray", "np.ndarray"]:
+        """Feed samples; returns (peak sample indices, R-wave widths in s) committed by this chunk"""
+        import numpy as np
+
+        x = np.concatenate([self._buf, np.asarray(samples, dtype=np.float64)])
+        start, end = self._buf_start, self._buf_start + len(x)
+        hi = end if final else end - self._lookahead
+        none = (np.empty(0, dtype=np.int64), np.empty(0))
+        if self.signal_level is None and len(x) < 2 * self.fs and not final:
+            self._buf = x  # warm-up: wait for 2 s of signal to pick polarity and level
+            return none
+        if hi <= self._scan_from:
+            self._keep(x, end)
+            return none
+
+        bp = _filtered(x, self.fs)
+        if self.signal_level is None:
+            lo_q, hi_q = np.percentile(bp, [1, 99])
+            self.polarity = -1.0 if -lo_q > hi_q else 1.0
+            self.signal_level = float(max(hi_q, -lo_q))
+        bp *= self.polarity
+        threshold = max(0.45 * self.signal_level, PM_ECG_MIN_QRS_MV)
+
+        lo_rel, hi_rel = max(self._scan_from - start, 1), min(hi - start, len(bp) - 1)
+        seg = bp[lo_rel - 1:hi_rel + 1]
+        is_max = (seg[1:-1] > seg[:-2]) & (seg[1:-1] >= seg[2:]) & (seg[1:-1] > threshold)
+        candidates = np.flatnonzero(is_max) + lo_rel
+
+        # Refractory period: of peaks closer than REFRACTORY_S keep the taller one
+        peaks, last = [], self._last_peak - start
+        for c in candidates:
+            if c - last > self._refractory:
+                peaks.append(c)
+                last = c
+            elif peaks and peaks[-1] == last and bp[c] > bp[last]:
+                peaks[-1] = last = c
+        peaks = np.asarray(peaks, dtype=np.int64)
+
+        if len(peaks):
+            widths = _r_widths(bp, peaks, self.fs)
+            self.signal_level = 0.75 * self.signal_level + 0.25 * float(np.mean(bp[peaks]))
+            self._last_peak = int(peaks[-1]) + start
+        else:
+            widths = np.empty(0)
+            if hi - self._last_peak > 2 * self.fs:
+                # No beat for 2 s: let the level decay so a post-artifact threshold cannot stay too high
+                self.signal_level *= 0.5
+        self._scan_from = hi
+        self._keep(x, end)
+        return peaks + start, widths
+
+    def _keep(self, x: "np.ndarray", end: int):
+        keep = min(len(x), self._margin + self._lookahead + self._refractory)
+        self._buf = x[len(x) - keep:]
+        self._buf_start = end - keep
+
+
+def detect_r_peaks(x: "np.ndarray", fs: int) -> Tuple["np.ndarray", "np.ndarray"]:
+    """One-shot detection over a whole window: (peak indices, R-wave widths in s)"""
+    return StreamingRPeakDetector(fs).push(x, final=True)
+
+
+# ============================================================================
+# FEATURES + RHYTHM CLASSIFIER
+# ============================================================================
+def rhythm_features(peaks: "np.ndarray", widths: "np.ndarray", end: int, fs: int,
+                    covered_s: float, flat: bool = False) -> Dict[str, Any]:
+    """HR, RR variability and rhythm label from the beats of the last PM_ECG_WINDOW_S seconds.
+
+    `end` is the absolute index one past the newest sample and `covered_s` how much signal the window holds.
+    """
+    import numpy as np
+
+    recent = peaks >= end - int(PM_ECG_WINDOW_S * fs)
+    peaks, widths = peaks[recent], widths[recent]
+    out: Dict[str, Any] = {"rhythm": None, "hr_bpm": None, "sdnn_ms": None, "rmssd_ms": None,
+                           "r_width_ms": None, "beats": int(len(peaks)), "window_s": round(covered_s, 1), "fs": fs}
+    since_last = (end - peaks[-1]) / fs if len(peaks) else covered_s
+    if flat:
+        out["rhythm"] = "Lead off"
+        return out
+    if since_last >= PM_ECG_ASYSTOLE_S and covered_s >= PM_ECG_ASYSTOLE_S:
+        out.update(rhythm="Asystole", hr_bpm=0)
+        return out
+    rr = np.diff(peaks) / fs
+    rr = rr[(rr >= REFRACTORY_S) & (rr <= 3.0)]
+    if len(rr) < 3:
+        return out  # too few beats to say anything
+
+    hr = 60.0 / float(np.median(rr[-8:]))
+    rmssd = float(np.sqrt(np.mean(np.diff(rr) ** 2)))
+    r_width_ms = float(np.median(widths[-8:])) * 1000
+    if r_width_ms >= WIDE_R_MS and hr >= 120:
+        rhythm = "V-tach"
+    elif len(rr) >= 6 and rmssd / float(np.mean(rr)) >= IRREGULAR_RATIO:
+        rhythm = "AFib"
+    elif hr > 100:
+        rhythm = "Sinus Tachycardia"
+    elif hr < 60:
+        rhythm = "Sinus Bradycardia"
+    else:
+        rhythm = "Sinus"
+    out.update(rhythm=rhythm, hr_bpm=int(round(hr)), sdnn_ms=round(float(np.std(rr)) * 1000, 1),
+               rmssd_ms=round(rmssd * 1000, 1), r_width_ms=round(r_width_ms, 1))
+    return out
+
+
+def analyze_window(x: "np.ndarray", fs: int) -> Dict[str, Any]:
+    """Features for a standalone window of samples (oldest first)"""
+    import numpy as np
+
+    peaks, widths = detect_r_peaks(x, fs)
+    return rhythm_features(peaks, widths, len(x), fs, len(x) / fs, flat=len(x) > 0 and float(np.std(x)) < 1e-3)
+
+
+class EcgChannel:
+    """Ingest side of one patient's waveform: store + streaming detector + recent beats"""
+
+    def __init__(self, patient_id: str, fs: int):
+        import numpy as np
+
+        self.patient_id = patient_id
+        self.fs = int(fs)
+        self.store = WaveformStore(channel_path(patient_id), fs=fs)
+        self.detector = StreamingRPeakDetector(fs)
+        # The detector numbers samples from 0; offset by what the store already held
+        self._origin = self.store.total
+        self._peaks = np.empty(0, dtype=np.int64)
+        self._widths = np.empty(0)
+        self._lock = threading.Lock()
+
+    def ingest(self, samples: "np.ndarray") -> "np.ndarray":
+        """Append samples and return the absolute indices of beats committed by them"""
+        import numpy as np
+
+        with self._lock:
+            self.store.append(samples)
+            peaks, widths = self.detector.push(samples)
+            peaks = peaks + self._origin
+            keep_from = self.store.total - int(PM_ECG_WINDOW_S * self.fs)
+            keep = self._peaks >= keep_from
+            self._peaks = np.concatenate([self._peaks[keep], peaks])
+            self._widths = np.concatenate([self._widths[keep], widths])
+            return peaks
+
+    def features(self) -> Dict[str, Any]:
+        import numpy as np
+
+        with self._lock:
+            end = self.store.total
+            covered = (end - self._origin) / self.fs
+            tail = self.store.latest(int(PM_ECG_ASYSTOLE_S * self.fs))
+            flat = len(tail) > 0 and float(np.std(tail)) < 1e-3
+            # Beats still inside the detector's look-ahead are not committed yet
+            return rhythm_features(self._peaks, self._widths, end - int(LOOKAHEAD_S * self.fs), self.fs,
+                                   min(covered, PM_ECG_WINDOW_S), flat=flat)
+
+
+def get_ecg_channel(patient_id: str, fs: int) -> EcgChannel:
+    """Process-wide ingest channel for a patient (creates the store on first use)"""
+    with _registry_lock:
+        channel = _CHANNELS.get(patient_id)
+        if channel is None:
+            channel = _CHANNELS[patient_id] = EcgChannel(patient_id, fs)
+        return channel
+
+
+def read_ecg_features(patient_id: str) -> Optional[Dict[str, Any]]:
+    """Latest waveform features for a patient, or None when there is no fresh waveform.
+
+    Uses the in-process ingest channel when there is one; otherwise re-detects over the
+    last PM_ECG_WINDOW_S seconds of the memory-mapped store (written by another process).
+    """
+    channel = _CHANNELS.get(patient_id)
+    store = channel.store if channel is not None else open_store(patient_id)
+    if store is None or store.total == 0 or time.time() - store.last_write > PM_ECG_STALE_S:
+        return None
+    if channel is not None:
+        features = channel.features()
+    else:
+        features = analyze_window(store.latest(int(PM_ECG_WINDOW_S * store.fs)), store.fs)
+    features["samples_total"] = store.total
+    return features
+
+
+def read_ecg_strip(patient_id: str, seconds: float = 5.0) -> Optional[Tuple["np.ndarray", int]]:
+    """(last `seconds` of samples, fs) for drawing a rhythm strip, or None without a waveform"""
+    channel = _CHANNELS.get(patient_id)
+    store = channel.store if channel is not None else open_store(patient_id)
+    if store is None or store.total == 0:
+        return None
+    return store.latest(int(seconds * store.fs)), store.fs
+
+
+def with_ecg_features(df: "pd.DataFrame", features: Optional[Dict[str, Any]]) -> "pd.DataFrame":
+    """Copy of a vitals frame whose latest row carries the waveform features (ecg_* / rr_* columns)"""
+    if not features or features.get("rhythm") is None:
+        return df
+    df = df.copy()
+    last = df.index[-1]
+    df.loc[last, "ecg_rhythm"] = features["rhythm"]
+    for column, key in (("ecg_hr_bpm", "hr_bpm"), ("rr_sdnn_ms", "sdnn_ms"), ("rr_rmssd_ms", "rmssd_ms")):
+        df.loc[last, column] = features.get(key)
+    return df
+
+
+# ============================================================================
+# SYNTHETIC SOURCE (benchmarks / demos)
+# ============================================================================
+class SyntheticEcg:
+    """Continuous synthetic ECG (mV) for a rhythm: Sinus, Sinus Tachycardia, AFib, V-tach or Asystole"""
+
+    def __init__(self, rhythm: str, hr: float, fs: int, seed: int = 0):
+        import numpy as np
+
+        self.rhythm, self.hr, self.fs = rhythm, hr, int(fs)
+        self.rng = np.random.default_rng(seed)
+        t = np.arange(-int(0.4 * fs), int(0.6 * fs)) / fs
+
+        def wave(mu, sigma, amplitude):
+            return amplitude * np.exp(-0.5 * ((t - mu) / sigma) ** 2)
+
+        if rhythm == "V-tach":
+            self.beat = wave(0, 0.045, 1.6) + wave(0.12, 0.06, -0.6)
+        else:
+            p_wave = 0 if rhythm == "AFib" else wave(-0.16, 0.025, 0.15)
+            self.beat = (p_wave + wave(-0.02, 0.008, -0.1) + wave(0, 0.012, 1.2) + wave(0.025, 0.01, -0.25)
+                         + wave(0.25, 0.04, 0.3))
+        self._lead = int(0.4 * fs)  # template samples before the R-peak
+        self._pending = np.zeros(len(self.beat))  # tail of beats overlapping the next chunk
+        self._t = 0
+        self._next_beat = self._lead + int(self.rng.uniform(0, 0.5) * fs)
+
+    def _rr(self) -> float:
+        if self.rhythm == "AFib":
+            return float(self.rng.uniform(0.45, 1.0)) * 60 / self.hr / 0.725
+        return 60 / self.hr * float(1 + self.rng.normal(0, 0.02))
+
+    def next(self, n: int) -> "np.ndarray":
+        import numpy as np
+
+        out = np.zeros(n + len(self.beat))
+        out[:len(self._pending)] += self._pending
+        if self.rhythm != "Asystole":
+            # Place every beat whose template starts inside this chunk
+            while self._next_beat - self._lead < self._t + n:
+                start = self._next_beat - self._lead - self._t
+                out[start:start + len(self.beat)] += self.beat
+                self._next_beat += max(1, int(self._rr() * self.fs))
+        t = (self._t + np.arange(n)) / self.fs
+        samples = out[:n] + 0.1 * np.sin(2 * np.pi * 0.25 * t) + self.rng.normal(0, 0.02, n)
+        self._pending = out[n:]
+        self._t += n
+        return samples.astype(np.float32)
+
+
+# ============================================================================
+# CLI
+# ============================================================================
+SIM_RHYTHMS = (("Sinus", 75), ("Sinus Tachycardia", 115), ("AFib", 105), ("V-tach", 180), ("Asystole", 0))
+
+
+def _simulate(args) -> Dict[str, Any]:
+    chunk = max(1, int(args.chunk * args.fs))
+    n_chunks = int(args.seconds / args.chunk)
+    channels, sources = [], []
+    for i in range(args.patients):
+        rhythm, hr = SIM_RHYTHMS[i % len(SIM_RHYTHMS)]
+        path = channel_path(f"SIM{i:03d}")
+        if os.path.exists(path):
+            os.remove(path)
+        channels.append(get_ecg_channel(f"SIM{i:03d}", args.fs))
+        sources.append(SyntheticEcg(rhythm, hr or 60, args.fs, seed=i))
+    cpu, beats, lag_max = 0.0, 0, 0.0
+    wall0 = time.perf_counter()
+    for k in range(n_chunks):
+        data = [s.next(chunk) for s in sources]  # generation is not part of the measured cost
+        t0 = time.process_time()
+        for channel, samples in zip(channels, data):
+            beats += len(channel.ingest(samples))
+            channel.features()
+        cpu += time.process_time() - t0
+        if args.realtime:
+            due = wall0 + (k + 1) * args.chunk
+            lag_max = max(lag_max, time.perf_counter() - due)
+            time.sleep(max(0.0, due - time.perf_counter()))
+    simulated = n_chunks * chunk / args.fs
+    results = {}
+    for i, channel in enumerate(channels):
+        f = channel.features()
+        results[channel.patient_id] = {"truth": SIM_RHYTHMS[i % len(SIM_RHYTHMS)][0], "rhythm": f["rhythm"],
+                                       "hr_bpm": f["hr_bpm"], "rmssd_ms": f["rmssd_ms"], "r_width_ms": f["r_width_ms"]}
+    correct = sum(r["truth"] == r["rhythm"] for r in results.values())
+    return {
+        "patients": args.patients,
+        "fs": args.fs,
+        "chunk_s": args.chunk,
+        "simulated_s": simulated,
+        "samples": int(simulated * args.fs * args.patients),
+        "beats": beats,
+        "cpu_s": round(cpu, 3),
+        "cpu_per_patient_second_us": round(cpu / (simulated * args.patients) * 1e6, 1),
+        "ward_realtime_factor": round(simulated / cpu, 1) if cpu else None,
+        "max_lag_s": round(lag_max, 3) if args.realtime else None,
+        "rhythm_accuracy": f"{correct}/{len(results)}",
+        "rhythms": results,
+        "store_bytes_per_patient": int(4 * args.fs * PM_ECG_BUFFER_S) + _HEADER * 8,
+    }
+
+
+def parse_args(argv=None) -> argparse.Namespace:
+    p = argparse.ArgumentParser(prog="python -m patient_monitor.ecg",
+                                description="ECG waveform ingest, feature extraction and ward-scale benchmark.")
+    sub = p.add_subparsers(dest="command", required=True)
+    sim = sub.add_parser("simulate", help="ingest synthetic waveforms for a ward and report CPU cost")
+    sim.add_argument("--patients", type=int, default=40)
+    sim.add_argument("--fs", type=int, default=500, help="sample rate in Hz (default 500)")
+    sim.add_argument("--seconds", type=float, default=60.0, help="simulated seconds per patient")
+    sim.add_argument("--chunk", type=float, default=0.25, help="seconds of samples per ingest call")
+    sim.add_argument("--realtime", action="store_true", help="pace ingestion at wall-clock speed")
+    ing = sub.add_parser("ingest", help="append raw samples from stdin to a patient's channel")
+    ing.add_argument("--patient", required=True, help="patient_id the waveform belongs to")
+    ing.add_argument("--fs", type=int, required=True)
+    ing.add_argument("--dtype", default="float32", choices=("float32", "int16"))
+    ing.add_argument("--scale", type=float, default=1.0, help="multiply samples by this to get millivolts")
+    ing.add_argument("--chunk", type=float, default=0.25, help="seconds of samples per read")
+    show = sub.add_parser("show", help="print the current waveform features for a patient")
+    show.add_argument("--patient", required=True)
+    return p.parse_args(argv)
+
+
+def main(argv=None) -> int:
+    import numpy as np
+
+    args = parse_args(argv)
+    if args.command == "simulate":
+        print(json.dumps(_simulate(args), indent=2))
+    elif args.command == "ingest":
+        channel = get_ecg_channel(args.patient, args.fs)
+        dtype = np.dtype(args.dtype)
+        chunk_bytes = max(1, int(args.chunk * args.fs)) * dtype.itemsize
+        reported = time.monotonic()
+        while True:
+            raw = sys.stdin.buffer.read(chunk_bytes)
+            if len(raw) < dtype.itemsize:
+                break
+            channel.ingest(np.frombuffer(raw[:len(raw) - len(raw) % dtype.itemsize], dtype=dtype) * args.scale)
+            if time.monotonic() - reported >= 5:
+                reported = time.monotonic()
+                print(json.dumps(channel.features()), file=sys.stderr)
+        print(json.dumps(channel.features()))
+    else:
+        features = read_ecg_features(args.patient)
+        print(json.dumps(features))
+        return 0 if features else 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
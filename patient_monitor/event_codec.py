@@ -0,0 +1,377 @@
+"""Serialize-once event encoding for splunk_log, plus an optional compact msgpack archive.
+
+splunk_log encodes each payload once with encode_json(). The same bytes become
+the archive line and the HEC request body. orjson is used when it is
+installed. Otherwise the stdlib encoder produces the same compact UTF-8
+output.
+
+When PM_EVENT_LOG ends in `.msgpack`, the local archive is written as
+msgpack records instead of JSON lines. This needs the optional `msgpack`
+package; without it the file gets JSON lines. Repeated strings are interned
+into codes from static tables:
+
+- field names become small ints
+- known values (event types, alert levels, diagnoses, ...) become ext type 1
+- rule-engine flags become ext type 2: the FLAG_CODES prefix index plus the
+  variable suffix, e.g. " (SpO₂ 86%)"
+
+Every record decodes on its own, with no per-file dictionary. Several
+processes can therefore append to one archive, and readers can seek to any
+indexed offset. A reader tells the two formats apart per record: a JSON line
+starts with `{`, and a msgpack map never does. The tables are append-only;
+never reorder or remove entries.
+
+    python -m patient_monitor.event_codec to-json logs/events.msgpack > events.jsonl
+    python -m patient_monitor.event_codec bench --archive logs/events.jsonl
+"""
+import os
+import sys
+import json
+import time
+import argparse
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+try:
+    import orjson
+except ImportError:  # optional: stdlib fallback below
+    orjson = None
+
+DEFAULT_ARCHIVE = "logs/events.jsonl"
+COMPACT_SUFFIXES = (".msgpack", ".mpk")
+
+# Append-only: a code is the position in the tuple
+KEYS = (
+    "time", "host", "source", "sourcetype", "index", "event",
+    "event_type", "app", "scenario", "alert_level", "diagnosis", "flags", "data_ts",
+    "pm_session_id", "pm_run_id", "model", "success", "error", "status_code", "latency_ms",
+    "prompt_chars", "tokens_in", "tokens_out", "tokens_total", "estimated_cost_usd",
+    "queue_wait_ms", "priority", "est_tokens", "run_tokens_used", "run_token_budget",
+    "served_by", "fallback_reason", "llm_error", "llm_latency_ms", "fallback_ms",
+    "fallback_over_budget", "slo_s", "matched_key", "bin_distance", "plan_age_s", "signature",
+    "total_ms", "span_count", "slowest_stage", "stages_ms", "wall_ms", "traced_peak_kb",
+    "reruns_left", "pstats_path", "json_path", "top_function", "top_allocation", "level",
+)
+VALUES = (
+    "streamlit", "ai-patient-monitor", "ai_patient_monitor", "unknown", "unknown-host",
+    "clinical_alert", "alert_acknowledged", "ai_inference", "action_plan_served",
+    "ai_cache_similarity_hit", "render_profile", "profile_capture",
+    "NORMAL", "WARNING", "EMERGENCY", "UNKNOWN", "llm", "fallback", "slo_miss", "llm_error", "no_api_key",
+    "Normal vitals", "Suspected sepsis", "Respiratory failure", "Respiratory concern",
+    "Cardiac arrhythmia", "Cardiac monitoring needed", "Hemodynamic instability",
+)
+_EXT_VALUE = 1
+_EXT_FLAG = 2
+_KEY_CODES = {key: code for code, key in enumerate(KEYS)}
+
+
+# ============================================================================
+# JSON (HEC body and archive line)
+# ============================================================================
+def _json_default(value: Any) -> Any:
+    # numpy / pandas scalars and anything else the rule engine may leave in an event
+    item = getattr(value, "item", None)
+    if callable(item):
+        try:
+            return item()
+        except (TypeError, ValueError):
+            pass
+    return str(value)
+
+
+if orjson is not None:
+    _ORJSON_OPTIONS = orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY
+
+    def encode_json(obj: Any) -> bytes:
+        """Compact UTF-8 JSON bytes (orjson)"""
+        return orjson.dumps(obj, default=_json_default, option=_ORJSON_OPTIONS)
+else:
+    def encode_json(obj: Any) -> bytes:
+        """Compact UTF-8 JSON bytes (stdlib fallback)"""
+        return json.dumps(obj, ensure_ascii=False, separators=(",", ":"), default=_json_default).encode("utf-8")
+
+
+def archive_path() -> str:
+    """Local archive path (PM_EVENT_LOG; empty disables the archive). Read per call so tests can redirect it."""
+    return os.getenv("PM_EVENT_LOG", DEFAULT_ARCHIVE).strip()
+
+
+def is_compact_path(path: str) -> bool:
+    return path.endswith(COMPACT_SUFFIXES)
+
+
+# ============================================================================
+# COMPACT (msgpack) ARCHIVE RECORDS
+# ============================================================================
+_codec: Optional[Dict[str, Any]] = None
+
+
+def _compact_codec() -> Optional[Dict[str, Any]]:
+    """Lazily built interning tables, or None when msgpack is not installed"""
+    global _codec
+    if _codec is None:
+        try:
+            import msgpack
+        except ImportError:
+            _codec = {}
+            return None
+        from .fallback import FLAG_CODES
+
+        _codec = {
+            "msgpack": msgpack,
+            "values": {value: msgpack.ExtType(_EXT_VALUE, bytes([code])) for code, value in enumerate(VALUES)},
+            "flag_prefixes": [(prefix, bytes([code])) for code, (prefix, _flag) in enumerate(FLAG_CODES)],
+            "flag_heads": {prefix: bytes([code]) for code, (prefix, _flag) in enumerate(FLAG_CODES)},
+            "flag_text": [prefix for prefix, _flag in FLAG_CODES],
+        }
+    return _codec or None
+
+
+def compact_available() -> bool:
+    return _compact_codec() is not None
+
+
+def _intern(obj: Any, codec: Dict[str, Any]) -> Any:
+    # Type dispatch inline: events are mostly flat maps of scalars
+    if type(obj) is dict:
+        values, out = codec["values"], {}
+        for key, value in obj.items():
+            cls = type(value)
+            if cls is str:
+                value = values.get(value, value)
+            elif key == "flags" and (cls is list or cls is tuple):
+                value = [_intern_flag(flag, codec) for flag in value]
+            elif cls is dict or cls is list or cls is tuple:
+                value = _intern(value, codec)
+            if type(key) is not str:
+                key = str(key)  # same as JSON
+            out[_KEY_CODES.get(key, key)] = value
+        return out
+    if isinstance(obj, str):
+        return codec["values"].get(obj, obj)
+    if isinstance(obj, (list, tuple)):
+        return [_intern(value, codec) for value in obj]
+    if isinstance(obj, dict):
+        return _intern(dict(obj), codec)
+    return obj
+
+
+def _intern_flag(flag: Any, codec: Dict[str, Any]) -> Any:
+    if type(flag) is not str:
+        return _intern(flag, codec)
+    # Most flags are "<prefix> (<values>)": one dict lookup, else scan the prefixes
+    head = flag.partition(" (")[0]
+    code = codec["flag_heads"].get(head)
+    if code is None:
+        for prefix, prefix_code in codec["flag_prefixes"]:
+            if flag.startswith(prefix):
+                head, code = prefix, prefix_code
+                break
+        else:
+            return flag
+    return codec["msgpack"].ExtType(_EXT_FLAG, code + flag[len(head):].encode("utf-8"))
+
+
+def encode_compact(payload: Dict[str, Any]) -> bytes:
+    """One self-contained msgpack record for the archive (requires msgpack)"""
+    codec = _compact_codec()
+    if codec is None:
+        raise RuntimeError("msgpack is not installed")
+    return codec["msgpack"].packb(_intern(payload, codec), default=_json_default, use_bin_type=True)
+
+
+def _unpacker(codec: Dict[str, Any]):
+    values, flag_text, msgpack = VALUES, codec["flag_text"], codec["msgpack"]
+
+    def ext_hook(code: int, data: bytes) -> Any:
+        if code == _EXT_VALUE:
+            return values[data[0]]
+        if code == _EXT_FLAG:
+            return flag_text[data[0]] + data[1:].decode("utf-8")
+        return msgpack.ExtType(code, data)
+
+    def pairs_hook(pairs) -> Dict[str, Any]:
+        return {KEYS[key] if type(key) is int else key: value for key, value in pairs}
+
+    return msgpack.Unpacker(ext_hook=ext_hook, object_pairs_hook=pairs_hook, strict_map_key=False, raw=False)
+
+
+def decode_record(data: bytes) -> Optional[Dict[str, Any]]:
+    """Payload of one archived record (JSON line or msgpack), or None if it is unreadable"""
+    for _offset, _length, payload in iter_records(data):
+        return payload
+    return None
+
+
+def iter_records(chunk: bytes, offset: int = 0) -> Iterator[Tuple[int, int, Optional[Dict[str, Any]]]]:
+    """(offset, length, payload) for each complete record in chunk; stops before a partial last record.
+
+    payload is None for a record that could not be decoded (it still advances the offset).
+    """
+    pos, end = 0, len(chunk)
+    while pos < end:
+        byte = chunk[pos]
+        if byte == 0x7B:  # '{': JSON line
+            nl = chunk.find(b"\n", pos)
+            if nl < 0:
+                return
+            try:
+                payload = json.loads(chunk[pos:nl + 1])
+            except ValueError:
+                payload = None
+            yield offset + pos, nl + 1 - pos, payload if isinstance(payload, dict) else None
+            pos = nl + 1
+            continue
+        if byte in b"\r\n \t":
+            pos += 1
+            continue
+        codec = _compact_codec()
+        if codec is None:
+            return  # binary records but no msgpack to read them
+        # One unpacker per run of msgpack records
+        unpacker = _unpacker(codec)
+        unpacker.feed(chunk[pos:])
+        base = pos
+        while True:
+            start = base + unpacker.tell()
+            if start >= end or chunk[start] == 0x7B:
+                break
+            try:
+                payload = unpacker.unpack()
+            except codec["msgpack"].OutOfData:
+                return
+            except Exception:
+                # Corrupt bytes (e.g. an interrupted write): resync one byte further on
+                start += 1
+                break
+            yield offset + start, base + unpacker.tell() - start, payload if isinstance(payload, dict) else None
+        pos = start
+
+
+def iter_archive(path: str, chunk_bytes: int = 8 * 1024 * 1024) -> Iterator[Dict[str, Any]]:
+    """Every readable payload in an archive file, either format"""
+    with open(path, "rb") as f:
+        pending = b""
+        while True:
+            data = f.read(chunk_bytes)
+            if not data:
+                break
+            pending += data
+            consumed = 0
+            for offset, length, payload in iter_records(pending):
+                consumed = offset + length
+                if payload is not None:
+                    yield payload
+            pending = pending[consumed:]
+
+
+# ============================================================================
+# CLI (HEC JSON converter, size / CPU benchmark)
+# ============================================================================
+def _post_hec(lines: List[bytes]) -> bool:
+    """Send a batch of HEC payloads (HEC accepts concatenated JSON objects in one request)"""
+    import requests
+    from .telemetry import PM_SPLUNK_VERIFY_TLS, SPLUNK_HEC_TOKEN, SPLUNK_HEC_URL
+
+    response = requests.post(
+        SPLUNK_HEC_URL,
+        headers={"Authorization": f"Splunk {SPLUNK_HEC_TOKEN}", "Content-Type": "application/json"},
+        data=b"\n".join(lines),
+        timeout=30,
+        verify=PM_SPLUNK_VERIFY_TLS,
+    )
+    return response.ok
+
+
+def to_json(path: str, out, post: bool = False, batch: int = 500) -> int:
+    """Write (or post to HEC) every archived payload as HEC JSON. Returns the number of events."""
+    count, lines = 0, []
+    for payload in iter_archive(path):
+        line = encode_json(payload)
+        count += 1
+        if not post:
+            out.write(line + b"\n")
+            continue
+        lines.append(line)
+        if len(lines) >= batch:
+            if not _post_hec(lines):
+                raise RuntimeError(f"HEC rejected a batch ending at event {count}")
+            lines = []
+    if post and lines and not _post_hec(lines):
+        raise RuntimeError(f"HEC rejected a batch ending at event {count}")
+    return count
+
+
+def _best_us(fn, payloads: List[Dict[str, Any]], repeat: int = 5) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        for payload in payloads:
+            fn(payload)
+        best = min(best, time.perf_counter() - t0)
+    return round(best / len(payloads) * 1e6, 2)
+
+
+def bench(payloads: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Bytes and encode CPU per event: legacy (json.dumps for the archive and again for HEC) vs serialize-once"""
+    def legacy(payload):
+        return json.dumps(payload) + "\n", json.dumps(payload)
+
+    def stdlib_once(payload):
+        return json.dumps(payload, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+    n = len(payloads)
+    legacy_bytes = sum(len((json.dumps(p) + "\n").encode("utf-8")) for p in payloads) / n
+    once_bytes = sum(len(encode_json(p)) + 1 for p in payloads) / n
+    report: Dict[str, Any] = {
+        "events": n,
+        "json_encoder": "orjson" if orjson is not None else "json",
+        "legacy_double_dumps": {"archive_bytes": round(legacy_bytes, 1), "encode_us": _best_us(legacy, payloads)},
+        "stdlib_once": {"archive_bytes": round(once_bytes, 1), "encode_us": _best_us(stdlib_once, payloads)},
+    }
+    if orjson is not None:
+        report["orjson_once"] = {"archive_bytes": round(once_bytes, 1), "encode_us": _best_us(encode_json, payloads)}
+    if compact_available():
+        compact_bytes = sum(len(encode_compact(p)) for p in payloads) / n
+        report["msgpack_archive"] = {
+            "archive_bytes": round(compact_bytes, 1),
+            # JSON for HEC plus the msgpack record for the archive
+            "encode_us": _best_us(lambda p: (encode_json(p), encode_compact(p)), payloads),
+            "decode_us": _best_us(decode_record, [encode_compact(p) for p in payloads]),
+        }
+    return report
+
+
+def parse_args(argv=None) -> argparse.Namespace:
+    p = argparse.ArgumentParser(prog="python -m patient_monitor.event_codec",
+                                description="Convert compact event archives and measure event encoding cost.")
+    sub = p.add_subparsers(dest="command", required=True)
+    conv = sub.add_parser("to-json", help="print an archive (either format) as HEC JSON lines")
+    conv.add_argument("archive")
+    conv.add_argument("--post", action="store_true", help="send to SPLUNK_HEC_URL in batches instead of printing")
+    conv.add_argument("--batch", type=int, default=500)
+    b = sub.add_parser("bench", help="bytes and encode CPU per event for the archived events")
+    b.add_argument("--archive", default=None, help="events to measure (default: PM_EVENT_LOG)")
+    b.add_argument("--limit", type=int, default=5000)
+    return p.parse_args(argv)
+
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+    if args.command == "to-json":
+        count = to_json(args.archive, sys.stdout.buffer, post=args.post, batch=args.batch)
+        print(f"{count} events", file=sys.stderr)
+        return 0
+    payloads = []
+    for payload in iter_archive(args.archive or archive_path() or DEFAULT_ARCHIVE):
+        payloads.append(payload)
+        if len(payloads) >= args.limit:
+            break
+    if not payloads:
+        print("error: no events to measure", file=sys.stderr)
+        return 2
+    print(json.dumps(bench(payloads), indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,354 @@
+"""Indexed queries over the append-only event archive (PM_EVENT_LOG).
+
+A SQLite sidecar (PM_EVENT_INDEX, default `<archive>.idx.sqlite`) keeps one
+row per archived record (a JSON line or a compact msgpack record, see
+event_codec). The row holds the record's byte offset and length plus the
+fields worth filtering on (event_type, alert_level, scenario, pm_run_id,
+wall time, data_ts, ...). Every query first indexes whatever splunk_log
+appended since the last one, so each record is parsed once and the logging
+hot path is untouched. Filters and aggregates run on the sidecar's B-tree
+indexes; full events are read back with seek() on the matched offsets only.
+
+    python -m patient_monitor.event_index stats --by event_type,alert_level --since=-60m
+    python -m patient_monitor.event_index find --event-type clinical_alert --run <pm_run_id> --limit 20
+"""
+import os
+import re
+import sys
+import json
+import time
+import sqlite3
+import argparse
+import threading
+from contextlib import closing
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from .event_codec import DEFAULT_ARCHIVE, archive_path, decode_record, iter_records
+
+SCHEMA_VERSION = "1"
+INGEST_CHUNK_BYTES = 8 * 1024 * 1024
+
+# Filterable / groupable columns (each indexed together with the wall time)
+FILTER_FIELDS = ("event_type", "alert_level", "scenario", "pm_run_id", "pm_session_id", "served_by")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);
+CREATE TABLE IF NOT EXISTS events (
+    offset INTEGER PRIMARY KEY,
+    length INTEGER NOT NULL,
+    time REAL,
+    data_ts REAL,
+    event_type TEXT,
+    alert_level TEXT,
+    scenario TEXT,
+    pm_run_id TEXT,
+    pm_session_id TEXT,
+    served_by TEXT,
+    success INTEGER,
+    latency_ms REAL,
+    tokens_total INTEGER,
+    estimated_cost_usd REAL
+);
+CREATE INDEX IF NOT EXISTS ix_events_time ON events (time);
+CREATE INDEX IF NOT EXISTS ix_events_type_time ON events (event_type, time);
+CREATE INDEX IF NOT EXISTS ix_events_level_time ON events (alert_level, time);
+CREATE INDEX IF NOT EXISTS ix_events_scenario_time ON events (scenario, time);
+CREATE INDEX IF NOT EXISTS ix_events_run_time ON events (pm_run_id, time);
+CREATE INDEX IF NOT EXISTS ix_events_replay ON events (pm_run_id, scenario, event_type, data_ts);
+"""
+_INSERT = "INSERT OR IGNORE INTO events VALUES (" + ", ".join("?" * 14) + ")"
+
+
+def ts_key(value: Any) -> Optional[float]:
+    """Sortable key for a vitals timestamp (str / datetime / pd.Timestamp); naive times count as UTC"""
+    if value is None:
+        return None
+    try:
+        dt = value if isinstance(value, datetime) else datetime.fromisoformat(str(value))
+    except ValueError:
+        return None
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=timezone.utc)
+    return dt.timestamp()
+
+
+def parse_time(value: Any) -> Optional[float]:
+    """Wall-clock bound: epoch seconds, ISO datetime (naive = local time) or relative like -15m / -2h / -1d"""
+    if value is None or value == "":
+        return None
+    if isinstance(value, (int, float)):
+        return float(value)
+    match = re.fullmatch(r"-(\d+(?:\.\d+)?)([smhd])", str(value).strip())
+    if match:
+        return time.time() - float(match.group(1)) * {"s": 1, "m": 60, "h": 3600, "d": 86400}[match.group(2)]
+    try:
+        return float(value)
+    except ValueError:
+        return datetime.fromisoformat(str(value)).timestamp()
+
+
+def _number(value: Any, cast) -> Any:
+    try:
+        return None if value is None else cast(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _row_for(payload: Optional[Dict[str, Any]], offset: int, length: int) -> Optional[tuple]:
+    try:
+        event = payload.get("event") or {}
+    except AttributeError:
+        return None
+    return (
+        offset, length, _number(payload.get("time"), float), ts_key(event.get("data_ts")),
+        *(event.get(field) for field in FILTER_FIELDS),
+        _number(event.get("success"), int), _number(event.get("latency_ms"), float),
+        _number(event.get("tokens_total"), int), _number(event.get("estimated_cost_usd"), float),
+    )
+
+
+class EventIndex:
+    """SQLite sidecar index of one archive file"""
+
+    def __init__(self, path: str, index_path: Optional[str] = None):
+        self.path = path
+        self.index_path = index_path or os.getenv("PM_EVENT_INDEX", "").strip() or path + ".idx.sqlite"
+        self._lock = threading.Lock()
+        self._ready = False
+
+    def _connect(self) -> sqlite3.Connection:
+        if not self._ready:
+            os.makedirs(os.path.dirname(os.path.abspath(self.index_path)), exist_ok=True)
+        conn = sqlite3.connect(self.index_path, timeout=10, isolation_level=None)
+        conn.execute("PRAGMA synchronous=NORMAL")
+        if not self._ready:
+            # WAL lets the app read while the CLI (or another session) ingests
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(_SCHEMA)
+            version = conn.execute("SELECT value FROM meta WHERE key='schema'").fetchone()
+            if version is None or version[0] != SCHEMA_VERSION:
+                conn.executescript("DROP TABLE events; DROP TABLE meta;" + _SCHEMA)
+                conn.execute("INSERT INTO meta VALUES ('schema', ?), ('offset', '0')", (SCHEMA_VERSION,))
+            self._ready = True
+        return conn
+
+    # ------------------------------------------------------------------
+    # Incremental ingest
+    # ------------------------------------------------------------------
+    def refresh(self) -> int:
+        """Index records appended since the last refresh. Returns the number of new records."""
+        try:
+            size = os.path.getsize(self.path)
+        except OSError:
+            return 0
+        added = 0
+        with self._lock, closing(self._connect()) as conn:
+            if size == int(conn.execute("SELECT value FROM meta WHERE key='offset'").fetchone()[0]):
+                return 0
+            # Another process may be ingesting too: take the write lock, then re-read the offset
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                offset = int(conn.execute("SELECT value FROM meta WHERE key='offset'").fetchone()[0])
+                if size < offset:
+                    # Archive was truncated / rotated: start over
+                    conn.execute("DELETE FROM events")
+                    offset = 0
+                with open(self.path, "rb") as f:
+                    f.seek(offset)
+                    while offset < size:
+                        chunk = f.read(min(INGEST_CHUNK_BYTES, size - offset))
+                        # Complete records only: a half-written last one is picked up next time
+                        rows, end = [], 0
+                        for pos, length, payload in iter_records(chunk, offset):
+                            row = _row_for(payload, pos, length)
+                            if row is not None:
+                                rows.append(row)
+                            end = pos + length - offset
+                        if not end:
+                            break
+                        conn.executemany(_INSERT, rows)
+                        added += len(rows)
+                        offset += end
+                        f.seek(offset)
+                conn.execute("UPDATE meta SET value=? WHERE key='offset'", (str(offset),))
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+        return added
+
+    def _read(self, entries: Iterable[Tuple[int, int]]) -> List[Dict[str, Any]]:
+        out = []
+        with open(self.path, "rb") as f:
+            for offset, length in entries:
+                f.seek(offset)
+                payload = decode_record(f.read(length))
+                if payload is None:
+                    continue
+                out.append(dict(payload.get("event") or {}, _time=payload.get("time")))
+        return out
+
+    def _select(self, sql: str, params: Sequence[Any]) -> List[tuple]:
+        self.refresh()
+        with closing(self._connect()) as conn:
+            return conn.execute(sql, params).fetchall()
+
+    @staticmethod
+    def _where(filters: Dict[str, Any], since: Any = None, until: Any = None,
+               time_field: str = "time") -> Tuple[str, List[Any]]:
+        clauses, params = [], []
+        for field, value in filters.items():
+            if field not in FILTER_FIELDS:
+                raise ValueError(f"Unknown field {field!r}; choose from {', '.join(FILTER_FIELDS)}")
+            if value is None:
+                continue
+            values = [value] if isinstance(value, str) else list(value)
+            clauses.append(f"{field} IN ({', '.join('?' * len(values))})")
+            params.extend(values)
+        to_key = ts_key if time_field == "data_ts" else parse_time
+        if since is not None:
+            clauses.append(f"{time_field} >= ?")
+            params.append(to_key(since))
+        if until is not None:
+            clauses.append(f"{time_field} <= ?")
+            params.append(to_key(until))
+        clauses.append(f"{time_field} IS NOT NULL")
+        return " WHERE " + " AND ".join(clauses), params
+
+    # ------------------------------------------------------------------
+    # Filter / aggregate API (wall-clock time)
+    # ------------------------------------------------------------------
+    def find(self, since: Any = None, until: Any = None, limit: Optional[int] = 100,
+             newest_first: bool = True, **filters) -> List[Dict[str, Any]]:
+        """Events matching `filters` (field=value or field=[values]) logged within [since, until]"""
+        where, params = self._where(filters, since, until)
+        sql = f"SELECT offset, length FROM events{where} ORDER BY time {'DESC' if newest_first else 'ASC'}, offset"
+        if limit:
+            sql += f" LIMIT {int(limit)}"
+        return self._read(self._select(sql, params))
+
+    def stats(self, group_by: Sequence[str] = ("event_type",), since: Any = None, until: Any = None,
+              bucket_s: Optional[int] = None, **filters) -> List[Dict[str, Any]]:
+        """Event counts and AI usage grouped by indexed fields (and optionally fixed-width time buckets)"""
+        where, params = self._where(dict(dict.fromkeys(group_by), **filters), since, until)
+        keys = list(group_by)
+        columns = list(group_by)
+        if bucket_s:
+            keys.insert(0, "bucket")
+            columns.insert(0, f"CAST(time / {int(bucket_s)} AS INTEGER) * {int(bucket_s)}")
+        group = f" GROUP BY {', '.join(keys)} ORDER BY {', '.join(keys)}" if keys else ""
+        sql = (f"SELECT {''.join(c + ' AS ' + k + ', ' for c, k in zip(columns, keys))}"
+               "COUNT(*), SUM(success), AVG(latency_ms), MAX(latency_ms), SUM(tokens_total), "
+               f"SUM(estimated_cost_usd), MIN(time), MAX(time) FROM events{where}{group}")
+        names = keys + ["count", "successes", "avg_latency_ms", "max_latency_ms", "tokens_total",
+                        "est_cost_usd", "first_time", "last_time"]
+        return [dict(zip(names, row)) for row in self._select(sql, params)]
+
+    def run_summary(self, pm_run_id: str) -> Dict[str, Any]:
+        """Same shape as splunk_search.get_demo_run_summary(), answered from the local archive"""
+        ai = self.stats((), event_type="ai_inference", pm_run_id=pm_run_id)[0]
+        where, params = self._where({"event_type": "ai_inference", "pm_run_id": pm_run_id})
+        latencies = [r[0] for r in self._select(
+            f"SELECT latency_ms FROM events{where} AND latency_ms IS NOT NULL ORDER BY latency_ms", params)]
+        emergencies = self.stats((), event_type="clinical_alert", alert_level="EMERGENCY", pm_run_id=pm_run_id)[0]
+        ai_calls, successes = ai["count"], ai["successes"] or 0
+        return {
+            "ai_calls": ai_calls,
+            "successes": successes,
+            "failures": max(ai_calls - successes, 0),
+            "success_rate_pct": round(100.0 * successes / ai_calls, 2) if ai_calls else 0.0,
+            "avg_latency_ms": int(ai["avg_latency_ms"] or 0),
+            "p95_latency_ms": int(latencies[min(len(latencies) - 1, int(0.95 * len(latencies)))]) if latencies else 0,
+            "tokens_sum": ai["tokens_total"] or 0,
+            "est_cost_usd": round(ai["est_cost_usd"] or 0.0, 4),
+            "emergency_count": emergencies["count"],
+        }
+
+    # ------------------------------------------------------------------
+    # Replay helpers (keyed on the vitals time an event was emitted for)
+    # ------------------------------------------------------------------
+    def run_ids(self, scenario: Optional[str] = None) -> List[str]:
+        where, params = self._where({"scenario": scenario}, time_field="data_ts")
+        rows = self._select(f"SELECT DISTINCT pm_run_id FROM events{where} AND pm_run_id IS NOT NULL", params)
+        return sorted(row[0] for row in rows)
+
+    def query(self, run_id: str, scenario: str, start: Any = None, end: Any = None,
+              event_types: Optional[Iterable[str]] = None) -> List[Dict[str, Any]]:
+        """Events of a run/scenario with start <= data_ts <= end (either bound may be None), in data-time order"""
+        where, params = self._where({"pm_run_id": run_id, "scenario": scenario, "event_type": event_types},
+                                    start, end, time_field="data_ts")
+        return self._read(self._select(f"SELECT offset, length FROM events{where} ORDER BY data_ts, offset", params))
+
+    def last(self, run_id: str, scenario: str, at: Any, event_type: str) -> Optional[Dict[str, Any]]:
+        """Most recent `event_type` event with data_ts <= at"""
+        where, params = self._where({"pm_run_id": run_id, "scenario": scenario, "event_type": event_type},
+                                    until=at, time_field="data_ts")
+        found = self._read(self._select(
+            f"SELECT offset, length FROM events{where} ORDER BY data_ts DESC, offset DESC LIMIT 1", params))
+        return found[0] if found else None
+
+
+_indexes: Dict[str, EventIndex] = {}
+_indexes_lock = threading.Lock()
+
+
+def get_event_index(path: Optional[str] = None) -> EventIndex:
+    """Process-wide index for the archive (default PM_EVENT_LOG)"""
+    path = os.path.abspath(path or archive_path() or DEFAULT_ARCHIVE)
+    with _indexes_lock:
+        index = _indexes.get(path)
+        if index is None:
+            index = _indexes[path] = EventIndex(path)
+        return index
+
+
+# ============================================================================
+# CLI
+# ============================================================================
+def parse_args(argv=None) -> argparse.Namespace:
+    p = argparse.ArgumentParser(prog="python -m patient_monitor.event_index",
+                                description="Filter and aggregate the local event archive through its index.")
+    p.add_argument("--archive", default=None,
+                   help="event archive, JSON lines or msgpack (default: PM_EVENT_LOG or logs/events.jsonl)")
+    sub = p.add_subparsers(dest="command", required=True)
+    sub.add_parser("refresh", help="index newly appended records and print how many were added")
+    find = sub.add_parser("find", help="print matching events as JSON lines")
+    stats = sub.add_parser("stats", help="print grouped counts, latency, tokens and cost")
+    for sp in (find, stats):
+        sp.add_argument("--since", help="epoch seconds, ISO time or relative (--since=-15m, -2h, -1d)")
+        sp.add_argument("--until", help="same formats as --since")
+        for field in FILTER_FIELDS:
+            flag = {"pm_run_id": "run", "pm_session_id": "session"}.get(field, field.replace("_", "-"))
+            sp.add_argument(f"--{flag}", dest=field, action="append", help=f"filter on {field} (repeatable)")
+    find.add_argument("--limit", type=int, default=20)
+    find.add_argument("--oldest-first", action="store_true")
+    stats.add_argument("--by", default="event_type", help="comma-separated fields to group by")
+    stats.add_argument("--bucket", type=int, default=None, help="also group by time buckets of this many seconds")
+    return p.parse_args(argv)
+
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+    index = get_event_index(args.archive)
+    if args.command == "refresh":
+        print(index.refresh())
+        return 0
+    filters = {field: getattr(args, field) for field in FILTER_FIELDS if getattr(args, field)}
+    try:
+        if args.command == "find":
+            for event in index.find(since=args.since, until=args.until, limit=args.limit,
+                                    newest_first=not args.oldest_first, **filters):
+                print(json.dumps(event, default=str))
+        else:
+            group_by = [field.strip() for field in args.by.split(",") if field.strip()]
+            print(json.dumps(index.stats(group_by, since=args.since, until=args.until,
+                                         bucket_s=args.bucket, **filters), indent=2, default=str))
+    except ValueError as e:
+        print(f"error: {e}", file=sys.stderr)
+        return 2
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,250 @@
+"""Deterministic, template-driven action plans for when the LLM is slow or unavailable.
+
+Plans are assembled from per-diagnosis and per-flag snippets that are
+compiled into lookup tables at import time, so building one is a few dict
+lookups and a join (well under PM_FALLBACK_BUDGET_MS). hedge_action_plan()
+waits up to PM_LLM_SLO_S for the scheduled LLM call and serves the template
+plan if it misses the SLO, fails or has no API key; every response is
+logged as an `action_plan_served` event saying which path served it.
+"""
+import os
+import time
+import functools
+from concurrent.futures import Future, TimeoutError as FutureTimeout
+from typing import Any, Dict, Optional, Tuple
+
+from .metrics import METRICS
+from .rules import data_ts
+from .telemetry import splunk_log
+
+PM_LLM_SLO_S = float(os.getenv("PM_LLM_SLO_S", "8"))
+PM_FALLBACK_BUDGET_MS = float(os.getenv("PM_FALLBACK_BUDGET_MS", "1"))
+
+SECTIONS = ("Immediate Actions", "Monitoring", "Documentation", "Escalation")
+
+# ============================================================================
+# TEMPLATES (keyed on detect_conditions diagnosis / flag prefixes)
+# ============================================================================
+# (section, line) pairs; sections follow the same layout the LLM is asked for
+DIAGNOSIS_TEMPLATES = {
+    "Respiratory failure": (
+        ("Immediate Actions", "Sit the patient upright and apply high-flow oxygen per protocol; titrate to SpO₂ ≥ 92%"),
+        ("Immediate Actions", "Check airway patency, probe placement and oxygen delivery device"),
+        ("Immediate Actions", "Prepare suction and airway / bag-valve-mask equipment at the bedside"),
+        ("Monitoring", "Continuous SpO₂ and respiratory rate; reassess work of breathing every 5 min"),
+        ("Documentation", "Record SpO₂, oxygen device and flow rate, and response to each intervention"),
+        ("Escalation", "Call Rapid Response now if SpO₂ stays < 88% on oxygen or the patient tires"),
+    ),
+    "Hemodynamic instability": (
+        ("Immediate Actions", "Lay the patient flat / legs raised unless contraindicated; confirm BP with a manual cuff"),
+        ("Immediate Actions", "Ensure two patent large-bore IV lines; prepare fluid bolus per standing orders"),
+        ("Monitoring", "Repeat BP and MAP every 5 min; monitor urine output and mental status"),
+        ("Documentation", "Record BP/MAP trend, fluids given and time of each reading"),
+        ("Escalation", "Notify MD immediately if MAP < 65 persists; call Rapid Response if SBP < 80"),
+    ),
+    "Cardiac arrhythmia": (
+        ("Immediate Actions", "Check responsiveness and a central pulse NOW; start CPR/ACLS if pulseless"),
+        ("Immediate Actions", "Bring the defibrillator / crash cart to the bedside and attach pads"),
+        ("Immediate Actions", "Obtain a 12-lead ECG if the patient has a pulse and is stable"),
+        ("Monitoring", "Continuous cardiac monitoring; check BP and level of consciousness every 2-5 min"),
+        ("Documentation", "Save the rhythm strip and record onset time, symptoms and interventions"),
+        ("Escalation", "Call a Code / Rapid Response for sustained V-tach or any loss of pulse"),
+    ),
+    "Suspected sepsis": (
+        ("Immediate Actions", "Start the sepsis bundle per protocol: draw blood cultures and lactate"),
+        ("Immediate Actions", "Prepare broad-spectrum antibiotics and an IV fluid bolus as ordered"),
+        ("Monitoring", "Vitals every 15 min; urine output hourly; watch for rising lactate or confusion"),
+        ("Documentation", "Record bundle start time, cultures drawn, antibiotics and fluids given"),
+        ("Escalation", "Notify MD now and activate the sepsis pathway / Rapid Response"),
+    ),
+    "Respiratory concern": (
+        ("Immediate Actions", "Reposition upright, encourage deep breathing and check the oxygen device"),
+        ("Monitoring", "SpO₂ and respiratory rate every 15 min"),
+        ("Documentation", "Record SpO₂ trend and any oxygen changes"),
+        ("Escalation", "Notify MD if SpO₂ < 90% or respiratory rate keeps rising"),
+    ),
+    "Cardiac monitoring needed": (
+        ("Immediate Actions", "Confirm heart rate manually and review the rhythm on the monitor"),
+        ("Monitoring", "Continuous cardiac monitoring; BP every 15 min"),
+        ("Documentation", "Record rhythm strip, HR trend and symptoms (chest pain, dizziness)"),
+        ("Escalation", "Notify MD if HR stays > 120 or < 50, or the patient becomes symptomatic"),
+    ),
+}
+
+_DEFAULT_TEMPLATE = (
+    ("Immediate Actions", "Reassess the patient at the bedside and confirm readings manually"),
+    ("Monitoring", "Repeat a full set of vitals within 15 min"),
+    ("Documentation", "Record vitals and the abnormal findings"),
+    ("Escalation", "Notify MD if any value worsens or the patient deteriorates"),
+)
+
+# First matching prefix wins; codes are stable identifiers for the flag strings
+FLAG_CODES = (
+    ("CRITICAL: Severe hypoxemia", "severe_hypoxemia"),
+    ("CRITICAL: Hypotension", "hypotension"),
+    ("CRITICAL: Suspected V-tach", "vtach"),
+    ("CRITICAL: Asystole", "asystole"),
+    ("ECG lead off", "lead_off"),
+    ("Fever/hypothermia", "temp_abnormal"),
+    ("Tachycardia", "tachycardia"),
+    ("Low BP", "low_bp"),
+    ("Hypoxemia", "hypoxemia"),
+    ("⚠️ SEPSIS-LIKE PATTERN", "sepsis_pattern"),
+    ("Mild hypoxemia", "mild_hypoxemia"),
+    ("Abnormal HR", "abnormal_hr"),
+    ("Irregular rhythm", "irregular_rhythm"),
+    ("Elevated temperature", "elevated_temp"),
+)
+
+FLAG_TEMPLATES = {
+    "severe_hypoxemia": (
+        ("Immediate Actions", "Apply high-flow oxygen immediately"),
+    ),
+    "hypotension": (
+        ("Monitoring", "MAP every 5 min until ≥ 65 mmHg"),
+    ),
+    "vtach": (
+        ("Immediate Actions", "Attach defibrillator pads and keep the crash cart at the bedside"),
+    ),
+    "asystole": (
+        ("Immediate Actions", "Check responsiveness, pulse and ECG leads NOW; if pulseless start CPR and call a Code"),
+        ("Escalation", "Call a Code immediately for confirmed asystole"),
+    ),
+    "lead_off": (
+        ("Immediate Actions", "Check ECG electrodes and lead wires; reattach or replace, then confirm a pulse manually"),
+    ),
+    "temp_abnormal": (
+        ("Immediate Actions", "Recheck temperature; apply cooling or warming measures as ordered"),
+        ("Monitoring", "Temperature every hour"),
+    ),
+    "tachycardia": (
+        ("Monitoring", "Track HR trend; assess for pain, fever, bleeding or dehydration"),
+    ),
+    "low_bp": (
+        ("Monitoring", "Recheck BP within 15 min and watch for dizziness or reduced urine output"),
+    ),
+    "hypoxemia": (
+        ("Immediate Actions", "Start or increase supplemental oxygen; target SpO₂ ≥ 94%"),
+    ),
+    "sepsis_pattern": (
+        ("Escalation", "Multiple sepsis criteria met — do not wait for the next routine round"),
+    ),
+    "mild_hypoxemia": (
+        ("Immediate Actions", "Apply supplemental oxygen per protocol"),
+    ),
+    "abnormal_hr": (
+        ("Immediate Actions", "Obtain a 12-lead ECG"),
+    ),
+    "irregular_rhythm": (
+        ("Immediate Actions", "Obtain a 12-lead ECG to confirm the rhythm"),
+        ("Monitoring", "Continuous cardiac monitoring; compare apical pulse with the monitor rate"),
+    ),
+    "elevated_temp": (
+        ("Monitoring", "Temperature every 2 hours; watch for other sepsis signs"),
+        ("Escalation", "Notify MD if temperature reaches 38.3 °C"),
+    ),
+}
+
+
+def _compile(template) -> Dict[str, Tuple[str, ...]]:
+    by_section: Dict[str, list] = {section: [] for section in SECTIONS}
+    for section, line in template:
+        by_section[section].append(f"- {line}")
+    return {section: tuple(lines) for section, lines in by_section.items()}
+
+
+# Precompiled lookup tables: diagnosis / flag code -> markdown lines per section
+_DIAGNOSIS_TABLE = {diagnosis: _compile(t) for diagnosis, t in DIAGNOSIS_TEMPLATES.items()}
+_DEFAULT_PLAN = _compile(_DEFAULT_TEMPLATE)
+_FLAG_TABLE = {code: _compile(t) for code, t in FLAG_TEMPLATES.items()}
+
+
+def flag_code(flag: str) -> Optional[str]:
+    for prefix, code in FLAG_CODES:
+        if flag.startswith(prefix):
+            return code
+    return None
+
+
+@functools.lru_cache(maxsize=256)
+def _compose(diagnosis: str, codes: Tuple[str, ...]) -> str:
+    base = _DIAGNOSIS_TABLE.get(diagnosis, _DEFAULT_PLAN)
+    parts = []
+    for i, section in enumerate(SECTIONS, 1):
+        # dict keeps first-seen order and drops lines repeated across flags
+        lines = dict.fromkeys(base[section])
+        for code in codes:
+            lines.update(dict.fromkeys(_FLAG_TABLE[code][section]))
+        parts.append(f"{i}. **{section}**:\n" + "\n".join(lines))
+    return "\n\n".join(parts)
+
+
+def fallback_action_plan(summary: Dict) -> Dict[str, Any]:
+    """Template action plan for a detect_conditions summary, shaped like a call_llm_actions result"""
+    t0 = time.perf_counter()
+    flags = summary.get("flags") or []
+    codes = tuple(dict.fromkeys(c for c in map(flag_code, flags) if c))
+    text = _compose(summary.get("diagnosis", ""), codes)
+    if flags:
+        text += "\n\n**Triggered rules:** " + "; ".join(flags)
+    elapsed_ms = (time.perf_counter() - t0) * 1000
+    return {
+        "ok": True,
+        "error": None,
+        "latency_s": round(elapsed_ms / 1000, 4),
+        "usage": None,
+        "text": text,
+        "served_by": "fallback",
+        "fallback_ms": round(elapsed_ms, 3),
+    }
+
+
+# ============================================================================
+# HEDGING
+# ============================================================================
+def log_action_plan_served(result: Dict[str, Any], summary: Dict, source_name: Optional[str] = None,
+                           slo_s: Optional[float] = None):
+    """Record which path (llm / fallback) served an action plan"""
+    served_by = result.get("served_by", "llm")
+    METRICS.action_plans.labels(served_by).inc()
+    fallback_ms = result.get("fallback_ms")
+    splunk_log({
+        "event_type": "action_plan_served",
+        "app": "ai_patient_monitor",
+        "scenario": source_name or "unknown",
+        "alert_level": summary.get("level", "UNKNOWN"),
+        "diagnosis": summary.get("diagnosis", ""),
+        "data_ts": data_ts(summary),
+        "served_by": served_by,
+        "fallback_reason": result.get("fallback_reason"),
+        "llm_error": result.get("llm_error"),
+        "llm_latency_ms": int(result["llm_latency_s"] * 1000) if result.get("llm_latency_s") is not None else None,
+        "fallback_ms": fallback_ms,
+        "fallback_over_budget": fallback_ms is not None and fallback_ms > PM_FALLBACK_BUDGET_MS,
+        "slo_s": slo_s,
+    })
+
+
+def hedge_action_plan(future: Future, fallback: Dict[str, Any], summary: Dict,
+                      source_name: Optional[str] = None, slo_s: float = PM_LLM_SLO_S) -> Dict[str, Any]:
+    """Wait up to slo_s for the LLM; serve `fallback` if it is late, fails or has no API key"""
+    try:
+        result = future.result(timeout=slo_s)
+        reason = None
+    except FutureTimeout:
+        result, reason = None, "slo_miss"
+
+    if result and result.get("ok"):
+        served = dict(result, served_by="llm", llm_latency_s=result.get("latency_s"))
+    else:
+        if reason is None:
+            reason = "no_api_key" if "API key" in str(result.get("error")) else "llm_error"
+        served = dict(
+            fallback,
+            fallback_reason=reason,
+            llm_error=result.get("error") if result else f"No LLM response within {slo_s:g}s SLO",
+            llm_latency_s=result.get("latency_s") if result else None,
+            queue_wait_s=result.get("queue_wait_s", 0) if result else None,
+        )
+    log_action_plan_served(served, summary, source_name=source_name, slo_s=slo_s)
+    return served
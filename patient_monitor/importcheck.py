@@ -0,0 +1,83 @@
+"""Import-time budget check for the core modules.
+
+    python -m patient_monitor.importcheck                 # exit 1 when over budget
+    python -m patient_monitor.importcheck --budget-ms 40 --runs 5
+
+Imports the headless core in a fresh interpreter under `python -X importtime`
+and fails when
+
+- any heavy dependency (pandas, numpy, requests, PIL, streamlit, msgpack) is
+  imported: they must stay behind first use, or
+- the best of --runs cumulative times of the core modules exceeds
+  --budget-ms (PM_IMPORT_BUDGET_MS, default 100).
+
+The interpreter's own start-up (site, encodings) is not counted.
+"""
+import os
+import sys
+import argparse
+import subprocess
+from typing import List, Tuple
+
+CORE_MODULES = (
+    "patient_monitor",
+    "patient_monitor.rules",
+    "patient_monitor.vitals_io",
+    "patient_monitor.llm",
+    "patient_monitor.scheduler",
+    "patient_monitor.fallback",
+    "patient_monitor.ingest",
+    "patient_monitor.session_store",
+)
+HEAVY_MODULES = ("pandas", "numpy", "requests", "PIL", "streamlit", "msgpack")
+PM_IMPORT_BUDGET_MS = float(os.getenv("PM_IMPORT_BUDGET_MS", "100"))
+
+
+def measure(modules=CORE_MODULES) -> Tuple[float, List[str]]:
+    """(milliseconds spent importing `modules`, heavy modules pulled in) in a fresh interpreter"""
+    code = "import " + ", ".join(modules)
+    proc = subprocess.run([sys.executable, "-X", "importtime", "-c", code],
+                          capture_output=True, text=True, cwd=os.path.dirname(os.path.dirname(__file__)) or ".")
+    if proc.returncode:
+        raise RuntimeError(proc.stderr.strip().splitlines()[-1] if proc.stderr.strip() else "import failed")
+    total_us = 0
+    heavy = set()
+    in_core = False
+    for line in proc.stderr.splitlines():
+        # "import time: self [us] | cumulative | imported package"; nesting is indentation
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _self_us, cumulative, name = line[len("import time:"):].split("|")
+        top = name.strip().split(".")[0]
+        if top in HEAVY_MODULES:
+            heavy.add(top)
+        if not name.startswith("  ") and name.strip() != "imported package":
+            # Top-level rows: the interpreter's start-up precedes the first core module
+            in_core = in_core or name.strip().startswith("patient_monitor")
+            if in_core:
+                total_us += int(cumulative)
+    return total_us / 1000, sorted(heavy)
+
+
+def main(argv=None) -> int:
+    p = argparse.ArgumentParser(prog="python -m patient_monitor.importcheck", description=__doc__.split("\n\n")[0])
+    p.add_argument("--budget-ms", type=float, default=PM_IMPORT_BUDGET_MS)
+    p.add_argument("--runs", type=int, default=3, help="fresh interpreters; the fastest counts (default 3)")
+    args = p.parse_args(argv)
+
+    results = [measure() for _ in range(max(1, args.runs))]
+    best = min(ms for ms, _heavy in results)
+    heavy = sorted({m for _ms, mods in results for m in mods})
+    print(f"core import: {best:.1f} ms (budget {args.budget_ms:g} ms, best of {len(results)})")
+    failed = False
+    if heavy:
+        print(f"FAIL: heavy modules imported eagerly: {', '.join(heavy)}", file=sys.stderr)
+        failed = True
+    if best > args.budget_ms:
+        print(f"FAIL: over the import-time budget by {best - args.budget_ms:.1f} ms", file=sys.stderr)
+        failed = True
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,181 @@
+"""Live vitals ingest: follow a CSV on disk and publish appended rows.
+
+One VitalsFeed per file per process. A single watcher thread stats every
+followed file; when bytes are appended only the new complete lines are
+parsed, the feed version is bumped and every subscriber's Event is set.
+Readers (e.g. a Streamlit fragment) check Event.is_set() — O(1) — and only
+re-evaluate rules / rebuild charts when new samples actually arrived.
+
+The feed only holds weak references to subscriber Events: the subscriber
+keeps its Event alive (e.g. in st.session_state), so a closed session's
+subscription disappears with it. Appended rows older than the newest row
+already held are rejected and reported, so the frame stays sorted by time.
+"""
+import io
+import os
+import time
+import weakref
+import threading
+from typing import TYPE_CHECKING, Any, Dict, Optional, Tuple
+
+from .rollups import drop_rollups, update_rollups
+from .vitals_io import VITALS_MAX_ISSUES, read_vitals_csv
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+PM_LIVE_POLL_S = float(os.getenv("PM_LIVE_POLL_S", "1.0"))
+
+
+class VitalsFeed:
+    """Append-only view of a vitals CSV that grows while it is being monitored"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.version = 0
+        self.rows_appended = 0
+        self.rows_rejected = 0
+        self.last_change_ts: Optional[float] = None
+        self.report: Dict[str, Any] = {}
+        self._header = b""
+        self._offset = 0
+        self._df = None
+        self._lock = threading.Lock()
+        self._subscribers: "weakref.WeakValueDictionary[str, threading.Event]" = weakref.WeakValueDictionary()
+        self._reload()
+
+    def _reload(self):
+        """(Re)read the whole file. A file at rest may lack a final newline, so its last line counts."""
+        with open(self.path, "rb") as f:
+            data = f.read()
+        df, report = read_vitals_csv(io.BytesIO(data), chunksize=0)
+        header = data[:data.find(b"\n") + 1]
+        if self._df is not None:
+            drop_rollups(self.path)  # rewritten file: its earlier rows are gone
+        update_rollups(df, self.path)
+        with self._lock:
+            self._header = header if header.endswith(b"\n") else header + b"\n"
+            self._offset = len(data)
+            self._df = df
+            self.report = report
+            self._bump()
+
+    def _bump(self):
+        self.version += 1
+        self.last_change_ts = time.time()
+        for event in self._subscribers.values():
+            event.set()
+
+    def subscribe(self, key: str) -> threading.Event:
+        """Return the change Event for `key` (one per viewer, e.g. per session).
+
+        The caller must keep a reference to the Event; the feed drops it once it is collected.
+        """
+        with self._lock:
+            event = self._subscribers.get(key)
+            if event is None:
+                event = self._subscribers[key] = threading.Event()
+            return event
+
+    def unsubscribe(self, key: str):
+        with self._lock:
+            self._subscribers.pop(key, None)
+
+    def snapshot(self) -> Tuple[Optional["pd.DataFrame"], int]:
+        with self._lock:
+            return self._df, self.version
+
+    def poll(self) -> int:
+        """Ingest newly appended complete lines. Returns the number of new valid rows."""
+        import pandas as pd
+
+        try:
+            size = os.path.getsize(self.path)
+        except OSError:
+            return 0
+        if size == self._offset:
+            return 0
+        if size < self._offset:
+            # Truncated / rewritten: start over
+            self._reload()
+            return len(self._df) if self._df is not None else 0
+
+        with open(self.path, "rb") as f:
+            f.seek(self._offset)
+            chunk = f.read(size - self._offset)
+        cut = chunk.rfind(b"\n") + 1
+        if not cut:
+            return 0  # partial line still being written
+        new_df, append_report = read_vitals_csv(io.BytesIO(self._header + chunk[:cut]), chunksize=0)
+        with self._lock:
+            self._offset += cut
+            if new_df is not None and not new_df.empty and self._df is not None and not self._df.empty:
+                # Readers rely on a time-sorted frame (searchsorted); late rows cannot be merged in
+                late = new_df["timestamp"] < self._df["timestamp"].iloc[-1]
+                if late.any():
+                    self._reject_late(new_df[late], append_report)
+                    new_df = new_df[~late].reset_index(drop=True)
+            self._merge_report(append_report)
+            if new_df is None or new_df.empty:
+                return 0
+            self._df = new_df if self._df is None else pd.concat([self._df, new_df], ignore_index=True)
+            self.rows_appended += len(new_df)
+            update_rollups(new_df, self.path)
+            self._bump()
+        return len(new_df)
+
+    def _reject_late(self, late: "pd.DataFrame", append_report: Dict[str, Any]):
+        self.rows_rejected += len(late)
+        append_report["rows_valid"] -= len(late)
+        append_report["issue_count"] += len(late)
+        append_report["issues"].extend({
+            "line": None,
+            "column": "timestamp",
+            "value": str(ts),
+            "problem": "earlier than rows already ingested",
+            "severity": "error",
+        } for ts in late["timestamp"])
+
+    def _merge_report(self, append_report: Dict[str, Any]):
+        """Fold an append's diagnostics into the feed report (a new dict, so readers' copies stay consistent)"""
+        base = self.report
+        offset = base.get("rows_read", 0)
+        appended = [dict(issue, line=issue["line"] + offset if issue["line"] is not None else None)
+                    for issue in append_report.get("issues", [])]
+        self.report = dict(
+            base,
+            rows_read=base.get("rows_read", 0) + append_report.get("rows_read", 0),
+            rows_valid=base.get("rows_valid", 0) + append_report.get("rows_valid", 0),
+            issue_count=base.get("issue_count", 0) + append_report.get("issue_count", 0),
+            issues=(base.get("issues", []) + appended)[:VITALS_MAX_ISSUES],
+        )
+
+
+_feeds: Dict[str, VitalsFeed] = {}
+_feeds_lock = threading.Lock()
+_watcher: Optional[threading.Thread] = None
+
+
+def _watch_loop():
+    while True:
+        time.sleep(PM_LIVE_POLL_S)
+        for feed in list(_feeds.values()):
+            try:
+                feed.poll()
+            except Exception:
+                # A half-written or malformed append must not kill the watcher
+                pass
+
+
+def get_feed(path: str) -> VitalsFeed:
+    """Process-wide feed for `path`; starts the watcher thread on first use"""
+    global _watcher
+    key = os.path.abspath(path)
+    with _feeds_lock:
+        feed = _feeds.get(key)
+        if feed is None:
+            feed = _feeds[key] = VitalsFeed(path)
+        if _watcher is None:
+            _watcher = threading.Thread(target=_watch_loop, name="pm-ingest", daemon=True)
+            _watcher.start()
+    return feed
@@ -0,0 +1,184 @@
+"""OpenAI-compatible chat client that turns a rule-engine summary into nurse actions."""
+import os
+import time
+import json
+from typing import TYPE_CHECKING, Any, Dict, Optional, Tuple
+
+from .metrics import METRICS
+from .rollups import prompt_trends
+from .rules import data_ts, make_json_safe
+from .telemetry import splunk_log, timed
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+
+SYSTEM_PROMPT = """You are an ICU clinical decision support AI. Based on patient vitals, suggest immediate nursing actions following standard ICU protocols.
+
+Format your response as:
+1. **Immediate Actions**: What to do RIGHT NOW
+2. **Monitoring**: What to watch closely
+3. **Documentation**: What to record
+4. **Escalation**: When to call MD/Rapid Response
+
+Be specific, practical, and protocol-driven."""
+
+
+def build_llm_prompt(summary: Dict, df_tail: "pd.DataFrame",
+                     source: Optional[str] = None) -> Tuple[str, Dict[str, Any]]:
+    """System prompt and user content for one action-plan request (`source` selects the recording's rollup)"""
+    vitals_table = df_tail[["timestamp", "heart_rate_bpm", "temperature_c", 
+                             "bp_systolic_mmHg", "bp_diastolic_mmHg", 
+                             "spo2_percent", "ECG"]].to_csv(index=False)
+    user_content = {
+        "task": "Analyze ICU vitals and suggest nurse actions",
+        "patient_summary": make_json_safe(summary),
+        "recent_vitals_csv": vitals_table
+    }
+    # Hours of context beyond the raw tail, from the coarsest rollup that has enough points
+    latest = summary.get("latest") or {}
+    if latest.get("patient_id") is not None and len(df_tail):
+        raw_span_s = (df_tail["timestamp"].iloc[-1] - df_tail["timestamp"].iloc[0]).total_seconds()
+        trends = prompt_trends(str(latest["patient_id"]), raw_span_s, source)
+        if trends:
+            user_content["long_horizon_trends"] = {
+                "resolution": trends["resolution"],
+                "hours": trends["hours"],
+                "buckets_csv": trends["csv"],
+            }
+    return SYSTEM_PROMPT, user_content
+
+
+@timed("llm_call")
+def call_llm_actions(summary: Dict, df_tail: "pd.DataFrame", source_name: Optional[str] = None,
+                     api_key: Optional[str] = None,
+                     prompt: Optional[Tuple[str, Dict[str, Any]]] = None,
+                     event_extra: Optional[Dict[str, Any]] = None) -> Dict:
+    """
+    Call LLM to generate nurse action suggestions based on patient data
+
+    `prompt` reuses an already-built build_llm_prompt() result; `event_extra`
+    is merged into the ai_inference event (e.g. scheduler queue wait).
+    """
+    import requests
+    # Callers may pass a key from their own secret store (e.g. Streamlit secrets)
+    api_key = api_key or os.getenv("OPENAI_API_KEY", "")
+    # Vitals time the request was made for; the replay view joins events on it
+    event_extra = {"data_ts": data_ts(summary), **(event_extra or {})}
+    
+    if not api_key:
+        METRICS.llm_no_key.inc()
+        splunk_log({"event_type":"ai_inference","app":"ai_patient_monitor","scenario": source_name or "unknown","alert_level": summary.get("level","UNKNOWN"),"diagnosis": summary.get("diagnosis",""),"model": os.getenv("OPENAI_MODEL","gpt-4o-mini"),"success": False,"error":"No API key configured", **event_extra})
+        return {
+            "ok": False,
+            "error": "⚠️ No API key configured. Set OPENAI_API_KEY environment variable or add to Streamlit secrets.",
+            "latency_s": 0,
+            "usage": None,
+            "text": None
+        }
+    
+    base_url = os.getenv("OPENAI_BASE_URL", "https://api.openai.com/v1")
+    model = os.getenv("OPENAI_MODEL", "gpt-4o-mini")
+    
+    # Prepare data for LLM
+    system, user_content = prompt or build_llm_prompt(summary, df_tail)
+    
+    payload = {
+        "model": model,
+        "messages": [
+            {"role": "system", "content": system},
+            {"role": "user", "content": json.dumps(user_content, indent=2)}
+        ],
+        "temperature": 0.2
+    }
+    
+    headers = {
+        "Authorization": f"Bearer {api_key}",
+        "Content-Type": "application/json"
+    }
+    
+    url = base_url.rstrip("/") + "/chat/completions"
+
+    # --- Splunk AI observability context ---
+    _scenario = source_name or (summary.get("latest", {}).get("patient_id") if isinstance(summary.get("latest", {}), dict) else None) or "unknown"
+    _alert_level = summary.get("level", "UNKNOWN")
+    _diagnosis = summary.get("diagnosis", "")
+    _prompt_chars = len(system) + len(json.dumps(user_content))
+
+    def _log_ai_event(ok: bool, latency_s: float, usage: Optional[Dict], status_code: Optional[int] = None, error: Optional[str] = None):
+        splunk_log({
+            "event_type": "ai_inference",
+            "app": "ai_patient_monitor",
+            "scenario": _scenario,
+            "alert_level": _alert_level,
+            "diagnosis": _diagnosis,
+            "model": model,
+            "latency_ms": int(latency_s * 1000),
+            "status_code": status_code,
+            "prompt_chars": _prompt_chars,
+            "tokens_in": (usage or {}).get("prompt_tokens"),
+            "tokens_out": (usage or {}).get("completion_tokens"),
+            "tokens_total": (usage or {}).get("total_tokens"),
+            "success": bool(ok),
+            "error": error,
+            **event_extra,
+        })
+    
+    METRICS.llm_inflight.inc()
+    try:
+        t0 = time.perf_counter()
+        try:
+            resp = requests.post(url, headers=headers, json=payload, timeout=60)
+        finally:
+            METRICS.llm_inflight.dec()
+        latency = time.perf_counter() - t0
+        METRICS.llm_seconds.observe(latency)
+        
+        if resp.status_code != 200:
+            METRICS.llm_error.inc()
+            error_msg = resp.text[:300]
+            _log_ai_event(False, latency, None, status_code=resp.status_code, error=f"LLM API error {resp.status_code}: {error_msg}")
+            return {
+                "ok": False,
+                "error": f"LLM API error {resp.status_code}: {error_msg}",
+                "latency_s": round(latency, 3),
+                "usage": None,
+                "text": None
+            }
+        
+        data = resp.json()
+        text_out = data["choices"][0]["message"]["content"]
+        usage = data.get("usage")
+        METRICS.llm_ok.inc()
+        METRICS.tokens_in.inc((usage or {}).get("prompt_tokens") or 0)
+        METRICS.tokens_out.inc((usage or {}).get("completion_tokens") or 0)
+        
+        _log_ai_event(True, latency, usage, status_code=resp.status_code, error=None)
+        return {
+            "ok": True,
+            "error": None,
+            "latency_s": round(latency, 3),
+            "usage": usage,
+            "text": text_out
+        }
+    
+    except requests.exceptions.Timeout:
+        METRICS.llm_timeout.inc()
+        _log_ai_event(False, 60.0, None, status_code=None, error="Request timed out after 60 seconds")
+        return {
+            "ok": False,
+            "error": "Request timed out after 60 seconds",
+            "latency_s": 60.0,
+            "usage": None,
+            "text": None
+        }
+    except Exception as e:
+        METRICS.llm_error.inc()
+        _log_ai_event(False, 0.0, None, status_code=None, error=f"Error calling LLM: {str(e)}")
+        return {
+            "ok": False,
+            "error": f"Error calling LLM: {str(e)}",
+            "latency_s": 0,
+            "usage": None,
+            "text": None
+        }
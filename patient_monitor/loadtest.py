@@ -0,0 +1,564 @@
+"""Headless load generator: a simulated ER against local stub services.
+
+    python -m patient_monitor.loadtest --patients 300 --rate 2 --duration 60 \\
+        --llm-latency 0.8 --llm-error-rate 0.05 --hec-latency 0.01
+
+Virtual patients replay the three sample scenarios (sepsis, V-tach,
+respiratory failure) with per-patient jitter, each at --rate samples/s.
+A pool of --sessions threads plays the Streamlit script threads: each
+drains one patient's pending samples, runs the rule engine, emits
+clinical_alert / alert_acknowledged like the app and, when abnormal,
+goes through the plan cache, LLM scheduler and fallback hedge. The AI step
+does not block the session: the request is submitted and a waiter thread
+serves the plan (LLM or fallback at the SLO), like the app's pending_llm.
+Each patient has at most one request in flight.
+
+Splunk HEC, the Splunk REST API and an OpenAI-compatible endpoint are
+replaced by stub HTTP servers on localhost with injectable latency and
+error rates. The report covers end-to-end alert latency (sample arrival to
+clinical_alert emitted) separately from AI plan latency, throughput and
+memory growth.
+"""
+import gc
+import os
+import sys
+import json
+import time
+import heapq
+import queue
+import random
+import argparse
+import threading
+from collections import Counter, deque
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional
+
+SCENARIOS = {
+    "sepsis": "patient1_sepsis.csv",
+    "vtach": "patient2_vtach.csv",
+    "resp": "patient3_respfailure.csv",
+}
+
+# Per-sample noise added to the scenario rows: (column, stddev, low, high)
+JITTER = (
+    ("heart_rate_bpm", 3, 20, 250),
+    ("temperature_c", 0.1, 30.0, 43.0),
+    ("bp_systolic_mmHg", 3, 40, 250),
+    ("bp_diastolic_mmHg", 2, 20, 150),
+    ("spo2_percent", 1, 50, 100),
+)
+
+
+# ============================================================================
+# STUB SERVICES
+# ============================================================================
+class _StubHTTPServer(ThreadingHTTPServer):
+    def handle_error(self, request, client_address):
+        # A client that gave up (HEC timeout, abandoned LLM call) is expected under load, not a stub failure
+        if isinstance(sys.exc_info()[1], ConnectionError):
+            self.stub.count("client_gone")
+        else:
+            super().handle_error(request, client_address)
+
+
+class StubServer:
+    """ThreadingHTTPServer on 127.0.0.1 that sleeps `latency` (± jitter) and fails `error_rate` of requests"""
+
+    def __init__(self, name: str, handler, latency: float = 0.0, jitter: float = 0.0,
+                 error_rate: float = 0.0, seed: Optional[int] = None):
+        self.name = name
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.rng = random.Random(seed)
+        self.counts: Counter = Counter()
+        self.state: Dict[str, Any] = {}
+        self.lock = threading.Lock()
+        stub = self
+
+        class _Handler(BaseHTTPRequestHandler):
+            def _serve(self):
+                body = self.rfile.read(int(self.headers.get("Content-Length") or 0))
+                delay = max(0.0, stub.latency + stub.rng.uniform(-stub.jitter, stub.jitter))
+                if delay:
+                    time.sleep(delay)
+                with stub.lock:
+                    stub.counts["requests"] += 1
+                if stub.rng.random() < stub.error_rate:
+                    with stub.lock:
+                        stub.counts["injected_errors"] += 1
+                    status, payload = 503, {"error": "injected failure"}
+                else:
+                    status, payload = handler(stub, self.command, self.path, body)
+                out = json.dumps(payload).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(out)))
+                self.end_headers()
+                self.wfile.write(out)
+
+            do_GET = do_POST = _serve
+
+            def log_message(self, *args):
+                pass
+
+        self.server = _StubHTTPServer(("127.0.0.1", 0), _Handler)
+        self.server.stub = self
+        self.server.daemon_threads = True
+        self.url = f"http://127.0.0.1:{self.server.server_port}"
+        threading.Thread(target=self.server.serve_forever, name=f"stub-{name}", daemon=True).start()
+
+    def count(self, key: str, n: int = 1):
+        with self.lock:
+            self.counts[key] += n
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+def _hec_handler(stub: StubServer, method: str, path: str, body: bytes):
+    try:
+        event = json.loads(body).get("event") or {}
+        stub.count(f"event:{event.get('event_type', 'unknown')}")
+        if event.get("event_type") == "ai_inference" and event.get("success"):
+            stub.count("ai_success")
+    except ValueError:
+        return 400, {"text": "Invalid data format", "code": 6}
+    return 200, {"text": "Success", "code": 0}
+
+
+def _openai_handler(stub: StubServer, method: str, path: str, body: bytes):
+    request = json.loads(body or b"{}")
+    prompt_tokens = sum(len(m.get("content", "")) for m in request.get("messages", [])) // 4
+    completion_tokens = 120
+    stub.count("tokens", prompt_tokens + completion_tokens)
+    return 200, {
+        "choices": [{"message": {"role": "assistant", "content": "1. **Immediate Actions**: (stub plan)"}}],
+        "usage": {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens,
+                  "total_tokens": prompt_tokens + completion_tokens},
+    }
+
+
+def _splunk_rest_handler(hec: StubServer):
+    """Search API stub: jobs finish immediately and answer from what the HEC stub has received"""
+    def handler(stub: StubServer, method: str, path: str, body: bytes):
+        path = path.split("?")[0]
+        if method == "POST" and path.endswith("/services/search/jobs"):
+            sid = f"loadtest_{stub.counts['requests']}"
+            if b"clinical_alert" in body:
+                with stub.lock:
+                    stub.state.setdefault("alert_sids", set()).add(sid)
+            return 201, {"sid": sid}
+        if path.endswith("/results"):
+            sid = path.split("/")[-2]
+            with hec.lock:
+                counts = dict(hec.counts)
+            if sid in stub.state.get("alert_sids", ()):
+                return 200, {"results": [{"emergency_count": counts.get("event:clinical_alert", 0)}]}
+            return 200, {"results": [{"ai_calls": counts.get("event:ai_inference", 0),
+                                      "successes": counts.get("ai_success", 0)}]}
+        return 200, {"entry": [{"content": {"isDone": True, "dispatchState": "DONE"}}]}
+    return handler
+
+
+# ============================================================================
+# VIRTUAL PATIENTS
+# ============================================================================
+class VirtualPatient:
+    """One bed: replays a scenario with jitter and keeps the last `window` samples"""
+
+    def __init__(self, index: int, scenario: str, rows: List[Dict[str, Any]], window: int, rng: random.Random):
+        self.pid = f"LT{index:04d}"
+        self.scenario = scenario
+        self.rows = rows
+        self.rng = rng
+        self.cursor = rng.randrange(len(rows))
+        self.started = rows[0]["timestamp"]
+        self.samples = 0
+        self.window: deque = deque(maxlen=window)
+        self.inbox: List[tuple] = []
+        self.scheduled = False
+        self.lock = threading.Lock()
+        # Per-"session" state mirrored from the app
+        self.alert_ack = False
+        self.ack_due: Optional[float] = None
+        self.ai_cache: Dict[str, Dict[str, Any]] = {}
+        self.ai_pending: Optional[str] = None   # cache key of the request in flight
+
+    def next_sample(self) -> Dict[str, Any]:
+        import pandas as pd
+
+        row = dict(self.rows[self.cursor % len(self.rows)])
+        self.cursor += 1
+        for column, sd, low, high in JITTER:
+            value = min(high, max(low, row[column] + self.rng.gauss(0, sd)))
+            row[column] = round(value, 1) if isinstance(row[column], float) else int(round(value))
+        row["patient_id"] = self.pid
+        row["timestamp"] = self.started + pd.Timedelta(minutes=self.samples)
+        self.samples += 1
+        return row
+
+
+def load_scenarios(names: List[str], data_dir: str) -> Dict[str, List[Dict[str, Any]]]:
+    from .vitals_io import read_vitals_csv
+
+    out = {}
+    for name in names:
+        df, report = read_vitals_csv(os.path.join(data_dir, SCENARIOS[name]))
+        if df is None:
+            raise SystemExit(f"Could not read scenario {name!r}: {report.get('missing_columns') or report.get('issues')}")
+        out[name] = df.to_dict("records")
+    return out
+
+
+# ============================================================================
+# LOAD RUN
+# ============================================================================
+def _rss_bytes() -> int:
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, AttributeError):
+        import resource
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def _percentiles(values: List[float]) -> Dict[str, Optional[float]]:
+    if not values:
+        return {"count": 0, "p50_ms": None, "p95_ms": None, "p99_ms": None, "max_ms": None}
+    ordered = sorted(values)
+
+    def pct(p):
+        return round(ordered[min(len(ordered) - 1, int(p * len(ordered)))] * 1000, 2)
+    return {"count": len(ordered), "p50_ms": pct(0.50), "p95_ms": pct(0.95), "p99_ms": pct(0.99),
+            "max_ms": round(ordered[-1] * 1000, 2)}
+
+
+class LoadRun:
+    def __init__(self, args: argparse.Namespace):
+        self.args = args
+        self.run_id = f"loadtest-{int(time.time())}"
+        self.work: "queue.Queue" = queue.Queue()
+        self.stop = threading.Event()
+        self.lock = threading.Lock()
+        self.stats: Counter = Counter()
+        self.alert_latency: List[float] = []
+        self.ai_latency: List[float] = []
+        self.served_by: Counter = Counter()
+        self.dispatch_lag = 0.0
+        self.memory: List[tuple] = []
+        self.ai_waiters: Optional[ThreadPoolExecutor] = None
+        self.patients = 0
+
+    def _process(self, patient: VirtualPatient):
+        """One 'rerun' for a patient: ingest pending samples, evaluate rules, alert, AI"""
+        import pandas as pd
+        from .fallback import fallback_action_plan
+        from .metrics import METRICS
+        from .plan_cache import clinical_signature, find_similar_plan
+        from .rules import data_ts, detect_conditions
+        from .scheduler import submit_llm_actions
+        from .telemetry import bind_correlation, splunk_log
+
+        with patient.lock:
+            batch, patient.inbox = patient.inbox, []
+        if not batch:
+            return
+        bind_correlation(pm_session_id=patient.pid, pm_run_id=self.run_id)
+        for row, _arrived in batch:
+            patient.window.append(row)
+        first_arrival = batch[0][1]
+        df = pd.DataFrame(list(patient.window))
+        summary = detect_conditions(df)
+        METRICS.alerts_by_level[summary["level"]].inc()
+
+        if summary["level"] != "EMERGENCY":
+            patient.alert_ack = False
+            patient.ack_due = None
+        elif not patient.alert_ack:
+            splunk_log({"event_type": "clinical_alert", "app": "ai_patient_monitor", "scenario": patient.scenario,
+                        "alert_level": "EMERGENCY", "diagnosis": summary.get("diagnosis", ""),
+                        "flags": summary.get("flags", []), "data_ts": data_ts(summary)})
+            now = time.perf_counter()
+            with self.lock:
+                self.alert_latency.append(now - first_arrival)
+                self.stats["alerts"] += 1
+            if patient.ack_due is None:
+                patient.ack_due = now + self.args.ack_delay
+            elif now >= patient.ack_due:
+                patient.alert_ack = True
+                METRICS.alert_acks.inc()
+                splunk_log({"event_type": "alert_acknowledged", "app": "ai_patient_monitor",
+                            "scenario": patient.scenario, "alert_level": "EMERGENCY",
+                            "diagnosis": summary.get("diagnosis", ""), "data_ts": data_ts(summary)})
+
+        if self.args.ai and summary["level"] in ("WARNING", "EMERGENCY"):
+            last_ts = df["timestamp"].iloc[-1]
+            cache_key = f"{patient.pid}|{summary['level']}|{summary['diagnosis']}|{last_ts}"
+            meta = {"signature": clinical_signature(summary, df),
+                    "data_ts": pd.Timestamp(last_ts).timestamp(), "source_name": patient.pid}
+            with patient.lock:
+                if cache_key in patient.ai_cache:
+                    outcome = "cache_hit"
+                elif find_similar_plan(patient.ai_cache, patient.pid, meta["signature"], meta["data_ts"]):
+                    outcome = "similar_hit"
+                    patient.ai_cache[cache_key] = {}
+                elif patient.ai_pending is not None:
+                    outcome = "skipped_in_flight"
+                else:
+                    outcome = None
+                    patient.ai_pending = cache_key
+            if outcome is None:
+                # Submit and move on; the session serves the next samples while the plan is pending
+                future = submit_llm_actions(summary, df.tail(60), source_name=patient.pid, api_key="loadtest")
+                self.ai_waiters.submit(self._serve_plan, patient, cache_key, future, fallback_action_plan(summary),
+                                       summary, meta, time.perf_counter())
+            else:
+                with self.lock:
+                    self.served_by[outcome] += 1
+
+        with self.lock:
+            self.stats["reruns"] += 1
+            self.stats["samples_processed"] += len(batch)
+
+    def _serve_plan(self, patient: VirtualPatient, cache_key: str, future, fallback: Dict[str, Any],
+                    summary: Dict, meta: Dict[str, Any], t0: float):
+        """Waiter thread: LLM plan, or the fallback once the SLO passes"""
+        from .fallback import hedge_action_plan
+
+        try:
+            result = hedge_action_plan(future, fallback, summary, source_name=patient.pid, slo_s=self.args.slo)
+        except Exception as e:
+            with self.lock:
+                self.stats["errors"] += 1
+                self.stats[f"error:{type(e).__name__}"] += 1
+            result = dict(fallback, fallback_reason="error")
+        with self.lock:
+            self.ai_latency.append(time.perf_counter() - t0)
+            self.served_by[result.get("served_by", "llm")] += 1
+        with patient.lock:
+            patient.ai_cache[cache_key] = dict(result, **meta)
+            patient.ai_pending = None
+
+    def _worker(self):
+        while True:
+            patient = self.work.get()
+            if patient is None:
+                return
+            try:
+                self._process(patient)
+            except Exception as e:
+                with self.lock:
+                    self.stats["errors"] += 1
+                    self.stats[f"error:{type(e).__name__}"] += 1
+            with patient.lock:
+                patient.scheduled = bool(patient.inbox)
+                if patient.scheduled:
+                    self.work.put(patient)
+
+    def _arrive(self, patient: VirtualPatient):
+        row = patient.next_sample()
+        with patient.lock:
+            patient.inbox.append((row, time.perf_counter()))
+            if not patient.scheduled:
+                patient.scheduled = True
+                self.work.put(patient)
+        with self.lock:
+            self.stats["samples_generated"] += 1
+
+    def _monitor(self, started: float):
+        while not self.stop.wait(1.0):
+            with self.lock:
+                done = self.stats["samples_processed"]
+                warmed = self.stats["reruns"] >= self.patients
+            self.memory.append((time.perf_counter() - started, _rss_bytes(), done, warmed))
+            if not self.args.quiet:
+                print(f"  t={self.memory[-1][0]:5.1f}s processed={done} backlog={self.work.qsize()} "
+                      f"rss={self.memory[-1][1] / 2**20:.1f}MB", file=sys.stderr)
+
+    def run(self, patients: List[VirtualPatient]) -> Dict[str, Any]:
+        args = self.args
+        self.patients = len(patients)
+        # One waiter per patient at most (one request in flight each), so serving never queues
+        self.ai_waiters = ThreadPoolExecutor(max_workers=max(1, len(patients)), thread_name_prefix="lt-ai")
+        workers = [threading.Thread(target=self._worker, name=f"lt-session-{i}", daemon=True)
+                   for i in range(args.sessions)]
+        for t in workers:
+            t.start()
+        rss_start = _rss_bytes()
+        started = time.perf_counter()
+        monitor = threading.Thread(target=self._monitor, args=(started,), name="lt-monitor", daemon=True)
+        monitor.start()
+
+        # Stagger patients across the first interval so arrivals are not in lockstep
+        interval = 1.0 / args.rate
+        heap = [(started + i * interval / len(patients), i) for i in range(len(patients))]
+        heapq.heapify(heap)
+        deadline = started + args.duration
+        while heap and heap[0][0] < deadline:
+            due, i = heapq.heappop(heap)
+            delay = due - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            else:
+                self.dispatch_lag = max(self.dispatch_lag, -delay)
+            self._arrive(patients[i])
+            heapq.heappush(heap, (due + interval, i))
+        generated_for = time.perf_counter() - started
+        # Memory is compared at the end of generation, before draining adds nothing but backlog
+        gc.collect()
+        rss_end = _rss_bytes()
+        with self.lock:
+            samples_end = self.stats["samples_processed"]
+
+        # Drain what is queued, then stop the sessions
+        drain_deadline = time.perf_counter() + args.drain_timeout
+        while time.perf_counter() < drain_deadline:
+            with self.lock:
+                if self.stats["samples_processed"] >= self.stats["samples_generated"]:
+                    break
+            time.sleep(0.05)
+        elapsed = time.perf_counter() - started
+        self.stop.set()
+        for _ in workers:
+            self.work.put(None)
+        # Plans still pending resolve within the SLO
+        self.ai_waiters.shutdown(wait=True)
+        ai_drained = time.perf_counter() - started
+
+        # Baseline: first sample after warm-up (every patient processed once, first DataFrames built)
+        warm = next((m for m in self.memory if m[3] and m[0] >= min(5.0, args.duration / 4)), None)
+        rss_base = warm[1] if warm else rss_start
+        samples_base = warm[2] if warm else 0
+        processed = self.stats["samples_processed"]
+        growth = rss_end - rss_base
+        measured = samples_end - samples_base
+        return {
+            "run_id": self.run_id,
+            "patients": len(patients),
+            "sessions": args.sessions,
+            "rate_per_patient_s": args.rate,
+            "duration_s": round(generated_for, 2),
+            "elapsed_s": round(elapsed, 2),
+            "ai_drained_s": round(ai_drained, 2),
+            "samples_generated": self.stats["samples_generated"],
+            "samples_processed": processed,
+            "samples_unprocessed": self.stats["samples_generated"] - processed,
+            "reruns": self.stats["reruns"],
+            "errors": {k[6:]: v for k, v in self.stats.items() if k.startswith("error:")},
+            "max_dispatch_lag_ms": round(self.dispatch_lag * 1000, 2),
+            "throughput": {
+                "samples_per_s": round(processed / elapsed, 1) if elapsed else 0.0,
+                "reruns_per_s": round(self.stats["reruns"] / elapsed, 1) if elapsed else 0.0,
+                "alerts_per_s": round(self.stats["alerts"] / elapsed, 2) if elapsed else 0.0,
+            },
+            "alert_latency": _percentiles(self.alert_latency),
+            "ai_latency": _percentiles(self.ai_latency),
+            "ai_served_by": dict(self.served_by),
+            "memory": {
+                "rss_start_mb": round(rss_start / 2**20, 1),
+                "rss_after_warmup_mb": round(rss_base / 2**20, 1),
+                "rss_end_mb": round(rss_end / 2**20, 1),
+                "growth_mb": round(growth / 2**20, 2),
+                "samples_measured": measured,
+                # Too few samples after warm-up make the ratio noise (allocator arenas, page granularity)
+                "growth_kb_per_1k_samples": (round(growth / 1024 / measured * 1000, 1)
+                                             if measured >= 1000 else None),
+            },
+        }
+
+
+# ============================================================================
+# CLI
+# ============================================================================
+def parse_args(argv=None) -> argparse.Namespace:
+    p = argparse.ArgumentParser(prog="python -m patient_monitor.loadtest", description=__doc__.split("\n\n")[0])
+    p.add_argument("--patients", type=int, default=200, help="virtual patients (default 200)")
+    p.add_argument("--rate", type=float, default=1.0, help="samples per second per patient (default 1)")
+    p.add_argument("--duration", type=float, default=30.0, help="seconds of sample generation (default 30)")
+    p.add_argument("--sessions", type=int, default=16, help="concurrent session threads (default 16)")
+    p.add_argument("--scenarios", default=",".join(SCENARIOS), help="comma-separated subset of " + ",".join(SCENARIOS))
+    p.add_argument("--data-dir", default=".", help="directory holding the sample CSVs")
+    p.add_argument("--window", type=int, default=60, help="samples kept per patient (default 60)")
+    p.add_argument("--ack-delay", type=float, default=5.0, help="seconds until a nurse acknowledges an alert")
+    p.add_argument("--no-ai", dest="ai", action="store_false", help="skip the LLM / fallback path")
+    p.add_argument("--slo", type=float, default=None, help="LLM latency SLO in seconds (default PM_LLM_SLO_S)")
+    p.add_argument("--seed", type=int, default=7)
+    for name, latency in (("hec", 0.005), ("rest", 0.05), ("llm", 0.5)):
+        p.add_argument(f"--{name}-latency", type=float, default=latency, help=f"{name} stub latency in seconds")
+        p.add_argument(f"--{name}-jitter", type=float, default=latency / 2, help=f"{name} stub latency jitter (±s)")
+        p.add_argument(f"--{name}-error-rate", type=float, default=0.0, help=f"fraction of {name} requests failing")
+    p.add_argument("--drain-timeout", type=float, default=30.0, help="seconds to wait for the backlog after generation")
+    p.add_argument("--archive", default="", help="also write the JSONL event archive to this path")
+    p.add_argument("--json", dest="json_out", default="", help="write the report as JSON to this path")
+    p.add_argument("--quiet", action="store_true", help="no per-second progress lines")
+    args = p.parse_args(argv)
+    for name in ("patients", "rate", "duration", "sessions", "window"):
+        if getattr(args, name) <= 0:
+            p.error(f"--{name} must be positive")
+    for name in ("hec", "rest", "llm"):
+        if not 0.0 <= getattr(args, f"{name}_error_rate") <= 1.0:
+            p.error(f"--{name}-error-rate must be between 0 and 1")
+    return args
+
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+    names = [n.strip() for n in args.scenarios.split(",") if n.strip()]
+    unknown = [n for n in names if n not in SCENARIOS]
+    if unknown or not names:
+        raise SystemExit(f"Unknown scenarios {unknown}; choose from {', '.join(SCENARIOS)}")
+    # The archive path is read per event; keep load-test events out of logs/events.jsonl
+    os.environ["PM_EVENT_LOG"] = args.archive
+
+    from . import fallback, splunk_search, telemetry
+
+    if args.slo is None:
+        args.slo = fallback.PM_LLM_SLO_S
+    hec = StubServer("hec", _hec_handler, args.hec_latency, args.hec_jitter, args.hec_error_rate, args.seed)
+    llm = StubServer("llm", _openai_handler, args.llm_latency, args.llm_jitter, args.llm_error_rate, args.seed + 1)
+    rest = StubServer("rest", _splunk_rest_handler(hec), args.rest_latency, args.rest_jitter,
+                      args.rest_error_rate, args.seed + 2)
+    # Endpoints are module-level settings read at import; point them at the stubs
+    telemetry.SPLUNK_HEC_URL = hec.url + "/services/collector/event"
+    telemetry.SPLUNK_HEC_TOKEN = "loadtest"
+    splunk_search.SPLUNK_MGMT_URL = rest.url
+    splunk_search.SPLUNK_USERNAME = splunk_search.SPLUNK_PASSWORD = "loadtest"
+    os.environ["OPENAI_BASE_URL"] = llm.url + "/v1"
+
+    rows = load_scenarios(names, args.data_dir)
+    rng = random.Random(args.seed)
+    patients = [VirtualPatient(i, names[i % len(names)], rows[names[i % len(names)]], args.window,
+                               random.Random(rng.random())) for i in range(args.patients)]
+    print(f"Load test: {args.patients} patients x {args.rate}/s for {args.duration:g}s, "
+          f"{args.sessions} sessions, scenarios={','.join(names)}", file=sys.stderr)
+
+    # Pay the lazy imports and the first connection (requests, urllib3, idna) before the memory baseline
+    import requests
+    requests.get(rest.url + "/warmup", timeout=5)
+    rest.counts.clear()
+
+    load = LoadRun(args)
+    report = load.run(patients)
+    try:
+        report["splunk_run_summary"] = splunk_search.get_demo_run_summary(load.run_id)
+    except Exception as e:
+        report["splunk_run_summary"] = {"error": str(e)}
+    if args.archive:
+        from .event_index import get_event_index
+        report["archive_run_summary"] = get_event_index(args.archive).run_summary(load.run_id)
+    report["stubs"] = {s.name: dict(s.counts) for s in (hec, llm, rest)}
+    for s in (hec, llm, rest):
+        s.close()
+
+    print(json.dumps(report, indent=2, default=str))
+    if args.json_out:
+        with open(args.json_out, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2, default=str)
+    return 1 if report["errors"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,233 @@
+"""Process-wide metrics registry with a Prometheus text-exposition endpoint.
+
+Counters, gauges and histograms are plain Python objects; label children are
+resolved once and the hot path is a locked float add. The HTTP server is
+opt-out (PM_METRICS_PORT=0) and started explicitly by the app entry script.
+"""
+import os
+import bisect
+import threading
+from types import SimpleNamespace
+from typing import Any, Dict, List
+
+PM_METRICS_PORT = int(os.getenv("PM_METRICS_PORT", "9108") or 0)
+# Loopback by default: the exporter has no auth and labels counters per alert level / scenario.
+# Set PM_METRICS_ADDR=0.0.0.0 (e.g. in a container) to let a scraper on another host in.
+PM_METRICS_ADDR = os.getenv("PM_METRICS_ADDR", "127.0.0.1").strip()
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+def _escape_label(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+class _Value:
+    """Counter/gauge child: one float behind a lock"""
+    __slots__ = ("value", "_lock")
+
+    def __init__(self):
+        self.value = 0.0
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0):
+        with self._lock:
+            self.value += amount
+
+    def dec(self, amount: float = 1.0):
+        with self._lock:
+            self.value -= amount
+
+    def set(self, value: float):
+        self.value = float(value)
+
+
+class _HistogramValue:
+    """Histogram child: fixed bucket counters, no per-observation allocation"""
+    __slots__ = ("bounds", "counts", "sum", "_lock")
+
+    def __init__(self, bounds):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)  # last slot is +Inf
+        self.sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float):
+        idx = bisect.bisect_left(self.bounds, value)
+        with self._lock:
+            self.counts[idx] += 1
+            self.sum += value
+
+
+class _Metric:
+    def __init__(self, name: str, kind: str, help_text: str, labelnames=(), buckets=None):
+        self.name = name
+        self.kind = kind
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets or DEFAULT_BUCKETS)
+        self._children: Dict[Any, Any] = {}
+        self._lock = threading.Lock()
+        if not self.labelnames:
+            self._default = self._new_child()
+
+    def _new_child(self):
+        return _HistogramValue(self.buckets) if self.kind == "histogram" else _Value()
+
+    def labels(self, *values):
+        """Return (and cache) the child for a label set. Bind once, update many times."""
+        key = values[0] if len(values) == 1 else values
+        child = self._children.get(key)
+        if child is None:
+            with self._lock:
+                child = self._children.setdefault(key, self._new_child())
+        return child
+
+    # Unlabelled shortcuts
+    def inc(self, amount: float = 1.0):
+        self._default.inc(amount)
+
+    def dec(self, amount: float = 1.0):
+        self._default.dec(amount)
+
+    def set(self, value: float):
+        self._default.set(value)
+
+    def observe(self, value: float):
+        self._default.observe(value)
+
+    def _series(self):
+        if not self.labelnames:
+            yield "", self._default
+            return
+        for key, child in list(self._children.items()):
+            values = (key,) if len(self.labelnames) == 1 else key
+            pairs = ",".join(f'{n}="{_escape_label(v)}"' for n, v in zip(self.labelnames, values))
+            yield pairs, child
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        for pairs, child in self._series():
+            if self.kind != "histogram":
+                lines.append(f"{self.name}{{{pairs}}} {child.value}" if pairs else f"{self.name} {child.value}")
+                continue
+            sep = "," if pairs else ""
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), child.counts):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                lines.append(f'{self.name}_bucket{{{pairs}{sep}le="{le}"}} {cumulative}')
+            suffix = f"{{{pairs}}}" if pairs else ""
+            lines.append(f"{self.name}_sum{suffix} {child.sum}")
+            lines.append(f"{self.name}_count{suffix} {cumulative}")
+        return lines
+
+
+class MetricsRegistry:
+    """Minimal process-wide registry of counters, gauges and histograms"""
+
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+
+    def _register(self, metric: _Metric) -> _Metric:
+        return self._metrics.setdefault(metric.name, metric)
+
+    def counter(self, name: str, help_text: str, labelnames=()) -> _Metric:
+        return self._register(_Metric(name, "counter", help_text, labelnames))
+
+    def gauge(self, name: str, help_text: str, labelnames=()) -> _Metric:
+        return self._register(_Metric(name, "gauge", help_text, labelnames))
+
+    def histogram(self, name: str, help_text: str, labelnames=(), buckets=None) -> _Metric:
+        return self._register(_Metric(name, "histogram", help_text, labelnames, buckets))
+
+    def render(self) -> str:
+        lines: List[str] = []
+        for metric in self._metrics.values():
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+def _start_metrics_server(registry: MetricsRegistry):
+    """Serve /metrics on PM_METRICS_PORT in a daemon thread. Fails open if the port is taken."""
+    if not PM_METRICS_PORT:
+        return None
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class _Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split("?", 1)[0] not in ("/", "/metrics"):
+                self.send_error(404)
+                return
+            body = registry.render().encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    try:
+        server = ThreadingHTTPServer((PM_METRICS_ADDR, PM_METRICS_PORT), _Handler)
+    except OSError:
+        return None
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="pm-metrics", daemon=True).start()
+    return server
+
+
+def _build_metrics() -> SimpleNamespace:
+    reg = MetricsRegistry()
+    m = SimpleNamespace(registry=reg, server=None)
+    m.reruns = reg.counter("pm_reruns_total", "Streamlit script reruns")
+    m.rerun_seconds = reg.histogram("pm_rerun_seconds", "Wall time of a profiled rerun")
+    m.events = reg.counter("pm_events_total", "Events passed to splunk_log", ["event_type"])
+    m.events_uncorrelated = reg.counter("pm_events_uncorrelated_total",
+                                        "Events logged without pm_session_id/pm_run_id bound", ["event_type"])
+    m.hec_inflight = reg.gauge("pm_hec_inflight", "HEC posts currently in flight")
+    m.hec_seconds = reg.histogram("pm_hec_post_seconds", "HEC post latency")
+    m.hec_errors = reg.counter("pm_hec_errors_total", "HEC posts that raised")
+    m.event_bytes = reg.counter("pm_event_bytes_total", "Encoded event bytes written, by sink", ["sink"])
+    m.event_encode_seconds = reg.histogram("pm_event_encode_seconds", "Time to encode one event (all sinks)",
+                                           buckets=(1e-5, 2.5e-5, 5e-5, 1e-4, 2.5e-4, 5e-4, 1e-3, 5e-3))
+    m.llm_inflight = reg.gauge("pm_llm_inflight", "LLM requests currently in flight")
+    m.llm_requests = reg.counter("pm_llm_requests_total", "LLM requests by outcome", ["outcome"])
+    m.llm_seconds = reg.histogram("pm_llm_latency_seconds", "LLM request latency")
+    m.llm_tokens = reg.counter("pm_llm_tokens_total", "LLM tokens reported by the API", ["kind"])
+    m.llm_queue_depth = reg.gauge("pm_llm_queue_depth", "LLM requests waiting for a scheduler worker")
+    m.llm_queue_wait = reg.histogram("pm_llm_queue_wait_seconds", "Time from submit to dispatch, incl. rate limiting")
+    m.action_plans = reg.counter("pm_action_plans_total", "Action plans shown, by serving path", ["served_by"])
+    m.ai_cache = reg.counter("pm_ai_cache_lookups_total", "AI action-plan cache lookups", ["result"])
+    m.alert_evals = reg.counter("pm_alert_evaluations_total", "Rule-engine outcomes per rerun", ["level"])
+    m.alert_acks = reg.counter("pm_alert_acks_total", "Emergency alerts acknowledged")
+    # Pre-bind the fixed label sets so the hot path never builds keys
+    m.llm_ok = m.llm_requests.labels("success")
+    m.llm_error = m.llm_requests.labels("error")
+    m.llm_timeout = m.llm_requests.labels("timeout")
+    m.llm_no_key = m.llm_requests.labels("no_api_key")
+    m.llm_over_budget = m.llm_requests.labels("budget_exhausted")
+    m.event_bytes_hec = m.event_bytes.labels("hec")
+    m.event_bytes_archive = m.event_bytes.labels("archive")
+    m.tokens_in = m.llm_tokens.labels("prompt")
+    m.tokens_out = m.llm_tokens.labels("completion")
+    m.cache_hit = m.ai_cache.labels("hit")
+    m.cache_miss = m.ai_cache.labels("miss")
+    m.cache_similar_hit = m.ai_cache.labels("similar_hit")
+    m.alerts_by_level = {lvl: m.alert_evals.labels(lvl) for lvl in ("NORMAL", "WARNING", "EMERGENCY")}
+    return m
+
+
+# One metric set per process (module import is the singleton)
+METRICS = _build_metrics()
+_server_lock = threading.Lock()
+
+
+def ensure_metrics_server():
+    """Start the /metrics server once per process; safe to call on every rerun"""
+    if METRICS.server is None:
+        with _server_lock:
+            if METRICS.server is None:
+                METRICS.server = _start_metrics_server(METRICS.registry) or False
+    return METRICS.server or None
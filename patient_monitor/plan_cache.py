@@ -0,0 +1,105 @@
+"""Similarity lookup for the AI action-plan cache.
+
+The exact cache key includes the last timestamp, so an unchanged patient
+misses every minute. clinical_signature() quantizes the state into a
+canonical form: level, diagnosis, ECG, the flag codes, binned vitals and
+the trend direction of each vital. find_similar_plan() reuses a cached LLM
+plan for the same patient when the categorical part matches exactly, every
+vital is within PM_AI_CACHE_BIN_TOLERANCE bins, and the plan is no older
+than PM_AI_CACHE_MAX_AGE_S of monitoring time.
+"""
+import os
+import math
+from typing import TYPE_CHECKING, Any, Dict, Optional, Tuple
+
+from .fallback import flag_code
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+PM_AI_CACHE_SIMILARITY = os.getenv("PM_AI_CACHE_SIMILARITY", "1").strip() in ("1", "true", "TRUE", "yes", "YES")
+PM_AI_CACHE_BIN_TOLERANCE = int(os.getenv("PM_AI_CACHE_BIN_TOLERANCE", "1"))
+PM_AI_CACHE_MAX_AGE_S = float(os.getenv("PM_AI_CACHE_MAX_AGE_S", "900"))
+PM_AI_CACHE_TREND_ROWS = int(os.getenv("PM_AI_CACHE_TREND_ROWS", "5"))
+
+# Bin width per vital; a trend is only "up"/"down" when it moves at least half a bin
+VITAL_BINS = {
+    "heart_rate_bpm": 10,
+    "temperature_c": 0.5,
+    "bp_systolic_mmHg": 10,
+    "bp_diastolic_mmHg": 10,
+    "spo2_percent": 2,
+}
+
+
+def _bin(value: Any, width: float) -> Optional[int]:
+    try:
+        value = float(value)
+    except (TypeError, ValueError):
+        return None
+    return None if math.isnan(value) else int(math.floor(value / width))
+
+
+def clinical_signature(summary: Dict, df: "pd.DataFrame") -> Dict[str, Any]:
+    """Canonical, quantized clinical state: {"exact": hashable tuple, "bins": tuple of vital bins}"""
+    tail = df.tail(PM_AI_CACHE_TREND_ROWS)
+    latest = summary.get("latest") or {}
+    bins, trends = [], []
+    for column, width in VITAL_BINS.items():
+        bins.append(_bin(latest.get(column), width))
+        trend = 0
+        if column in tail and len(tail) > 1:
+            delta = float(tail[column].iloc[-1]) - float(tail[column].iloc[0])
+            if not math.isnan(delta) and abs(delta) >= width / 2:
+                trend = 1 if delta > 0 else -1
+        trends.append(trend)
+    codes = tuple(sorted({c for c in map(flag_code, summary.get("flags") or []) if c}))
+    exact = (summary.get("level"), summary.get("diagnosis"), str(latest.get("ECG", "")), codes, tuple(trends))
+    return {"exact": exact, "bins": tuple(bins)}
+
+
+def signature_from_json(signature: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+    """Undo the JSON round trip of a persisted signature (lists back to the hashable tuples)"""
+    if not signature:
+        return signature
+    exact = tuple(tuple(part) if isinstance(part, list) else part for part in signature["exact"])
+    return {"exact": exact, "bins": tuple(signature["bins"])}
+
+
+def _bin_distance(a: Tuple, b: Tuple) -> Optional[int]:
+    """Total bin distance, or None when any vital is outside the tolerance"""
+    total = 0
+    for x, y in zip(a, b):
+        if x is None or y is None:
+            if x != y:
+                return None
+            continue
+        d = abs(x - y)
+        if d > PM_AI_CACHE_BIN_TOLERANCE:
+            return None
+        total += d
+    return total
+
+
+def find_similar_plan(cache: Dict[str, Dict], source_name: Optional[str], signature: Dict[str, Any],
+                      data_ts: float) -> Optional[Tuple[str, Dict[str, Any], int]]:
+    """Closest cached LLM plan for the same patient and state: (cache_key, result, bin distance)"""
+    if not PM_AI_CACHE_SIMILARITY:
+        return None
+    best = None
+    for key, result in cache.items():
+        cached_sig = (result or {}).get("signature")
+        if (not cached_sig or result.get("served_by") == "fallback" or not result.get("ok")
+                or result.get("source_name") != source_name or cached_sig["exact"] != signature["exact"]):
+            continue
+        age = data_ts - result.get("data_ts", float("-inf"))
+        if not 0 <= age <= PM_AI_CACHE_MAX_AGE_S:
+            continue
+        distance = _bin_distance(cached_sig["bins"], signature["bins"])
+        if distance is None:
+            continue
+        # Prefer the closest state, then the most recent plan
+        rank = (distance, -result["data_ts"])
+        if best is None or rank < best[0]:
+            best = (rank, key, result, distance)
+    return best[1:] if best else None
@@ -0,0 +1,127 @@
+"""Opt-in cProfile + tracemalloc capture for one or N Streamlit reruns.
+
+Armed per session through a `profile_reruns_left` counter in the session
+state mapping. When not armed the only cost is one mapping read per rerun.
+"""
+import os
+import time
+import json
+from typing import Any, Dict, List, MutableMapping, Optional
+
+from .telemetry import splunk_log
+
+PM_PROFILE_RERUNS = int(os.getenv("PM_PROFILE_RERUNS", "0") or 0)
+PM_PROFILE_DIR = os.getenv("PM_PROFILE_DIR", "logs/profiles").strip()
+PM_PROFILE_TOP_N = int(os.getenv("PM_PROFILE_TOP_N", "25"))
+
+
+def start_profile_capture(state: MutableMapping):
+    """Enable cProfile (+ tracemalloc) for this rerun if `state` (e.g. st.session_state) is armed"""
+    if state.get("_profile_capture") is not None:
+        # Previous rerun ended early (st.stop / st.rerun); close it out first
+        finish_profile_capture(state)
+    if not state.get("profile_reruns_left"):
+        return
+    import cProfile
+    import tracemalloc
+
+    started_tracemalloc = not tracemalloc.is_tracing()
+    if started_tracemalloc:
+        tracemalloc.start(10)
+    profiler = cProfile.Profile()
+    try:
+        profiler.enable()
+    except ValueError:
+        # Another profiler already owns this thread
+        if started_tracemalloc:
+            tracemalloc.stop()
+        state["profile_reruns_left"] = 0
+        return
+    state["_profile_capture"] = {
+        "profiler": profiler,
+        "started": time.perf_counter(),
+        "started_tracemalloc": started_tracemalloc,
+    }
+
+
+def finish_profile_capture(state: MutableMapping, **context) -> Optional[Dict[str, Any]]:
+    """Stop the active capture, write pstats + JSON under PM_PROFILE_DIR, emit a summary event"""
+    capture = state.get("_profile_capture")
+    if capture is None:
+        return None
+    state["_profile_capture"] = None
+    import pstats
+    import tracemalloc
+
+    profiler = capture["profiler"]
+    profiler.disable()
+    wall_ms = round((time.perf_counter() - capture["started"]) * 1000, 2)
+
+    allocations: List[Dict[str, Any]] = []
+    current_kb = peak_kb = None
+    if tracemalloc.is_tracing():
+        snapshot = tracemalloc.take_snapshot()
+        current, peak = tracemalloc.get_traced_memory()
+        current_kb, peak_kb = round(current / 1024, 1), round(peak / 1024, 1)
+        if capture["started_tracemalloc"]:
+            tracemalloc.stop()
+        for stat in snapshot.statistics("lineno")[:PM_PROFILE_TOP_N]:
+            frame = stat.traceback[0]
+            allocations.append({
+                "location": f"{frame.filename}:{frame.lineno}",
+                "size_kb": round(stat.size / 1024, 1),
+                "count": stat.count,
+            })
+
+    stats = pstats.Stats(profiler)
+    ranked = sorted(stats.stats.items(), key=lambda kv: kv[1][3], reverse=True)[:PM_PROFILE_TOP_N]
+    functions = [
+        {
+            "function": f"{filename}:{lineno}({func})",
+            "ncalls": nc,
+            "tottime_ms": round(tt * 1000, 3),
+            "cumtime_ms": round(ct * 1000, 3),
+        }
+        for (filename, lineno, func), (cc, nc, tt, ct, _callers) in ranked
+    ]
+
+    left = max(int(state.get("profile_reruns_left") or 0) - 1, 0)
+    state["profile_reruns_left"] = left
+    run_id = str(state.get("pm_run_id") or "norun")[:8]
+    stem = f"{time.strftime('%Y%m%d-%H%M%S')}_{run_id}_{int(time.time() * 1000) % 100000:05d}"
+    record = {
+        "pm_session_id": state.get("pm_session_id"),
+        "pm_run_id": state.get("pm_run_id"),
+        **context,
+        "wall_ms": wall_ms,
+        "traced_current_kb": current_kb,
+        "traced_peak_kb": peak_kb,
+        "top_functions": functions,
+        "top_allocations": allocations,
+    }
+    pstats_path = json_path = None
+    try:
+        os.makedirs(PM_PROFILE_DIR, exist_ok=True)
+        pstats_path = os.path.join(PM_PROFILE_DIR, stem + ".pstats")
+        json_path = os.path.join(PM_PROFILE_DIR, stem + ".json")
+        stats.dump_stats(pstats_path)
+        with open(json_path, "w", encoding="utf-8") as f:
+            json.dump(record, f, indent=2, default=str)
+    except Exception:
+        pstats_path = json_path = None
+
+    splunk_log({
+        "event_type": "profile_capture",
+        "app": "ai_patient_monitor",
+        **context,
+        "wall_ms": wall_ms,
+        "traced_peak_kb": peak_kb,
+        "top_function": functions[0]["function"] if functions else None,
+        "top_allocation": allocations[0]["location"] if allocations else None,
+        "pstats_path": pstats_path,
+        "reruns_left": left,
+    })
+    summary = {"wall_ms": wall_ms, "pstats_path": pstats_path, "json_path": json_path,
+               "traced_peak_kb": peak_kb, "reruns_left": left}
+    state["last_profile_capture"] = summary
+    return summary
@@ -0,0 +1,266 @@
+"""Per-patient multi-resolution rollups of the vitals stream (1 min / 5 min / 1 h).
+
+Each resolution keeps min / max / sum / count / last per vital plus the
+last ECG label for every time bucket, in growable numpy arrays. update() is
+called on ingest and folds in only the rows newer than anything seen so far.
+Rows arrive in time order, so only the newest stored bucket can receive more
+samples: it is merged in place and later buckets are appended
+(np.*.reduceat per bucket run). The cost of an update is proportional to the
+new rows, not the history. Buckets older than PM_ROLLUP_RETENTION_H are
+dropped.
+
+Readers ask for a time span and the minimum number of points they need.
+pick_resolution() then returns the coarsest resolution that still gives
+that many points. A 72 h chart therefore reads 72 hourly buckets instead of
+4,320 minutes.
+
+Rollups are keyed by (source, patient_id): the same patient id in two
+recordings (every sample file uses P00x) never shares a history. At most
+PM_ROLLUP_MAX_SOURCES rollups are kept; the least recently updated one is
+dropped first.
+"""
+import os
+import threading
+from collections import OrderedDict
+from typing import TYPE_CHECKING, Any, Dict, Optional, Tuple
+
+if TYPE_CHECKING:
+    import numpy as np
+    import pandas as pd
+
+PM_ROLLUP_RETENTION_H = float(os.getenv("PM_ROLLUP_RETENTION_H", "72"))
+PM_TREND_MIN_POINTS = int(os.getenv("PM_TREND_MIN_POINTS", "60"))     # chart points wanted per horizon
+PM_LLM_TREND_HOURS = float(os.getenv("PM_LLM_TREND_HOURS", "24"))     # long-horizon context in the prompt
+PM_LLM_TREND_POINTS = int(os.getenv("PM_LLM_TREND_POINTS", "12"))
+PM_ROLLUP_MAX_SOURCES = int(os.getenv("PM_ROLLUP_MAX_SOURCES", "256"))
+
+# Finest first
+RESOLUTIONS: Tuple[Tuple[str, int], ...] = (("1min", 60), ("5min", 300), ("1h", 3600))
+ROLLUP_VITALS = ("heart_rate_bpm", "temperature_c", "bp_systolic_mmHg", "bp_diastolic_mmHg", "spo2_percent")
+_STATS = ("min", "max", "sum", "count", "last")
+
+
+def pick_resolution(span_s: float, min_points: int) -> Optional[str]:
+    """Coarsest resolution with at least min_points buckets in span_s, or None (use raw rows)"""
+    for name, width in reversed(RESOLUTIONS):
+        if span_s / width >= min_points:
+            return name
+    return None
+
+
+class _Buckets:
+    """Aggregates of one resolution in growable numpy arrays: stats[bucket, vital] = min, max, sum, count, last"""
+
+    def __init__(self, width: int):
+        import numpy as np
+
+        self.width = width
+        self.keep = int(np.ceil(PM_ROLLUP_RETENTION_H * 3600 / width)) + 1
+        self.n = 0
+        self.keys = np.empty(64, dtype=np.int64)                 # bucket start, epoch seconds
+        self.stats = np.empty((64, len(ROLLUP_VITALS), len(_STATS)))
+        self.ecg = np.empty(64, dtype=object)
+
+    def add(self, epoch: "np.ndarray", values: "np.ndarray", ecg: "np.ndarray"):
+        """Fold time-ordered rows (epoch seconds, values[row, vital], ECG labels) into the buckets"""
+        import numpy as np
+
+        keys = epoch // self.width * self.width
+        starts = np.flatnonzero(np.r_[True, keys[1:] != keys[:-1]])
+        ends = np.r_[starts[1:], len(keys)]
+        present = ~np.isnan(values)
+        agg = np.empty((len(starts), values.shape[1], len(_STATS)))
+        agg[..., 0] = np.fmin.reduceat(values, starts, axis=0)
+        agg[..., 1] = np.fmax.reduceat(values, starts, axis=0)
+        agg[..., 2] = np.add.reduceat(np.where(present, values, 0.0), starts, axis=0)
+        agg[..., 3] = np.add.reduceat(present, starts, axis=0)
+        agg[..., 4] = values[ends - 1]
+        keys, ecg = keys[starts], ecg[ends - 1]
+
+        if self.n and keys[0] == self.keys[self.n - 1]:
+            # The first new bucket continues the newest stored one
+            old, new = self.stats[self.n - 1], agg[0]
+            old[:, 0] = np.fmin(old[:, 0], new[:, 0])
+            old[:, 1] = np.fmax(old[:, 1], new[:, 1])
+            old[:, 2:4] += new[:, 2:4]
+            old[:, 4] = np.where(np.isnan(new[:, 4]), old[:, 4], new[:, 4])
+            self.ecg[self.n - 1] = ecg[0]
+            keys, agg, ecg = keys[1:], agg[1:], ecg[1:]
+        if not len(keys):
+            return
+        if self.n + len(keys) > len(self.keys):
+            self._resize(max(2 * len(self.keys), self.n + len(keys)))
+        self.keys[self.n:self.n + len(keys)] = keys
+        self.stats[self.n:self.n + len(keys)] = agg
+        self.ecg[self.n:self.n + len(keys)] = ecg
+        self.n += len(keys)
+        if self.n > 2 * self.keep:
+            # Drop expired buckets; amortized O(1) per bucket
+            self._resize(2 * self.keep, drop=self.n - self.keep)
+
+    def _resize(self, size: int, drop: int = 0):
+        import numpy as np
+
+        for name in ("keys", "stats", "ecg"):
+            array = getattr(self, name)
+            resized = np.empty((size,) + array.shape[1:], dtype=array.dtype)
+            resized[:self.n - drop] = array[drop:self.n]
+            setattr(self, name, resized)
+        self.n -= drop
+
+    def since(self, epoch: Optional[float]) -> int:
+        """Index of the first retained bucket that overlaps [epoch, ...)"""
+        import numpy as np
+
+        lo = max(0, self.n - self.keep)
+        if epoch is None:
+            return lo
+        return max(lo, int(np.searchsorted(self.keys[:self.n], epoch - self.width, side="right")))
+
+
+class VitalsRollup:
+    """Incrementally maintained rollups for one patient"""
+
+    def __init__(self, patient_id: str, source: str = ""):
+        self.patient_id = patient_id
+        self.source = source
+        self.last_ts: Optional["np.datetime64"] = None
+        self.rows = 0
+        self._buckets = {name: _Buckets(width) for name, width in RESOLUTIONS}
+        self._lock = threading.Lock()
+
+    def update(self, df: "pd.DataFrame") -> int:
+        """Fold rows newer than the last ingested timestamp into every resolution. Returns rows added."""
+        import numpy as np
+        import pandas as pd
+
+        with self._lock:
+            ts = df["timestamp"].to_numpy(dtype="datetime64[ns]")
+            new = slice(None)
+            if self.last_ts is not None:
+                if ts[-1] <= self.last_ts:
+                    return 0  # nothing new (e.g. the same file on another rerun)
+                new = ts > self.last_ts
+            # Plain numpy columns: per-row ingest must not pay for DataFrame indexing
+            epoch = ts[new].astype(np.int64) // 1_000_000_000
+            values = np.column_stack([
+                pd.to_numeric(df[vital], errors="coerce").to_numpy(dtype=np.float64)[new]
+                for vital in ROLLUP_VITALS
+            ])
+            ecg = df["ECG"].to_numpy(dtype=object)[new]
+            for buckets in self._buckets.values():
+                buckets.add(epoch, values, ecg)
+            self.last_ts = ts[-1]
+            self.rows += len(epoch)
+            return len(epoch)
+
+    def frame(self, resolution: str, span_s: Optional[float] = None) -> "pd.DataFrame":
+        """Buckets of one resolution (optionally only the last span_s of data time).
+
+        Index: bucket start (Timestamp). Columns: <vital>_min/_max/_mean/_last, ECG_last, samples.
+        """
+        import numpy as np
+        import pandas as pd
+
+        buckets = self._buckets[resolution]
+        with self._lock:
+            since = None
+            if span_s is not None and self.last_ts is not None:
+                since = self.last_ts.astype(np.int64) // 1_000_000_000 - span_s
+            lo, hi = buckets.since(since), buckets.n
+            keys, stats, ecg = buckets.keys[lo:hi].copy(), buckets.stats[lo:hi].copy(), buckets.ecg[lo:hi].copy()
+        columns: Dict[str, Any] = {}
+        with np.errstate(invalid="ignore", divide="ignore"):
+            means = np.round(stats[..., 2] / stats[..., 3], 1)
+        for i, vital in enumerate(ROLLUP_VITALS):
+            columns[f"{vital}_min"] = stats[:, i, 0]
+            columns[f"{vital}_max"] = stats[:, i, 1]
+            columns[f"{vital}_mean"] = means[:, i]
+            columns[f"{vital}_last"] = stats[:, i, 4]
+        columns["ECG_last"] = ecg
+        columns["samples"] = stats[:, 0, 3].astype(np.int64)
+        return pd.DataFrame(columns, index=pd.to_datetime(keys, unit="s").rename("timestamp"))
+
+    def window(self, span_s: float, min_points: int = PM_TREND_MIN_POINTS) -> Tuple[Optional[str], "pd.DataFrame"]:
+        """(resolution, buckets) covering the last span_s at the coarsest sufficient resolution.
+
+        Resolution None means no rollup is coarse enough: the caller should use raw rows.
+        """
+        resolution = pick_resolution(span_s, min_points)
+        if resolution is None:
+            import pandas as pd
+            return None, pd.DataFrame()
+        return resolution, self.frame(resolution, span_s)
+
+    def covered_s(self) -> float:
+        """Data time spanned by the finest retained resolution (first to last bucket, no padding)"""
+        buckets = self._buckets[RESOLUTIONS[0][0]]
+        with self._lock:
+            lo = buckets.since(None)
+            if buckets.n <= lo:
+                return 0.0
+            return float(buckets.keys[buckets.n - 1] - buckets.keys[lo])
+
+    def beyond(self, raw_span_s: float, span_s: float, min_points: int = PM_TREND_MIN_POINTS) -> Optional[str]:
+        """Resolution for a span_s window, or None unless the rollup reaches at least one
+        bucket of that resolution further back than the raw rows (raw_span_s) already shown"""
+        resolution = pick_resolution(span_s, min_points)
+        if resolution is None:
+            return None
+        if self.covered_s() < raw_span_s + dict(RESOLUTIONS)[resolution]:
+            return None
+        return resolution
+
+
+_rollups: "OrderedDict[Tuple[str, str], VitalsRollup]" = OrderedDict()
+_rollups_lock = threading.Lock()
+
+
+def get_rollup(patient_id: str, source: Optional[str] = None, create: bool = True) -> Optional[VitalsRollup]:
+    """Process-wide rollup for a patient of one source (None if it does not exist and create=False)"""
+    key = (source or "", patient_id)
+    with _rollups_lock:
+        rollup = _rollups.get(key)
+        if rollup is None and create:
+            rollup = _rollups[key] = VitalsRollup(patient_id, source or "")
+            while len(_rollups) > PM_ROLLUP_MAX_SOURCES:
+                _rollups.popitem(last=False)
+        if rollup is not None and create:
+            _rollups.move_to_end(key)
+        return rollup
+
+
+def drop_rollups(source: Optional[str]):
+    """Forget every patient's rollup of a source (e.g. the file was rewritten)"""
+    with _rollups_lock:
+        for key in [k for k in _rollups if k[0] == (source or "")]:
+            del _rollups[key]
+
+
+def update_rollups(df: Optional["pd.DataFrame"], source: Optional[str] = None) -> int:
+    """Ingest hook: fold a batch of vitals rows (any number of patients) of one source into their rollups"""
+    if df is None or df.empty:
+        return 0
+    ids = df["patient_id"]
+    if (ids.iloc[0] == ids).all():
+        return get_rollup(str(ids.iloc[0]), source).update(df)
+    return sum(get_rollup(str(pid), source).update(rows) for pid, rows in df.groupby(ids, sort=False))
+
+
+def prompt_trends(patient_id: str, raw_span_s: float, source: Optional[str] = None,
+                  hours: float = PM_LLM_TREND_HOURS,
+                  min_points: int = PM_LLM_TREND_POINTS) -> Optional[Dict[str, Any]]:
+    """Long-horizon context for the LLM prompt, only when the rollup reaches at least one
+    bucket beyond the raw rows already sent"""
+    rollup = get_rollup(patient_id, source, create=False)
+    if rollup is None or rollup.beyond(raw_span_s, hours * 3600, min_points) is None:
+        return None
+    resolution, frame = rollup.window(hours * 3600, min_points)
+    if resolution is None or frame.empty:
+        return None
+    columns = [f"{v}_{s}" for v in ROLLUP_VITALS for s in ("min", "max", "mean")]
+    return {
+        "resolution": resolution,
+        "hours": round(min(hours, rollup.covered_s() / 3600), 1),
+        "csv": frame[columns].to_csv(),
+    }
@@ -0,0 +1,219 @@
+"""Deterministic clinical rule engine (NORMAL -> WARNING -> EMERGENCY)."""
+from typing import TYPE_CHECKING, Any, Dict, Optional
+
+from .telemetry import timed
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+
+@timed("detect_conditions")
+def detect_conditions(df: "pd.DataFrame") -> Dict[str, Any]:
+    """
+    Analyze patient vitals and detect abnormal conditions
+    Returns diagnosis summary with severity level
+    """
+    latest = df.iloc[-1].to_dict()
+    
+    hr = latest.get("heart_rate_bpm", 0)
+    temp = latest.get("temperature_c", 0)
+    sbp = latest.get("bp_systolic_mmHg", 0)
+    dbp = latest.get("bp_diastolic_mmHg", 0)
+    spo2 = latest.get("spo2_percent", 100)
+    ecg = latest.get("ECG", "")
+    # Rhythm classified from the raw waveform, when an ECG channel is attached (see ecg.with_ecg_features)
+    rhythm = latest.get("ecg_rhythm") if isinstance(latest.get("ecg_rhythm"), str) else None
+    
+    # Calculate Mean Arterial Pressure
+    map_val = round(dbp + (sbp - dbp) / 3, 1) if sbp and dbp else None
+    
+    flags = []
+    level = "NORMAL"
+    diagnosis = "Normal vitals"
+    
+    # === EMERGENCY CONDITIONS ===
+    # Severe hypoxemia
+    if spo2 < 88:
+        flags.append(f"CRITICAL: Severe hypoxemia (SpO₂ {spo2}%)")
+        level = "EMERGENCY"
+        diagnosis = "Respiratory failure"
+    
+    # Hypotension
+    if sbp < 90 or (map_val and map_val < 65):
+        flags.append(f"CRITICAL: Hypotension (SBP {sbp}, MAP {map_val})")
+        if level != "EMERGENCY":
+            level = "EMERGENCY"
+        diagnosis = "Hemodynamic instability"
+    
+    # Suspected V-tach
+    if hr >= 160 or "V-tach" in str(ecg) or rhythm == "V-tach":
+        # Name each source: the CSV label and the waveform rhythm can disagree
+        flags.append(f"CRITICAL: Suspected V-tach (HR {hr}, ECG {ecg}"
+                     + (f", waveform {rhythm})" if rhythm else ")"))
+        level = "EMERGENCY"
+        diagnosis = "Cardiac arrhythmia"
+    
+    # Asystole (waveform only)
+    if rhythm == "Asystole":
+        flags.append("CRITICAL: Asystole (no QRS complexes on the ECG waveform)")
+        level = "EMERGENCY"
+        diagnosis = "Cardiac arrhythmia"
+    
+    # === SEPSIS DETECTION (multi-factor) ===
+    sepsis_score = 0
+    if temp >= 38.0 or temp <= 36.0:
+        sepsis_score += 1
+        flags.append(f"Fever/hypothermia (Temp {temp}°C)")
+    if hr > 100:
+        sepsis_score += 1
+        flags.append(f"Tachycardia (HR {hr})")
+    if sbp < 100:
+        sepsis_score += 1
+        flags.append(f"Low BP (SBP {sbp})")
+    if spo2 < 94:
+        sepsis_score += 1
+        flags.append(f"Hypoxemia (SpO₂ {spo2}%)")
+    
+    if sepsis_score >= 3:
+        level = "EMERGENCY"
+        diagnosis = "Suspected sepsis"
+        flags.append("⚠️ SEPSIS-LIKE PATTERN DETECTED")
+    
+    # === TECHNICAL ALERT (waveform only) ===
+    # A detached or flat lead hides the rhythm; never let it read as normal
+    if rhythm == "Lead off":
+        flags.append("ECG lead off — rhythm unavailable")
+        if level != "EMERGENCY":
+            level = "WARNING"
+            diagnosis = "Cardiac monitoring needed"
+    
+    # === WARNING CONDITIONS ===
+    if level != "EMERGENCY":
+        if spo2 < 92:
+            flags.append(f"Mild hypoxemia (SpO₂ {spo2}%)")
+            level = "WARNING"
+            diagnosis = "Respiratory concern"
+        
+        if hr > 120 or hr < 50:
+            flags.append(f"Abnormal HR ({hr} bpm)")
+            level = "WARNING"
+            diagnosis = "Cardiac monitoring needed"
+        
+        if rhythm == "AFib":
+            flags.append(f"Irregular rhythm (AFib suspected, RMSSD {latest.get('rr_rmssd_ms')} ms)")
+            level = "WARNING"
+            diagnosis = "Cardiac monitoring needed"
+        
+        if temp >= 37.8:
+            flags.append(f"Elevated temperature ({temp}°C)")
+            if level != "WARNING":
+                level = "WARNING"
+    
+    return {
+        "level": level,
+        "diagnosis": diagnosis,
+        "flags": flags,
+        "latest": latest,
+        "map": map_val
+    }
+
+def data_ts(summary: Dict) -> Optional[str]:
+    """Vitals timestamp a summary was evaluated at, as stored in events (`data_ts`)"""
+    latest = summary.get("latest")
+    ts = latest.get("timestamp") if isinstance(latest, dict) else None
+    return None if ts is None else str(ts)
+
+def make_json_safe(obj: Any) -> Any:
+    """Convert objects to JSON-safe format"""
+    import pandas as pd
+
+    if isinstance(obj, dict):
+        return {k: make_json_safe(v) for k, v in obj.items()}
+    elif isinstance(obj, list):
+        return [make_json_safe(v) for v in obj]
+    elif pd.isna(obj):
+        return None
+    elif isinstance(obj, (pd.Timestamp, pd.Timedelta)):
+        return str(obj)
+    else:
+        return obj
+
+def estimate_ai_confidence(summary: Dict, llm_ok: Optional[bool] = None) -> str:
+    """Estimate AI confidence based on severity and LLM status"""
+    level = summary.get("level", "NORMAL")
+    flags = summary.get("flags") or []
+    
+    if level == "EMERGENCY":
+        base = "High"
+    elif level == "WARNING":
+        base = "Medium"
+    else:
+        base = "Medium" if flags else "Low"
+    
+    # Downgrade if LLM failed
+    if llm_ok is False:
+        if base == "High":
+            return "Medium"
+        if base == "Medium":
+            return "Low"
+    
+    return base
+
+
+@timed("classify_rows")
+def classify_rows(df: "pd.DataFrame") -> "pd.DataFrame":
+    """Vectorized per-row version of detect_conditions.
+
+    Returns a frame aligned to df.index with alert_level, diagnosis and
+    flag_count for every row (same thresholds and override order as
+    detect_conditions, which only looks at the latest row).
+    """
+    import numpy as np
+    import pandas as pd
+
+    hr = df["heart_rate_bpm"].astype("float64").to_numpy()
+    temp = df["temperature_c"].astype("float64").to_numpy()
+    sbp = df["bp_systolic_mmHg"].astype("float64").to_numpy()
+    dbp = df["bp_diastolic_mmHg"].astype("float64").to_numpy()
+    spo2 = df["spo2_percent"].astype("float64").to_numpy()
+    vtach_ecg = df["ECG"].astype(str).str.contains("V-tach", regex=False).to_numpy()
+    rhythm = df["ecg_rhythm"].astype(str).to_numpy() if "ecg_rhythm" in df else np.full(len(df), "")
+
+    has_map = (sbp != 0) & (dbp != 0)
+    map_val = np.where(has_map, np.round(dbp + (sbp - dbp) / 3, 1), np.nan)
+
+    em_hypox = spo2 < 88
+    em_hypot = (sbp < 90) | (has_map & (map_val != 0) & (map_val < 65))
+    em_vtach = (hr >= 160) | vtach_ecg | (rhythm == "V-tach")
+    em_asystole = rhythm == "Asystole"
+    s_temp = (temp >= 38.0) | (temp <= 36.0)
+    s_hr = hr > 100
+    s_bp = sbp < 100
+    s_spo2 = spo2 < 94
+    sepsis = (s_temp.astype(int) + s_hr + s_bp + s_spo2) >= 3
+    emergency = em_hypox | em_hypot | em_vtach | em_asystole | sepsis
+    lead_off = rhythm == "Lead off"  # flagged at any level; a WARNING only on its own
+
+    w_lead_off = ~emergency & lead_off
+    w_spo2 = ~emergency & (spo2 < 92)
+    w_hr = ~emergency & ((hr > 120) | (hr < 50))
+    w_irregular = ~emergency & (rhythm == "AFib")
+    w_temp = ~emergency & (temp >= 37.8)
+    warning = w_lead_off | w_spo2 | w_hr | w_irregular | w_temp
+
+    level = np.select([emergency, warning], ["EMERGENCY", "WARNING"], default="NORMAL")
+    # Later rules overwrite the diagnosis in detect_conditions, so test them first
+    diagnosis = np.select(
+        [sepsis, em_vtach | em_asystole, em_hypot, em_hypox, w_hr | w_irregular, w_spo2, w_lead_off],
+        ["Suspected sepsis", "Cardiac arrhythmia", "Hemodynamic instability",
+         "Respiratory failure", "Cardiac monitoring needed", "Respiratory concern", "Cardiac monitoring needed"],
+        default="Normal vitals",
+    )
+    flag_count = (
+        em_hypox.astype(int) + em_hypot + em_vtach + em_asystole + s_temp + s_hr + s_bp + s_spo2 + sepsis
+        + lead_off + w_spo2 + w_hr + w_irregular + w_temp
+    )
+    return pd.DataFrame(
+        {"alert_level": level, "diagnosis": diagnosis, "flag_count": flag_count},
+        index=df.index,
+    )
@@ -0,0 +1,302 @@
+"""Process-wide scheduler for LLM action-plan requests.
+
+Every session shares one bounded worker pool, so a ward full of patients
+crossing into WARNING at once queues up instead of bursting OPENAI_BASE_URL.
+Queued jobs are ordered by alert level (EMERGENCY before WARNING), then by
+arrival. Two token buckets (requests/min and tokens/min) gate dispatch: a
+worker only takes the next job once neither bucket is in debt, so the
+priority choice is made at the moment capacity frees up. A job's token cost
+is estimated from its prompt and corrected with the API's reported usage.
+
+Each pm_run_id also has a token budget (PM_LLM_RUN_TOKEN_BUDGET, or
+PM_LLM_RUN_BUDGET_USD converted with COST_PER_TOKEN); a request that would
+overrun it is rejected without calling the API. Without an API key a request
+never enters the queue: it fails at once and takes no rate-limit capacity.
+"""
+import os
+import json
+import time
+import queue
+import itertools
+import threading
+import contextvars
+from concurrent.futures import Future
+from typing import TYPE_CHECKING, Any, Callable, Dict, List, Optional
+
+from .llm import build_llm_prompt, call_llm_actions
+from .metrics import METRICS
+from .rules import data_ts
+from .telemetry import cost_per_token, current_correlation, splunk_log
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+PM_LLM_WORKERS = int(os.getenv("PM_LLM_WORKERS", "4"))
+PM_LLM_RPM = float(os.getenv("PM_LLM_RPM", "60"))          # 0 = unlimited
+PM_LLM_TPM = float(os.getenv("PM_LLM_TPM", "90000"))       # 0 = unlimited
+PM_LLM_RUN_TOKEN_BUDGET = int(os.getenv("PM_LLM_RUN_TOKEN_BUDGET", "0"))    # 0 = unlimited
+PM_LLM_RUN_BUDGET_USD = float(os.getenv("PM_LLM_RUN_BUDGET_USD", "0"))      # 0 = unlimited
+PM_LLM_COMPLETION_TOKENS_EST = int(os.getenv("PM_LLM_COMPLETION_TOKENS_EST", "600"))
+PM_LLM_MAX_QUEUE_WAIT_S = float(os.getenv("PM_LLM_MAX_QUEUE_WAIT_S", "120"))
+
+PRIORITY = {"EMERGENCY": 0, "WARNING": 1}
+
+
+def run_token_budget() -> Optional[int]:
+    """Tokens allowed per pm_run_id, or None when unlimited"""
+    limits = []
+    if PM_LLM_RUN_TOKEN_BUDGET > 0:
+        limits.append(PM_LLM_RUN_TOKEN_BUDGET)
+    if PM_LLM_RUN_BUDGET_USD > 0 and cost_per_token() > 0:
+        limits.append(int(PM_LLM_RUN_BUDGET_USD / cost_per_token()))
+    return min(limits) if limits else None
+
+
+def estimate_tokens(prompt) -> int:
+    """Rough token cost of a request: ~4 chars per prompt token plus the expected completion"""
+    system, user_content = prompt
+    return (len(system) + len(json.dumps(user_content, indent=2))) // 4 + PM_LLM_COMPLETION_TOKENS_EST
+
+
+def _failed(error: str) -> Dict[str, Any]:
+    return {"ok": False, "error": error, "latency_s": 0, "usage": None, "text": None}
+
+
+# ============================================================================
+# RATE LIMITING / BUDGET
+# ============================================================================
+class TokenBucket:
+    """Allowance refilled at `per_minute` units/min up to one minute's worth; <= 0 means unlimited.
+
+    take() may drive the level negative; the debt is paid off by whoever waits next.
+    """
+
+    def __init__(self, per_minute: float):
+        self.rate = per_minute / 60.0
+        self.capacity = per_minute
+        self.level = per_minute
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.level = min(self.capacity, self.level + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def wait_time(self) -> float:
+        """Seconds until the bucket is out of debt"""
+        if self.rate <= 0:
+            return 0.0
+        with self._lock:
+            self._refill()
+            return 0.0 if self.level >= 0 else -self.level / self.rate
+
+    def take(self, amount: float):
+        if self.rate <= 0:
+            return
+        with self._lock:
+            self._refill()
+            self.level -= amount
+
+    def credit(self, amount: float):
+        """Give back over-estimated units (a negative amount charges an under-estimate)"""
+        if self.rate <= 0:
+            return
+        with self._lock:
+            self._refill()
+            self.level = min(self.capacity, self.level + amount)
+
+
+class RunBudget:
+    """Tokens used (settled + reserved) per pm_run_id against a fixed limit"""
+
+    def __init__(self, limit: Optional[int]):
+        self.limit = limit
+        self._used: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def used(self, run_id: Optional[str]) -> int:
+        return self._used.get(run_id or "", 0)
+
+    def reserve(self, run_id: Optional[str], tokens: int) -> bool:
+        key = run_id or ""
+        with self._lock:
+            used = self._used.get(key, 0)
+            if self.limit is not None and used + tokens > self.limit:
+                return False
+            self._used[key] = used + tokens
+            return True
+
+    def settle(self, run_id: Optional[str], reserved: int, actual: int):
+        key = run_id or ""
+        with self._lock:
+            self._used[key] = max(0, self._used.get(key, 0) - reserved + actual)
+
+
+# ============================================================================
+# SCHEDULER
+# ============================================================================
+class _Job:
+    __slots__ = ("fn", "level", "est_tokens", "run_id", "event_fields", "future", "context", "submitted")
+
+    def __init__(self, fn, level, est_tokens, run_id, event_fields):
+        self.fn = fn
+        self.level = level
+        self.est_tokens = est_tokens
+        self.run_id = run_id
+        self.event_fields = event_fields
+        self.future: Future = Future()
+        # Workers run the job inside the submitter's context so correlation ids
+        # and the rerun's render profile follow it onto the worker thread
+        self.context = contextvars.copy_context()
+        self.submitted = time.perf_counter()
+
+
+class InferenceScheduler:
+    """Bounded worker pool with priority dispatch, RPM/TPM buckets and per-run budgets"""
+
+    def __init__(self, workers: int = PM_LLM_WORKERS, rpm: float = PM_LLM_RPM, tpm: float = PM_LLM_TPM,
+                 budget: Optional[int] = None):
+        self.workers = max(1, workers)
+        self.requests = TokenBucket(rpm)
+        self.tokens = TokenBucket(tpm)
+        self.budget = RunBudget(budget)
+        self._queue: "queue.PriorityQueue" = queue.PriorityQueue()
+        self._seq = itertools.count()
+        self._dispatch = threading.Lock()
+        # Debits at dispatch and corrections after a call (buckets + run budget) never interleave
+        self._accounting = threading.Lock()
+        self._threads: List[threading.Thread] = []
+        self._start_lock = threading.Lock()
+
+    def _ensure_workers(self):
+        if self._threads:
+            return
+        with self._start_lock:
+            while len(self._threads) < self.workers:
+                t = threading.Thread(target=self._work, name=f"pm-llm-{len(self._threads)}", daemon=True)
+                t.start()
+                self._threads.append(t)
+
+    def submit(self, fn: Callable[[Dict[str, Any]], Dict], level: str, est_tokens: int,
+               run_id: Optional[str] = None, event_fields: Optional[Dict[str, Any]] = None) -> Future:
+        """Queue fn(event_extra) -> result dict. Rejects (without queueing) once the run budget is spent.
+
+        `event_fields` describe the request (scenario, diagnosis, ...) for events the scheduler emits itself.
+        """
+        if not self.budget.reserve(run_id, est_tokens):
+            future: Future = Future()
+            future.set_result(None)
+            return future
+        job = _Job(fn, level, est_tokens, run_id, event_fields or {})
+        METRICS.llm_queue_depth.inc()
+        self._queue.put((PRIORITY.get(level, len(PRIORITY)), next(self._seq), job))
+        self._ensure_workers()
+        return job.future
+
+    def _await_capacity(self):
+        while True:
+            wait = max(self.requests.wait_time(), self.tokens.wait_time())
+            if wait <= 0:
+                return
+            time.sleep(min(wait, 1.0))
+
+    def _work(self):
+        while True:
+            with self._dispatch:
+                self._await_capacity()
+                _, _, job = self._queue.get()
+                METRICS.llm_queue_depth.dec()
+                queue_wait = time.perf_counter() - job.submitted
+                expired = queue_wait > PM_LLM_MAX_QUEUE_WAIT_S
+                if not expired:
+                    with self._accounting:
+                        self.requests.take(1)
+                        self.tokens.take(job.est_tokens)
+            if not job.future.set_running_or_notify_cancel():
+                with self._accounting:
+                    self.budget.settle(job.run_id, job.est_tokens, 0)
+                continue
+            METRICS.llm_queue_wait.observe(queue_wait)
+            extra = {
+                "queue_wait_ms": int(queue_wait * 1000),
+                "priority": job.level,
+                "est_tokens": job.est_tokens,
+                "run_tokens_used": self.budget.used(job.run_id),
+                "run_token_budget": self.budget.limit,
+            }
+            if expired:
+                with self._accounting:
+                    self.budget.settle(job.run_id, job.est_tokens, 0)
+                error = f"LLM request expired after {queue_wait:.0f}s in queue"
+                job.context.run(splunk_log, {"event_type": "ai_inference", **job.event_fields,
+                                             "alert_level": job.level, "success": False, "error": error, **extra})
+                job.future.set_result(dict(_failed(error), queue_wait_s=round(queue_wait, 3)))
+                continue
+            try:
+                result = job.context.run(job.fn, extra)
+            except Exception as e:
+                result = _failed(f"Error calling LLM: {str(e)}")
+            actual = int(((result or {}).get("usage") or {}).get("total_tokens") or 0)
+            with self._accounting:
+                self.budget.settle(job.run_id, job.est_tokens, actual)
+                if actual:
+                    self.tokens.credit(job.est_tokens - actual)
+            job.future.set_result(dict(result or {}, queue_wait_s=round(queue_wait, 3)))
+
+
+_scheduler: Optional[InferenceScheduler] = None
+_scheduler_lock = threading.Lock()
+
+
+def get_scheduler() -> InferenceScheduler:
+    """Process-wide scheduler (one pool and one set of rate limits for every session)"""
+    global _scheduler
+    if _scheduler is None:
+        with _scheduler_lock:
+            if _scheduler is None:
+                _scheduler = InferenceScheduler(budget=run_token_budget())
+    return _scheduler
+
+
+def submit_llm_actions(summary: Dict, df_tail: "pd.DataFrame", source_name: Optional[str] = None,
+                       api_key: Optional[str] = None, rollup_source: Optional[str] = None) -> Future:
+    """Schedule call_llm_actions(); the Future resolves to the same result dict plus queue_wait_s.
+
+    `rollup_source` names the recording whose rollups feed the prompt (default: source_name).
+    """
+    if not (api_key or os.getenv("OPENAI_API_KEY", "")):
+        # Nothing to send: answer now (call_llm_actions records the no-key event) without
+        # taking an RPM/TPM slot or budget a real request could use
+        future: Future = Future()
+        future.set_result(dict(call_llm_actions(summary, df_tail, source_name=source_name),
+                               queue_wait_s=0))
+        return future
+    scheduler = get_scheduler()
+    prompt = build_llm_prompt(summary, df_tail, rollup_source or source_name)
+    est = estimate_tokens(prompt)
+    level = summary.get("level", "UNKNOWN")
+    run_id = current_correlation().get("pm_run_id")
+
+    def job(extra: Dict[str, Any]) -> Dict:
+        return call_llm_actions(summary, df_tail, source_name=source_name, api_key=api_key,
+                                prompt=prompt, event_extra=extra)
+
+    future = scheduler.submit(job, level, est, run_id, event_fields={
+        "app": "ai_patient_monitor", "scenario": source_name or "unknown",
+        "diagnosis": summary.get("diagnosis", ""), "data_ts": data_ts(summary),
+        "model": os.getenv("OPENAI_MODEL", "gpt-4o-mini"),
+    })
+    if future.done() and future.result() is None:
+        # Over budget: answer immediately, but still record the attempt
+        METRICS.llm_over_budget.inc()
+        error = (f"LLM token budget for this run exhausted "
+                 f"({scheduler.budget.used(run_id)} of {scheduler.budget.limit} tokens used)")
+        splunk_log({"event_type": "ai_inference", "app": "ai_patient_monitor", "scenario": source_name or "unknown",
+                    "alert_level": level, "diagnosis": summary.get("diagnosis", ""), "data_ts": data_ts(summary),
+                    "model": os.getenv("OPENAI_MODEL", "gpt-4o-mini"), "success": False, "error": error,
+                    "queue_wait_ms": 0, "priority": level, "est_tokens": est,
+                    "run_tokens_used": scheduler.budget.used(run_id), "run_token_budget": scheduler.budget.limit})
+        future = Future()
+        future.set_result(dict(_failed(f"⚠️ {error}"), queue_wait_s=0))
+    return future
@@ -0,0 +1,262 @@
+"""Crash-safe per-session state: alert acknowledgements, AI plan cache, alarm timing, run ids.
+
+st.session_state dies with the browser tab and the Streamlit process. A
+reload would then re-fire every acknowledged alarm and re-run the LLM for
+every open patient. The values that must survive are kept here, keyed by
+(pm_session_id, patient_id, key), in a SQLite file (PM_STATE_DB, default
+`logs/session_state.sqlite`) in WAL mode. patient_id "" holds session-level
+values.
+
+- Reads come from an in-memory mirror. A session's rows are loaded with one
+  indexed query the first time this process sees the session; that is the
+  whole restart recovery. Every later read is a dict lookup.
+- Writes update the mirror at once and are queued. A writer thread commits the
+  queue in one transaction every PM_STATE_FLUSH_S seconds (default 0.5) or as
+  soon as PM_STATE_BATCH writes are pending. A crash loses at most the last
+  flush interval.
+- Rows not updated for PM_STATE_TTL_H hours (default 72) are pruned when the
+  store opens. The mirror keeps the PM_STATE_MIRROR_SESSIONS most recently
+  used sessions (default 512); an evicted session is read back from disk
+  plus the writes still queued for it.
+- A value that cannot be encoded as JSON is logged and skipped; it never
+  breaks the page run.
+
+The session id travels in the URL, so it works like a bearer token: every tab
+opened on that URL is the same session. claim_tab() / owns_session() let the
+newest tab own the session; older tabs stop writing (see the app).
+"""
+import os
+import json
+import time
+import atexit
+import logging
+import sqlite3
+import threading
+from collections import OrderedDict
+from contextlib import closing
+from typing import Any, Dict, List, Optional, Tuple
+
+PM_STATE_DB = os.getenv("PM_STATE_DB", "logs/session_state.sqlite").strip()
+PM_STATE_FLUSH_S = float(os.getenv("PM_STATE_FLUSH_S", "0.5"))
+PM_STATE_BATCH = int(os.getenv("PM_STATE_BATCH", "256"))
+PM_STATE_TTL_H = float(os.getenv("PM_STATE_TTL_H", "72"))
+PM_STATE_MIRROR_SESSIONS = int(os.getenv("PM_STATE_MIRROR_SESSIONS", "512"))
+TAB_KEY = "_tab"  # session-level key holding the id of the tab that owns the session
+
+log = logging.getLogger(__name__)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS state (
+    session_id TEXT NOT NULL,
+    patient_id TEXT NOT NULL,
+    key TEXT NOT NULL,
+    value TEXT NOT NULL,
+    updated REAL NOT NULL,
+    PRIMARY KEY (session_id, patient_id, key)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS ix_state_updated ON state (updated);
+"""
+_UPSERT = "INSERT OR REPLACE INTO state VALUES (?, ?, ?, ?, ?)"
+
+
+def _encode(value: Any) -> str:
+    """Strict JSON: no default=, so an unsupported type raises TypeError instead of being stored as str(obj)"""
+    return json.dumps(value, separators=(",", ":"), ensure_ascii=False)
+
+
+class SessionStore:
+    """SQLite-backed state with an in-memory mirror and a batching writer thread"""
+
+    def __init__(self, path: str = PM_STATE_DB, flush_s: float = PM_STATE_FLUSH_S, batch: int = PM_STATE_BATCH,
+                 mirror_sessions: int = PM_STATE_MIRROR_SESSIONS):
+        self.path = path
+        self.flush_s = flush_s
+        self.batch = batch
+        self.mirror_sessions = mirror_sessions
+        self.writes = 0
+        self.commits = 0
+        self.skipped = 0
+        self._mirror: "OrderedDict[str, Dict[Tuple[str, str], Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._pending: List[tuple] = []   # ("put", row) / ("clear", session_id), in call order
+        self._inflight: List[tuple] = []  # taken by the writer, not yet committed
+        self._wake = threading.Condition(self._lock)
+        self._flushed = threading.Condition(self._lock)
+        self._writer: Optional[threading.Thread] = None
+        with closing(self._connect()) as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(_SCHEMA)
+            if PM_STATE_TTL_H > 0:
+                conn.execute("DELETE FROM state WHERE updated < ?", (time.time() - PM_STATE_TTL_H * 3600,))
+
+    def _connect(self) -> sqlite3.Connection:
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        conn = sqlite3.connect(self.path, timeout=10, isolation_level=None, check_same_thread=False)
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    # ------------------------------------------------------------------
+    # Reads (mirror)
+    # ------------------------------------------------------------------
+    def _load(self, session_id: str) -> Dict[Tuple[str, str], Any]:
+        """Committed rows of one session (no lock needed: WAL readers never block the writer)"""
+        rows = {}
+        with closing(self._connect()) as conn:
+            for patient_id, key, value in conn.execute(
+                    "SELECT patient_id, key, value FROM state WHERE session_id=?", (session_id,)):
+                try:
+                    rows[(patient_id, key)] = json.loads(value)
+                except ValueError:
+                    continue
+        return rows
+
+    def _session(self, session_id: str) -> Dict[Tuple[str, str], Any]:
+        """Mirror of one session, loaded from disk on first use.
+
+        The caller holds the lock. It is released for the query, so a cold or
+        evicted session does not block other sessions or the writer.
+        """
+        while True:
+            rows = self._mirror.get(session_id)
+            if rows is not None:
+                self._mirror.move_to_end(session_id)
+                return rows
+            committed = self.writes
+            self._lock.release()
+            try:
+                rows = self._load(session_id)
+            finally:
+                self._lock.acquire()
+            if session_id in self._mirror or self.writes != committed:
+                # Loaded by another thread meanwhile, or a batch committed during the
+                # query and may or may not be in `rows`: start over
+                continue
+            # Writes not committed yet (the session may have been evicted since)
+            for op, arg in self._inflight + self._pending:
+                if op == "clear" and arg == session_id:
+                    rows.clear()
+                elif op == "put" and arg[0] == session_id:
+                    rows[(arg[1], arg[2])] = json.loads(arg[3])
+            self._mirror[session_id] = rows
+            while len(self._mirror) > self.mirror_sessions:
+                self._mirror.popitem(last=False)
+            return rows
+
+    def get(self, session_id: str, patient_id: str, key: str, default: Any = None) -> Any:
+        with self._lock:
+            return self._session(session_id).get((patient_id, key), default)
+
+    def items(self, session_id: str, patient_id: str, prefix: str = "") -> Dict[str, Any]:
+        """{key without prefix: value} for one patient's keys that start with prefix"""
+        with self._lock:
+            rows = self._session(session_id)
+            return {key[len(prefix):]: value for (pid, key), value in rows.items()
+                    if pid == patient_id and key.startswith(prefix)}
+
+    # ------------------------------------------------------------------
+    # Writes (queued, committed in batches)
+    # ------------------------------------------------------------------
+    def put(self, session_id: str, patient_id: str, key: str, value: Any) -> bool:
+        """Queue a write. Returns False (and logs) when the value cannot be encoded."""
+        try:
+            encoded = _encode(value)
+        except (TypeError, ValueError) as e:
+            self.skipped += 1
+            log.warning("session state %r for %s not persisted: %s", key, patient_id or "session", e)
+            return False
+        with self._lock:
+            rows = self._session(session_id)
+            if (patient_id, key) in rows and _encode(rows[(patient_id, key)]) == encoded:
+                return True  # unchanged: nothing to write
+            # The mirror holds what a restart would read back (e.g. tuples become lists)
+            rows[(patient_id, key)] = json.loads(encoded)
+            self._pending.append(("put", (session_id, patient_id, key, encoded, time.time())))
+            self._start_writer()
+            if len(self._pending) >= self.batch:
+                self._wake.notify()
+        return True
+
+    def claim_tab(self, session_id: str, tab_id: str):
+        """Make tab_id the owner of the session (the newest tab to open or reclaim it)"""
+        self.put(session_id, "", TAB_KEY, tab_id)
+
+    def owns_session(self, session_id: str, tab_id: str) -> bool:
+        """False once another tab has claimed the session"""
+        return self.get(session_id, "", TAB_KEY) in (None, tab_id)
+
+    def clear_session(self, session_id: str):
+        """Forget everything stored for a session (e.g. "Reset Monitor")"""
+        with self._lock:
+            self._mirror[session_id] = {}
+            self._pending.append(("clear", session_id))
+            self._start_writer()
+            self._wake.notify()
+
+    def flush(self, timeout: float = 5.0) -> bool:
+        """Block until every queued write is committed"""
+        with self._lock:
+            if self._writer is None:
+                return True
+            target = self.writes + len(self._inflight) + len(self._pending)
+            self._wake.notify()
+            return self._flushed.wait_for(lambda: self.writes >= target, timeout)
+
+    def _start_writer(self):
+        if self._writer is None:
+            self._writer = threading.Thread(target=self._write_loop, name="pm-session-store", daemon=True)
+            self._writer.start()
+
+    def _write_loop(self):
+        conn = self._connect()
+        while True:
+            with self._lock:
+                if len(self._pending) < self.batch:
+                    self._wake.wait(self.flush_s)
+                ops, self._pending = self._pending, []
+                self._inflight = ops
+            if not ops:
+                continue
+            try:
+                conn.execute("BEGIN IMMEDIATE")
+                for op, arg in ops:
+                    if op == "put":
+                        conn.execute(_UPSERT, arg)
+                    else:
+                        conn.execute("DELETE FROM state WHERE session_id=?", (arg,))
+                conn.execute("COMMIT")
+            except sqlite3.Error:
+                # Fail open: the mirror still serves this process; the rows are retried next batch
+                try:
+                    conn.execute("ROLLBACK")
+                except sqlite3.Error:
+                    pass
+                with self._lock:
+                    self._pending[:0] = ops
+                    self._inflight = []
+                time.sleep(self.flush_s)
+                continue
+            with self._lock:
+                self.writes += len(ops)
+                self._inflight = []
+                self.commits += 1
+                self._flushed.notify_all()
+
+
+_stores: Dict[str, SessionStore] = {}
+_stores_lock = threading.Lock()
+
+
+def get_session_store(path: Optional[str] = None) -> SessionStore:
+    """Process-wide store for PM_STATE_DB (or `path`)"""
+    key = os.path.abspath(path or PM_STATE_DB)
+    with _stores_lock:
+        store = _stores.get(key)
+        if store is None:
+            store = _stores[key] = SessionStore(key)
+        return store
+
+
+@atexit.register
+def _flush_all():
+    for store in list(_stores.values()):
+        store.flush(timeout=2.0)
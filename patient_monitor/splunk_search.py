@@ -0,0 +1,114 @@
+"""Splunk Management API (8089) search helpers for in-app run summaries."""
+import os
+import time
+from typing import Any, Dict, List
+
+from .telemetry import PM_SPLUNK_VERIFY_TLS, SPLUNK_INDEX, SPLUNK_SOURCETYPE
+
+SPLUNK_MGMT_URL = os.getenv("SPLUNK_MGMT_URL", "").strip()
+SPLUNK_USERNAME = os.getenv("SPLUNK_USERNAME", "").strip()
+SPLUNK_PASSWORD = os.getenv("SPLUNK_PASSWORD", "").strip()
+
+
+def splunk_rest_enabled() -> bool:
+    return bool(SPLUNK_MGMT_URL and SPLUNK_USERNAME and SPLUNK_PASSWORD)
+
+def run_splunk_search(query: str, earliest: str = "-60m", latest: str = "now", timeout_s: int = 20) -> List[Dict[str, Any]]:
+    """
+    Run a Splunk search via Management API and return results (JSON rows).
+    Note: For localhost demos, PM_SPLUNK_VERIFY_TLS=0 is fine; production should verify TLS.
+    """
+    import requests
+
+    jobs_url = f"{SPLUNK_MGMT_URL}/services/search/jobs"
+    # Splunk expects 'search' prefixed with 'search ' if using raw SPL
+    data = {
+        "search": f"search {query}",
+        "earliest_time": earliest,
+        "latest_time": latest,
+        "output_mode": "json",
+        "exec_mode": "normal",
+    }
+
+    r = requests.post(jobs_url, data=data, auth=(SPLUNK_USERNAME, SPLUNK_PASSWORD), verify=PM_SPLUNK_VERIFY_TLS, timeout=10)
+    r.raise_for_status()
+
+    try:
+        sid = r.json().get("sid")
+    except Exception:
+        sid = None
+    if not sid:
+        raise RuntimeError("Splunk did not return a search job SID (sid).")
+
+    job_url = f"{SPLUNK_MGMT_URL}/services/search/jobs/{sid}"
+    t0 = time.time()
+    while True:
+        jr = requests.get(job_url, params={"output_mode": "json"}, auth=(SPLUNK_USERNAME, SPLUNK_PASSWORD),
+                          verify=PM_SPLUNK_VERIFY_TLS, timeout=10)
+        jr.raise_for_status()
+        payload = jr.json()
+        entry = (payload.get("entry") or [{}])[0]
+        content = entry.get("content", {})
+        if content.get("isDone") is True or content.get("dispatchState") == "DONE":
+            break
+        if time.time() - t0 > timeout_s:
+            raise TimeoutError("Timed out waiting for Splunk search completion.")
+        time.sleep(0.6)
+
+    results_url = f"{SPLUNK_MGMT_URL}/services/search/jobs/{sid}/results"
+    rr = requests.get(results_url, params={"output_mode": "json", "count": 0}, auth=(SPLUNK_USERNAME, SPLUNK_PASSWORD),
+                      verify=PM_SPLUNK_VERIFY_TLS, timeout=10)
+    rr.raise_for_status()
+    return rr.json().get("results") or []
+
+def get_demo_run_summary(pm_run_id: str) -> Dict[str, Any]:
+    """
+    Summarize this demo run using pm_run_id correlation.
+    Looks back 24h to avoid time-range surprises during demos.
+    """
+    base = f'index={SPLUNK_INDEX} sourcetype="{SPLUNK_SOURCETYPE}" pm_run_id="{pm_run_id}"'
+
+    q_ai = base + ' event_type="ai_inference" ' \
+        '| eval latency_ms=tonumber(latency_ms) ' \
+        '| eval tokens_total=tonumber(tokens_total) ' \
+        '| eval est=tonumber(estimated_cost_usd) ' \
+        '| eval s=case(success="true",1, success=1,1, true(),0) ' \
+        '| stats count as ai_calls sum(s) as successes ' \
+        '       avg(latency_ms) as avg_latency_ms p95(latency_ms) as p95_latency_ms ' \
+        '       sum(tokens_total) as tokens_sum sum(est) as est_cost_usd'
+
+    rows = run_splunk_search(q_ai, earliest="-24h", latest="now")
+    ai = rows[0] if rows else {}
+
+    q_em = base + ' event_type="clinical_alert" alert_level="EMERGENCY" | stats count as emergency_count'
+    rows2 = run_splunk_search(q_em, earliest="-24h", latest="now")
+    em = rows2[0] if rows2 else {}
+
+    def _to_int(v, default=0):
+        try:
+            return int(float(v))
+        except Exception:
+            return default
+
+    def _to_float(v, default=0.0):
+        try:
+            return float(v)
+        except Exception:
+            return default
+
+    ai_calls = _to_int(ai.get("ai_calls"), 0)
+    successes = _to_int(ai.get("successes"), 0)
+    failures = max(ai_calls - successes, 0)
+    success_rate = round((100.0 * successes / ai_calls), 2) if ai_calls else 0.0
+
+    return {
+        "ai_calls": ai_calls,
+        "successes": successes,
+        "failures": failures,
+        "success_rate_pct": success_rate,
+        "avg_latency_ms": _to_int(ai.get("avg_latency_ms"), 0),
+        "p95_latency_ms": _to_int(ai.get("p95_latency_ms"), 0),
+        "tokens_sum": _to_int(ai.get("tokens_sum"), 0),
+        "est_cost_usd": round(_to_float(ai.get("est_cost_usd"), 0.0), 4),
+        "emergency_count": _to_int(em.get("emergency_count"), 0),
+    }
@@ -0,0 +1,85 @@
+"""Server-side windowing for the raw-data table.
+
+Filtering and paging happen here so the browser only ever receives one page.
+Timestamps are sorted by read_vitals_csv, so time ranges are two binary
+searches instead of a full-column comparison.
+"""
+import io
+import os
+from typing import TYPE_CHECKING, Any, Iterable, Optional, Tuple
+
+if TYPE_CHECKING:
+    import numpy as np
+    import pandas as pd
+
+PM_EXPORT_CHUNK_ROWS = int(os.getenv("PM_EXPORT_CHUNK_ROWS", "50000"))
+
+
+def time_window(timestamps: "pd.Series", start: Any = None, end: Any = None) -> Tuple[int, int]:
+    """Positional [lo, hi) bounds of start <= ts <= end on a sorted timestamp column"""
+    values = timestamps.to_numpy()
+    lo = 0 if start is None else int(values.searchsorted(start, side="left"))
+    hi = len(values) if end is None else int(values.searchsorted(end, side="right"))
+    return lo, max(lo, hi)
+
+
+def row_at(timestamps: "pd.Series", at: Any) -> int:
+    """Position of the last row with ts <= at (0 if `at` precedes the data) — a replay seek"""
+    pos = int(timestamps.to_numpy().searchsorted(at, side="right")) - 1
+    return max(pos, 0)
+
+
+def select_rows(df: "pd.DataFrame", row_alerts: Optional["pd.DataFrame"] = None,
+                start: Any = None, end: Any = None,
+                levels: Optional[Iterable[str]] = None, flagged_only: bool = False) -> "np.ndarray":
+    """Positions of rows inside the time window, optionally limited to alert levels / flagged rows"""
+    import numpy as np
+    import pandas as pd
+
+    lo, hi = time_window(df["timestamp"], pd.Timestamp(start) if start is not None else None,
+                         pd.Timestamp(end) if end is not None else None)
+    positions = np.arange(lo, hi)
+    if row_alerts is None:
+        return positions
+    wanted = np.ones(hi - lo, dtype=bool)
+    if levels is not None:
+        wanted &= row_alerts["alert_level"].iloc[lo:hi].isin(list(levels)).to_numpy()
+    if flagged_only:
+        # A row can carry flags (e.g. tachycardia) while still NORMAL overall
+        wanted &= row_alerts["flag_count"].iloc[lo:hi].to_numpy() > 0
+    return positions[wanted]
+
+
+def page_of(df: "pd.DataFrame", positions: "np.ndarray", page: int, page_size: int,
+            row_alerts: Optional["pd.DataFrame"] = None) -> "pd.DataFrame":
+    """Materialize one page (1-based) of the selection, with alert columns joined in"""
+    chunk = positions[(page - 1) * page_size: page * page_size]
+    out = df.iloc[chunk]
+    if row_alerts is not None:
+        out = out.join(row_alerts.iloc[chunk])
+    return out
+
+
+def export_csv(df: "pd.DataFrame", positions: Optional["np.ndarray"] = None,
+               row_alerts: Optional["pd.DataFrame"] = None) -> io.BytesIO:
+    """Encode the selection as CSV, PM_EXPORT_CHUNK_ROWS rows at a time.
+
+    Each chunk is formatted and encoded on its own, so peak memory is the
+    output bytes plus one chunk rather than a full-frame string plus its
+    encoded copy. The export is deferred (the download button calls this on
+    click), not streamed: the returned buffer holds the whole CSV, and
+    st.download_button keeps its own copy of the bytes.
+    """
+    import numpy as np
+
+    if positions is None:
+        positions = np.arange(len(df))
+    out = io.BytesIO()
+    for start in range(0, max(len(positions), 1), PM_EXPORT_CHUNK_ROWS):
+        chunk = positions[start:start + PM_EXPORT_CHUNK_ROWS]
+        part = df.iloc[chunk]
+        if row_alerts is not None:
+            part = part.join(row_alerts.iloc[chunk])
+        out.write(part.to_csv(index=False, header=(start == 0)).encode("utf-8"))
+    out.seek(0)
+    return out
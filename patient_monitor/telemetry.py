@@ -0,0 +1,269 @@
+"""Splunk HEC telemetry (fail-open) and per-stage timing spans.
+
+Correlation ids are bound per thread with bind_correlation() instead of being
+read from st.session_state, so the same code runs headless (CLI, load tests).
+Streamlit starts threads of its own (fragment reruns), which must re-bind; if
+one doesn't, the ids are read from the running script's session state.
+"""
+import os
+import sys
+import time
+import functools
+import contextvars
+from typing import Any, Dict, List, Optional
+
+from .event_codec import archive_path, compact_available, encode_compact, encode_json, is_compact_path
+from .metrics import METRICS
+
+# ============================================================================
+# SPLUNK AI OBSERVABILITY (HEC) - OPTIONAL / FAIL-OPEN
+# ============================================================================
+SPLUNK_HEC_URL = os.getenv("SPLUNK_HEC_URL", "").strip()
+SPLUNK_HEC_TOKEN = os.getenv("SPLUNK_HEC_TOKEN", "").strip()
+SPLUNK_INDEX = os.getenv("SPLUNK_INDEX", "").strip()
+SPLUNK_SOURCETYPE = os.getenv("SPLUNK_SOURCETYPE", "ai-patient-monitor").strip()
+
+# TLS verify for localhost demo (set PM_SPLUNK_VERIFY_TLS=1 to verify)
+PM_SPLUNK_VERIFY_TLS = os.getenv("PM_SPLUNK_VERIFY_TLS", "0").strip() in ("1", "true", "TRUE", "yes", "YES")
+
+_correlation: contextvars.ContextVar = contextvars.ContextVar("pm_correlation", default={})
+
+
+def bind_correlation(**ids):
+    """Set the correlation ids (pm_session_id, pm_run_id, ...) added to every event on this thread"""
+    _correlation.set({k: v for k, v in ids.items() if v is not None})
+
+
+def _session_correlation() -> Dict[str, Any]:
+    """pm_session_id / pm_run_id from st.session_state when called from a Streamlit script thread"""
+    st = sys.modules.get("streamlit")  # never import it here: headless callers stay light
+    if st is None:
+        return {}
+    try:
+        from streamlit.runtime.scriptrunner import get_script_run_ctx
+        if get_script_run_ctx(suppress_warning=True) is None:
+            return {}
+        state = st.session_state
+        return {k: state[k] for k in ("pm_session_id", "pm_run_id") if k in state}
+    except Exception:
+        return {}
+
+
+def current_correlation() -> Dict[str, Any]:
+    """Ids bound on this thread, else the running Streamlit session's"""
+    return _correlation.get() or _session_correlation()
+
+
+def cost_per_token() -> float:
+    """Demo-friendly USD cost per token. Override with env var COST_PER_TOKEN."""
+    try:
+        return float(os.getenv("COST_PER_TOKEN", "0.0000005"))
+    except ValueError:
+        return 0.0000005
+
+
+# ============================================================================
+# INSTRUMENTATION (per-stage timing spans)
+# ============================================================================
+# Spans are collected per rerun and shipped as one `render_profile` event.
+# PM_TRACE_SPANS=0 turns span() into a shared no-op and @timed into the bare function.
+PM_TRACE_SPANS = os.getenv("PM_TRACE_SPANS", "1").strip() in ("1", "true", "TRUE", "yes", "YES")
+
+_render_profile: contextvars.ContextVar = contextvars.ContextVar("pm_render_profile", default=None)
+
+
+class _NullSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class _Span:
+    __slots__ = ("name", "records", "t0")
+
+    def __init__(self, name: str, records: List):
+        self.name = name
+        self.records = records
+
+    def __enter__(self):
+        self.t0 = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.records.append((self.name, time.perf_counter() - self.t0))
+        return False
+
+
+def span(name: str):
+    """Time a block: `with span("csv_load"): ...`. No-op when tracing is off or no profile is active."""
+    if not PM_TRACE_SPANS:
+        return _NULL_SPAN
+    profile = _render_profile.get()
+    if profile is None:
+        return _NULL_SPAN
+    return _Span(name, profile["spans"])
+
+
+def timed(name: Optional[str] = None):
+    """Decorator form of span(); returns the function untouched when tracing is off"""
+    def decorator(fn):
+        if not PM_TRACE_SPANS:
+            return fn
+        label = name or fn.__name__
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with span(label):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def begin_render_profile():
+    """Start collecting spans for this rerun (replaces any unfinished profile)"""
+    METRICS.reruns.inc()
+    if PM_TRACE_SPANS:
+        _render_profile.set({"started": time.perf_counter(), "spans": []})
+
+
+def summarize_render_profile(profile: Dict[str, Any]) -> Dict[str, Any]:
+    """Aggregate raw spans by stage name, slowest first"""
+    stages: Dict[str, Dict[str, Any]] = {}
+    for name, elapsed in profile["spans"]:
+        row = stages.setdefault(name, {"stage": name, "calls": 0, "total_ms": 0.0, "max_ms": 0.0})
+        ms = elapsed * 1000
+        row["calls"] += 1
+        row["total_ms"] += ms
+        row["max_ms"] = max(row["max_ms"], ms)
+    ordered = sorted(stages.values(), key=lambda r: r["total_ms"], reverse=True)
+    for row in ordered:
+        row["total_ms"] = round(row["total_ms"], 2)
+        row["max_ms"] = round(row["max_ms"], 2)
+    return {
+        "total_ms": round((time.perf_counter() - profile["started"]) * 1000, 2),
+        "span_count": len(profile["spans"]),
+        "stages": ordered,
+    }
+
+
+def finish_render_profile(**context) -> Optional[Dict[str, Any]]:
+    """Close the rerun's profile and emit it as a `render_profile` event"""
+    profile = _render_profile.get() if PM_TRACE_SPANS else None
+    if profile is None:
+        return None
+    # Detach first so the HEC post for this event is not timed into it
+    _render_profile.set(None)
+    summary = summarize_render_profile(profile)
+    METRICS.rerun_seconds.observe(summary["total_ms"] / 1000)
+    splunk_log({
+        "event_type": "render_profile",
+        "app": "ai_patient_monitor",
+        **context,
+        "total_ms": summary["total_ms"],
+        "span_count": summary["span_count"],
+        "slowest_stage": summary["stages"][0]["stage"] if summary["stages"] else None,
+        "stages_ms": {r["stage"]: r["total_ms"] for r in summary["stages"]},
+    })
+    return summary
+
+
+# ============================================================================
+# EVENT SHIPPING
+# ============================================================================
+def splunk_log(event: Dict[str, Any]):
+    """Send a structured event to Splunk HEC. Fails open (never breaks the demo).
+
+    Adds correlation ids (pm_session_id, pm_run_id) and optionally archives events locally
+    (JSON lines, or compact msgpack records for a *.msgpack PM_EVENT_LOG; see event_codec).
+    """
+    event_type = (event or {}).get("event_type", "unknown")
+    METRICS.events.labels(event_type).inc()
+    correlation = current_correlation()
+    if "pm_session_id" not in correlation or "pm_run_id" not in correlation:
+        # Neither bound nor on a script thread; these events won't join in Splunk
+        METRICS.events_uncorrelated.labels(event_type).inc()
+    if not (SPLUNK_HEC_URL and SPLUNK_HEC_TOKEN):
+        return
+
+    # Enrich for correlation / investigation
+    try:
+        event = dict(event or {})
+        event.setdefault("app", "ai_patient_monitor")
+        for key, value in correlation.items():
+            event.setdefault(key, value)
+    except Exception:
+        # If anything weird happens, don't break the demo
+        return
+
+    # Optional cost estimate (demo-friendly). Override with env var COST_PER_TOKEN.
+    try:
+        tokens = event.get("tokens_total")
+        if tokens is not None:
+            tokens_f = float(tokens)
+            event["estimated_cost_usd"] = round(tokens_f * cost_per_token(), 6)
+    except Exception:
+        pass
+
+    payload = {
+        "time": time.time(),
+        "host": os.getenv("COMPUTERNAME") or os.getenv("HOSTNAME") or "unknown-host",
+        "source": "streamlit",
+        "sourcetype": SPLUNK_SOURCETYPE,
+        "event": event,
+    }
+    if SPLUNK_INDEX:
+        payload["index"] = SPLUNK_INDEX
+
+    # Serialize once: the same bytes are the HEC body and the archive line
+    t0 = time.perf_counter()
+    try:
+        body = encode_json(payload)
+    except Exception:
+        return
+    log_path = archive_path()
+    record = body + b"\n"
+    if log_path and is_compact_path(log_path) and compact_available():
+        try:
+            record = encode_compact(payload)
+        except Exception:
+            pass  # readers accept JSON lines in a msgpack archive
+    METRICS.event_encode_seconds.observe(time.perf_counter() - t0)
+
+    # Local archive (optional)
+    try:
+        if log_path:
+            with span("event_archive"):
+                os.makedirs(os.path.dirname(log_path) or ".", exist_ok=True)
+                with open(log_path, "ab") as f:
+                    f.write(record)
+            METRICS.event_bytes_archive.inc(len(record))
+    except Exception:
+        pass
+
+    # requests is only needed once an event actually ships
+    import requests
+
+    METRICS.hec_inflight.inc()
+    t0 = time.perf_counter()
+    try:
+        with span("hec_post"):
+            requests.post(
+                SPLUNK_HEC_URL,
+                headers={"Authorization": f"Splunk {SPLUNK_HEC_TOKEN}", "Content-Type": "application/json"},
+                data=body,
+                timeout=2,
+                verify=PM_SPLUNK_VERIFY_TLS,
+            )
+        METRICS.event_bytes_hec.inc(len(body))
+    except Exception:
+        METRICS.hec_errors.inc()
+    finally:
+        METRICS.hec_seconds.observe(time.perf_counter() - t0)
+        METRICS.hec_inflight.dec()
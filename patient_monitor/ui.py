@@ -0,0 +1,372 @@
+"""Streamlit widgets for the monitor page (the only library module that imports streamlit)."""
+import os
+import math
+import time
+import base64
+import functools
+from datetime import timedelta
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+import pandas as pd
+import streamlit as st
+import streamlit.components.v1 as components
+
+from .telemetry import timed
+
+# ============================================================================
+# AUDIO ALERT SYSTEM
+# ============================================================================
+# One persistent component iframe per page (static/alarm_channel/index.html)
+# with a single AudioContext. The page only sends it small state messages:
+# one entry per alarm channel (patient) with its pattern, active flag and a
+# pulse sequence number. A new pulse plays the pattern once. An active alarm
+# whose pattern has repeat_ms > 0 repeats until alarm_stop().
+PM_ALARM_REPEAT_S = float(os.getenv("PM_ALARM_REPEAT_S", "0"))  # >0: repeat the emergency alarm until acknowledged
+
+_TRIPLE_BEEP = [[0, 200, 880], [400, 200, 880], [800, 200, 880]]  # [delay_ms, duration_ms, Hz]
+ALARM_PATTERNS = {
+    "triple": {"beeps": _TRIPLE_BEEP, "repeat_ms": 0},
+    "emergency": {"beeps": _TRIPLE_BEEP, "repeat_ms": int(PM_ALARM_REPEAT_S * 1000)},
+}
+
+_alarm_component = components.declare_component(
+    "pm_alarm_channel", path=str(Path(__file__).parent / "static" / "alarm_channel")
+)
+
+
+def _alarm_channels() -> Dict[str, Dict[str, Any]]:
+    if "alarm_channels" not in st.session_state:
+        st.session_state.alarm_channels = {"seq": 0, "alarms": {}}
+    return st.session_state.alarm_channels
+
+
+def _alarm_pulse(channel: str, pattern: str, active: bool):
+    state = _alarm_channels()
+    state["seq"] += 1
+    state["alarms"][channel] = {"pattern": pattern, "active": active, "seq": state["seq"],
+                                "at_ms": int(time.time() * 1000)}
+
+
+def alarm_start(patient_id: str, pattern: str = "emergency"):
+    """Sound a patient's alarm now (again on every call) and keep it active until alarm_stop()"""
+    _alarm_pulse(str(patient_id), pattern, active=True)
+
+
+def alarm_stop(patient_id: str):
+    alarm = _alarm_channels()["alarms"].get(str(patient_id))
+    if alarm is not None:
+        alarm["active"] = False
+
+
+def alarm_stop_all(keep: Optional[str] = None):
+    for channel, alarm in _alarm_channels()["alarms"].items():
+        if channel != keep:
+            alarm["active"] = False
+
+
+def play_3_beeps():
+    """One-shot three beeps on the page channel (no new iframe: see render_alarm_channel)"""
+    _alarm_pulse("page", "triple", active=False)
+
+
+@timed("alarm_audio")
+def render_alarm_channel():
+    """Mount (first call) or update the alarm component. Call once per run at a stable position."""
+    state = _alarm_channels()
+    _alarm_component(alarms=state["alarms"], patterns=ALARM_PATTERNS, now_ms=int(time.time() * 1000),
+                     key="pm_alarm_channel", default=None)
+
+
+# ============================================================================
+# VISUAL STYLING
+# ============================================================================
+@functools.lru_cache(maxsize=1)
+def _ward_background_css() -> str:
+    """Build the ward CSS once per process (the background image is base64-inlined)"""
+    bg_path = Path("assets/ward_bg.jpg")
+    
+    # Check if background image exists
+    if bg_path.exists():
+        bg_base64 = base64.b64encode(bg_path.read_bytes()).decode()
+        bg_style = f'background-image: url("data:image/jpeg;base64,{bg_base64}");'
+    else:
+        # Fallback to solid color
+        bg_style = 'background-color: #0e1117;'
+    
+    return (
+        f"""
+        <style>
+        /* Dark base theme */
+        html, body, [data-testid="stAppViewContainer"] {{
+            background-color: #0e1117 !important;
+        }}
+
+        /* Background layer */
+        body::before {{
+            content: "";
+            position: fixed;
+            inset: 0;
+            {bg_style}
+            background-size: cover;
+            background-position: center;
+            opacity: 0.14;
+            z-index: -1;
+        }}
+
+        /* Main content container */
+        .block-container {{
+            background: rgba(14, 17, 23, 0.78);
+            border-radius: 14px;
+            padding: 1.2rem;
+        }}
+
+        /* Sidebar styling */
+        section[data-testid="stSidebar"] {{
+            background: rgba(14, 17, 23, 0.90);
+        }}
+
+        /* Cards and metrics */
+        div[data-testid="stMetric"],
+        div[data-testid="stExpander"],
+        div[data-testid="stAlert"] {{
+            background: rgba(22, 27, 34, 0.85);
+            border-radius: 10px;
+            padding: 10px;
+        }}
+        
+        /* Emergency banner animation */
+        @keyframes blinker {{ 50% {{ opacity: 0; }} }}
+        .alarm {{
+            color: white;
+            background: #d32f2f;
+            padding: 14px 16px;
+            border-radius: 12px;
+            font-weight: 800;
+            font-size: 20px;
+            animation: blinker 1s linear infinite;
+            text-align: center;
+            box-shadow: 0 10px 25px rgba(211,47,47,0.35);
+        }}
+        </style>
+        """
+    )
+
+
+@timed("css_inject")
+def inject_ward_background():
+    """Inject custom CSS for ward-themed background"""
+    st.markdown(_ward_background_css(), unsafe_allow_html=True)
+
+
+# ============================================================================
+# UI COMPONENTS
+# ============================================================================
+def flashing_red_banner(text: str):
+    """Display flashing red emergency banner"""
+    st.markdown(f"<div class='alarm'>🚨 {text} 🚨</div>", unsafe_allow_html=True)
+
+
+def status_chip(label: str, level: str):
+    """Display status chip with color coding"""
+    colors = {
+        "NORMAL": "#2e7d32",
+        "WARNING": "#ef6c00",
+        "EMERGENCY": "#c62828"
+    }
+    html = (
+        f"<div style='display:inline-block;padding:6px 10px;border-radius:999px;"
+        f"background:{colors.get(level, '#455a64')};color:white;font-weight:700;'>"
+        f"{label}: {level}</div>"
+    )
+    st.markdown(html, unsafe_allow_html=True)
+
+
+def render_token_viz(usage: Optional[Dict]):
+    """Display token usage visualization"""
+    if not usage:
+        st.info("Token usage not available for this response.")
+        return
+    
+    prompt = usage.get("prompt_tokens", 0)
+    completion = usage.get("completion_tokens", 0)
+    total = usage.get("total_tokens", 0)
+    
+    col1, col2, col3 = st.columns(3)
+    col1.metric("Input Tokens", f"{prompt:,}")
+    col2.metric("Output Tokens", f"{completion:,}")
+    col3.metric("Total Tokens", f"{total:,}")
+    
+    # Visual bar
+    if total > 0:
+        prompt_pct = (prompt / total) * 100
+        completion_pct = (completion / total) * 100
+        
+        st.markdown(
+            f"""
+            <div style="display:flex;width:100%;height:30px;border-radius:8px;overflow:hidden;">
+                <div style="width:{prompt_pct}%;background:#1976d2;display:flex;align-items:center;justify-content:center;color:white;font-size:12px;">
+                    Input
+                </div>
+                <div style="width:{completion_pct}%;background:#388e3c;display:flex;align-items:center;justify-content:center;color:white;font-size:12px;">
+                    Output
+                </div>
+            </div>
+            """,
+            unsafe_allow_html=True
+        )
+
+
+def render_data_quality_report(report: Dict[str, Any]):
+    """Show per-row load diagnostics (collapsed unless rows were dropped)"""
+    if not report.get("issue_count"):
+        return
+    dropped = report["rows_read"] - report["rows_valid"]
+    label = (
+        f"🧪 Data Quality: {dropped} row(s) dropped, {report['issue_count']} issue(s)"
+        if dropped else f"🧪 Data Quality: {report['issue_count']} warning(s)"
+    )
+    with st.expander(label, expanded=bool(dropped)):
+        st.caption(
+            f"Read {report['rows_read']:,} rows in {report['elapsed_ms']} ms "
+            f"(engine={report['engine']}, fast_path={report['fast_path']}, chunked={report['chunked']})"
+            + (" · rows re-sorted by timestamp" if report["sorted"] else "")
+        )
+        st.dataframe(pd.DataFrame(report["issues"]), use_container_width=True, hide_index=True)
+        if report["issue_count"] > len(report["issues"]):
+            st.caption(f"Showing first {len(report['issues'])} of {report['issue_count']} issues.")
+
+
+def render_profile_panel(summary: Optional[Dict[str, Any]], top_n: int = 8):
+    """Show the slowest stages of this rerun"""
+    if not summary or not summary["stages"]:
+        return
+    with st.expander(f"⏱️ Render Profile — {summary['total_ms']} ms this rerun"):
+        st.caption(f"{summary['span_count']} spans · slowest {top_n} stages (nested stages overlap)")
+        st.dataframe(pd.DataFrame(summary["stages"][:top_n]), use_container_width=True, hide_index=True)
+
+
+def render_raw_data_view(df: pd.DataFrame, row_alerts: Optional[pd.DataFrame], export_name: str,
+                         page_sizes=(50, 100, 250, 500)):
+    """Paginated raw-data table. Filtering and paging run server-side; only one page is sent."""
+    from .table_view import export_csv, page_of, select_rows
+
+    ts = df["timestamp"]
+    t_min, t_max = ts.iloc[0].to_pydatetime(), ts.iloc[-1].to_pydatetime()
+
+    f1, f2, f3, f4 = st.columns([4, 3, 2, 2])
+    with f1:
+        if t_min < t_max:
+            start, end = st.slider(
+                "Time range", min_value=t_min, max_value=t_max, value=(t_min, t_max),
+                step=timedelta(minutes=1), format="MM-DD HH:mm", key="raw_time_range",
+            )
+        else:
+            start, end = t_min, t_max
+    with f2:
+        levels = st.multiselect(
+            "Alert level", ["NORMAL", "WARNING", "EMERGENCY"],
+            default=["NORMAL", "WARNING", "EMERGENCY"], key="raw_levels",
+        )
+    with f3:
+        flagged_only = st.checkbox("Flagged rows only", key="raw_flagged_only")
+    with f4:
+        page_size = st.selectbox("Rows / page", page_sizes, index=1, key="raw_page_size")
+
+    positions = select_rows(df, row_alerts, start, end, levels=levels, flagged_only=flagged_only)
+    n_pages = max(1, math.ceil(len(positions) / page_size))
+    # The page lives in session state only (no widget default), so filters that
+    # shrink the result can clamp it without a default-vs-state conflict
+    if st.session_state.setdefault("raw_page", 1) > n_pages:
+        st.session_state.raw_page = n_pages
+    page = st.number_input(f"Page (of {n_pages})", min_value=1, max_value=n_pages, key="raw_page")
+
+    first = (page - 1) * page_size
+    st.caption(
+        f"Rows {first + 1 if len(positions) else 0}–{min(first + page_size, len(positions))} "
+        f"of {len(positions):,} matching ({len(df):,} total)"
+    )
+    st.dataframe(page_of(df, positions, page, page_size, row_alerts), use_container_width=True, hide_index=True)
+
+    st.download_button(
+        label=f"📥 Export {len(positions):,} matching rows (CSV)",
+        data=lambda: export_csv(df, positions, row_alerts),
+        file_name=f"{export_name}_filtered.csv",
+        mime="text/csv",
+        on_click="ignore",
+    )
+
+
+REPLAY_EVENT_COLUMNS = ["event_type", "alert_level", "diagnosis", "success", "served_by",
+                        "latency_ms", "queue_wait_ms", "error"]
+
+
+def render_replay_view(df: pd.DataFrame, row_alerts: pd.DataFrame,
+                       events_at: Callable[[Any], List[Dict[str, Any]]],
+                       last_event: Callable[[Any, str], Optional[Dict[str, Any]]]):
+    """Time-travel view: what the monitor showed at a chosen minute.
+
+    Alert state comes from the precomputed per-row results; archived events
+    are looked up by data time through the callbacks (see event_index).
+    """
+    from .table_view import row_at
+
+    ts = df["timestamp"]
+    t_min, t_max = ts.iloc[0].to_pydatetime(), ts.iloc[-1].to_pydatetime()
+    if t_min < t_max:
+        at = st.slider("Replay time", min_value=t_min, max_value=t_max, value=t_max,
+                       step=timedelta(minutes=1), format="MM-DD HH:mm", key="replay_time")
+    else:
+        at = t_max
+    pos = row_at(ts, pd.Timestamp(at))
+    row, alert = df.iloc[pos], row_alerts.iloc[pos]
+
+    c1, c2, c3 = st.columns([2, 3, 2])
+    with c1:
+        status_chip("Status", alert["alert_level"])
+        st.caption(f"Row {pos + 1} of {len(df)} · {row['timestamp']}")
+    with c2:
+        st.metric("Diagnosis", alert["diagnosis"])
+    with c3:
+        st.metric("Flags", int(alert["flag_count"]))
+
+    window = df.iloc[max(0, pos - 59): pos + 1].set_index("timestamp")
+    st.line_chart(window[["heart_rate_bpm", "spo2_percent", "bp_systolic_mmHg"]], height=220)
+
+    events = events_at(row["timestamp"])
+    st.markdown(f"**Archived events at this minute:** {len(events)}")
+    if events:
+        table = pd.DataFrame(events)
+        table["emitted"] = pd.to_datetime(table["_time"], unit="s")
+        st.dataframe(table[["emitted"] + [c for c in REPLAY_EVENT_COLUMNS if c in table]],
+                     hide_index=True, use_container_width=True)
+
+    ai = last_event(row["timestamp"], "ai_inference")
+    served = last_event(row["timestamp"], "action_plan_served")
+    if ai or served:
+        st.markdown("**Latest AI activity up to this minute:**")
+        a1, a2, a3 = st.columns(3)
+        with a1:
+            st.metric("AI call", "✅ Success" if (ai or {}).get("success") else ("❌ Failed" if ai else "—"),
+                      help=(ai or {}).get("error"))
+        with a2:
+            st.metric("Plan served by", (served or {}).get("served_by") or "—")
+        with a3:
+            st.metric("For vitals at", str((ai or served).get("data_ts")))
+
+
+def render_ecg_panel(features: Dict[str, Any], strip: Optional[tuple], max_points: int = 1000):
+    """Waveform-derived rhythm, HR and RR variability plus a short rhythm strip"""
+    e1, e2, e3, e4, e5 = st.columns(5)
+    e1.metric("Rhythm (waveform)", features.get("rhythm") or "—")
+    e2.metric("HR (R-R)", f"{features['hr_bpm']} bpm" if features.get("hr_bpm") is not None else "—")
+    e3.metric("SDNN", f"{features['sdnn_ms']} ms" if features.get("sdnn_ms") is not None else "—")
+    e4.metric("RMSSD", f"{features['rmssd_ms']} ms" if features.get("rmssd_ms") is not None else "—")
+    e5.metric("R width", f"{features['r_width_ms']} ms" if features.get("r_width_ms") is not None else "—")
+    if strip is not None:
+        samples, fs = strip
+        step = max(1, math.ceil(len(samples) / max_points))
+        seconds = [round(i / fs, 3) for i in range(0, len(samples), step)]
+        st.line_chart(pd.DataFrame({"mV": samples[::step]}, index=pd.Index(seconds, name="s")), height=160)
+    st.caption(f"{features.get('beats', 0)} beats in the last {features.get('window_s')} s at "
+               f"{features.get('fs')} Hz · HR/RRV from R-R intervals")
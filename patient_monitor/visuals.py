@@ -0,0 +1,64 @@
+"""Condition status illustration (PIL). Images depend only on the alert level,
+so each one is drawn once per process."""
+import io
+import functools
+from typing import Optional
+
+from .telemetry import timed
+
+
+@functools.lru_cache(maxsize=1)
+def pil_available() -> bool:
+    import importlib.util
+    return importlib.util.find_spec("PIL") is not None
+
+
+@functools.lru_cache(maxsize=8)
+def _render_condition_image(level: str) -> bytes:
+    from PIL import Image, ImageDraw, ImageFont
+
+    # Create simple visual indicator
+    width, height = 520, 200
+    
+    if level == "EMERGENCY":
+        color = (211, 47, 47)
+        text = "⚠️ EMERGENCY"
+    elif level == "WARNING":
+        color = (239, 108, 0)
+        text = "⚠️ WARNING"
+    else:
+        color = (46, 125, 50)
+        text = "✓ NORMAL"
+    
+    img = Image.new('RGB', (width, height), (30, 30, 40))
+    draw = ImageDraw.Draw(img)
+    
+    # Draw border
+    draw.rectangle([10, 10, width-10, height-10], outline=color, width=5)
+    
+    # Add text
+    try:
+        font = ImageFont.truetype("/usr/share/fonts/truetype/dejavu/DejaVuSans-Bold.ttf", 36)
+    except:
+        font = ImageFont.load_default()
+    
+    # Center text
+    bbox = draw.textbbox((0, 0), text, font=font)
+    text_width = bbox[2] - bbox[0]
+    text_height = bbox[3] - bbox[1]
+    position = ((width - text_width) // 2, (height - text_height) // 2)
+    
+    draw.text(position, text, fill=color, font=font)
+    
+    # Convert to bytes
+    buf = io.BytesIO()
+    img.save(buf, format='PNG')
+    return buf.getvalue()
+
+
+@timed("condition_image")
+def get_cached_condition_image(patient_id: str, level: str) -> Optional[bytes]:
+    """Generate or retrieve cached condition illustration. Raises if drawing fails."""
+    if not pil_available():
+        return None
+    return _render_condition_image(level)
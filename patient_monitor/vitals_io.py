@@ -0,0 +1,223 @@
+"""Schema-aware vitals CSV reader with per-row diagnostics.
+
+pandas is imported on first use so importing this module stays cheap.
+"""
+import os
+import time
+from typing import TYPE_CHECKING, Any, Dict, List, Optional
+
+from .telemetry import timed
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+# Fixed dtypes so pandas never has to infer. Integer vitals use nullable Int64
+# while reading (blank cells stay readable) and are narrowed to int64 once the
+# invalid rows have been dropped.
+VITALS_SCHEMA: Dict[str, str] = {
+    "patient_id": "string",
+    "timestamp": "string",
+    "ECG": "string",
+    "heart_rate_bpm": "Int64",
+    "temperature_c": "float64",
+    "bp_systolic_mmHg": "Int64",
+    "bp_diastolic_mmHg": "Int64",
+    "spo2_percent": "Int64",
+}
+
+# Physically plausible bounds. Values outside are sensor/entry errors, not clinical findings.
+VITALS_RANGES: Dict[str, tuple] = {
+    "heart_rate_bpm": (0, 350),
+    "temperature_c": (25.0, 45.0),
+    "bp_systolic_mmHg": (0, 300),
+    "bp_diastolic_mmHg": (0, 250),
+    "spo2_percent": (0, 100),
+}
+
+VITALS_TIMESTAMP_FORMAT = os.getenv("PM_TIMESTAMP_FORMAT", "%Y-%m-%d %H:%M:%S").strip()
+VITALS_CHUNK_ROWS = int(os.getenv("PM_CSV_CHUNK_ROWS", "100000"))
+VITALS_CHUNK_THRESHOLD_BYTES = int(float(os.getenv("PM_CSV_CHUNK_THRESHOLD_MB", "25")) * 1024 * 1024)
+VITALS_MAX_ISSUES = int(os.getenv("PM_CSV_MAX_ISSUES", "500"))
+
+
+def _pyarrow_available() -> bool:
+    import importlib.util
+    return importlib.util.find_spec("pyarrow") is not None
+
+
+def _source_size(source: Any) -> Optional[int]:
+    """Best-effort byte size of a path or uploaded file object"""
+    size = getattr(source, "size", None)
+    if size is not None:
+        return int(size)
+    try:
+        return os.path.getsize(source)
+    except (TypeError, OSError):
+        return None
+
+
+def _rewind(source: Any):
+    if hasattr(source, "seek"):
+        source.seek(0)
+
+
+def _iter_vitals_frames(source: Any, chunksize: Optional[int], typed: bool):
+    """Yield raw frames from the CSV; typed=False reads every schema column as text"""
+    import pandas as pd
+    dtype = VITALS_SCHEMA if typed else {c: "string" for c in VITALS_SCHEMA}
+    if chunksize:
+        # pyarrow engine has no chunked mode; the C engine streams fine
+        with pd.read_csv(source, dtype=dtype, chunksize=chunksize) as reader:
+            yield from reader
+    else:
+        engine = "pyarrow" if _pyarrow_available() else "c"
+        yield pd.read_csv(source, dtype=dtype, engine=engine)
+
+
+def _validate_vitals_frame(frame: "pd.DataFrame", first_line: int, typed: bool,
+                           prev_ts: Any, report: Dict[str, Any]):
+    """Coerce + validate one frame in a single vectorized pass.
+
+    Rows with errors are dropped; warnings are reported but kept.
+    Returns (clean_frame, last_valid_timestamp).
+    """
+    import pandas as pd
+    issues = report["issues"]
+    bad = pd.Series(False, index=frame.index)
+
+    def _flag(mask: "pd.Series", column: str, problem: str, severity: str = "error"):
+        mask = mask.fillna(False).astype(bool)
+        if not mask.any():
+            return
+        positions = mask.to_numpy().nonzero()[0]
+        report["issue_count"] += len(positions)
+        room = VITALS_MAX_ISSUES - len(issues)
+        for pos in positions[:max(room, 0)]:
+            value = frame[column].iloc[pos] if column in frame else None
+            issues.append({
+                "line": int(first_line + pos),
+                "column": column,
+                "value": None if pd.isna(value) else str(value),
+                "problem": problem,
+                "severity": severity,
+            })
+
+    for col in ("patient_id", "ECG"):
+        missing = frame[col].isna()
+        _flag(missing, col, "missing value")
+        bad |= missing
+
+    for col, (lo, hi) in VITALS_RANGES.items():
+        raw = frame[col]
+        present = raw.notna()
+        if not typed:
+            num = pd.to_numeric(raw, errors="coerce")
+            garbled = present & num.isna()
+            _flag(garbled, col, "not a number")
+            bad |= garbled
+            frame[col] = num
+        _flag(~present, col, "missing value")
+        bad |= ~present
+        out_of_range = ((frame[col] < lo) | (frame[col] > hi)).fillna(False)
+        _flag(out_of_range, col, f"outside plausible range [{lo}, {hi}]")
+        bad |= out_of_range
+
+    raw_ts = frame["timestamp"]
+    ts = pd.to_datetime(raw_ts, format=VITALS_TIMESTAMP_FORMAT, errors="coerce")
+    retry = ts.isna() & raw_ts.notna()
+    if retry.any():
+        # Uploads from other exporters: accept ISO-8601 for the stragglers only
+        ts[retry] = pd.to_datetime(raw_ts[retry], format="ISO8601", errors="coerce")
+    unparsed = ts.isna()
+    _flag(unparsed & raw_ts.notna(), "timestamp", f"unparseable (expected {VITALS_TIMESTAMP_FORMAT})")
+    _flag(raw_ts.isna(), "timestamp", "missing value")
+    bad |= unparsed
+    frame["timestamp"] = ts
+
+    clean = frame[~bad]
+    if clean.empty:
+        return clean, prev_ts
+
+    valid_ts = clean["timestamp"]
+    prev = valid_ts.shift(1)
+    if prev_ts is not None:
+        prev.iloc[0] = prev_ts
+    backwards = valid_ts < prev
+    if backwards.any():
+        report["sorted"] = True
+    # Warnings refer to the clean frame; map positions back onto the input frame
+    _flag(backwards.reindex(frame.index, fill_value=False), "timestamp",
+          "earlier than previous row", severity="warning")
+    _flag((valid_ts == prev).reindex(frame.index, fill_value=False), "timestamp",
+          "duplicate timestamp", severity="warning")
+    return clean, valid_ts.iloc[-1]
+
+
+@timed("csv_load")
+def read_vitals_csv(source: Any, chunksize: Optional[int] = None):
+    """Read and validate a vitals CSV (path or uploaded file).
+
+    Uses fixed dtypes and a fixed timestamp format (pyarrow engine when installed).
+    Falls back to a text read + per-cell coercion when the typed read rejects
+    malformed cells. Files larger than PM_CSV_CHUNK_THRESHOLD_MB are streamed in
+    chunks of PM_CSV_CHUNK_ROWS; pass chunksize=0 to force a single read.
+
+    Returns (df, report). df is None when required columns are missing.
+    """
+    import pandas as pd
+    t0 = time.perf_counter()
+    if chunksize is None:
+        size = _source_size(source)
+        chunksize = VITALS_CHUNK_ROWS if size and size > VITALS_CHUNK_THRESHOLD_BYTES else 0
+
+    def _fresh_report(typed: bool) -> Dict[str, Any]:
+        return {
+            "engine": "c" if chunksize or not _pyarrow_available() else "pyarrow",
+            "fast_path": typed,
+            "chunked": bool(chunksize),
+            "rows_read": 0,
+            "rows_valid": 0,
+            "issue_count": 0,
+            "issues": [],
+            "missing_columns": [],
+            "sorted": False,
+            "elapsed_ms": 0.0,
+        }
+
+    for typed in (True, False):
+        report = _fresh_report(typed)
+        kept: List["pd.DataFrame"] = []
+        prev_ts = None
+        line = 2  # line 1 is the header
+        try:
+            for frame in _iter_vitals_frames(source, chunksize, typed):
+                if not report["rows_read"]:
+                    missing = [c for c in VITALS_SCHEMA if c not in frame.columns]
+                    if missing:
+                        report["missing_columns"] = missing
+                        report["elapsed_ms"] = round((time.perf_counter() - t0) * 1000, 2)
+                        return None, report
+                report["rows_read"] += len(frame)
+                clean, prev_ts = _validate_vitals_frame(frame, line, typed, prev_ts, report)
+                kept.append(clean)
+                line += len(frame)
+            break
+        except (ValueError, TypeError):
+            # Typed read hit a malformed cell: redo the pass as text and coerce per cell
+            if not typed:
+                raise
+            _rewind(source)
+
+    df = pd.concat(kept, ignore_index=True) if kept else pd.DataFrame(columns=list(VITALS_SCHEMA))
+    for col, dtype in VITALS_SCHEMA.items():
+        if dtype == "Int64" and len(df):
+            integral = (df[col] % 1 == 0).all()
+            df[col] = df[col].astype("int64" if integral else "float64")
+        elif dtype == "float64":
+            df[col] = df[col].astype("float64")
+    if report["sorted"]:
+        df = df.sort_values("timestamp", kind="stable", ignore_index=True)
+
+    report["rows_valid"] = len(df)
+    report["elapsed_ms"] = round((time.perf_counter() - t0) * 1000, 2)
+    return df, report